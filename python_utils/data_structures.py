@@ -1,10 +1,13 @@
 import operator
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timezone
 from decimal import Decimal
+from functools import lru_cache
 from typing import (
-    Callable, Hashable, Generator, Iterable, List, Any, Dict, Optional, Union
+    Callable, Hashable, Generator, Iterable, List, Any, Dict, Optional, Tuple, Union
 )
 
+from python_utils.imports import import_optional_dependency
 from python_utils.math import are_equal
 from python_utils.types_hinting import T
 
@@ -53,12 +56,16 @@ def find_by(records: List[Dict], attr: Hashable, value: Any) -> Optional[Dict]:
     return safe_find(records, lambda rec: value == rec.get(attr))
 
 
-def filter_dicts(records: List[Dict], as_list=True, **filters) -> Union[List[Dict], Iterable[Dict]]:
+def filter_dicts(
+        records: Union[List[Dict], 'ColumnarRecords'], as_list=True, **filters
+) -> Union[List[Dict], Iterable[Dict]]:
     """
-    Pass a list of dicts and filters as kwargs to get all filtered records as list or generator
+    Pass a list of dicts and filters as kwargs to get all filtered records as list or generator.
+    If ColumnarRecords are passed, the filters are evaluated in a vectorized way and support
+    the Finder lookups (e.g. amount__gt=10).
 
     Args:
-        records: list of dicts to iterate and filter from
+        records: list of dicts (or ColumnarRecords) to iterate and filter from
         as_list: Flag that shows if found records should be returned as list
         **filters: kwargs to be used for filtering as key:value pairs
     Returns:
@@ -78,6 +85,9 @@ def filter_dicts(records: List[Dict], as_list=True, **filters) -> Union[List[Dic
         >>> sum(1 for _ in filter_dicts(test_d, as_list=False, a=1))
         2
     """
+    if isinstance(records, ColumnarRecords):
+        return records.filter(as_list=as_list, **filters)
+
     filtered_records = filter(
         lambda rec: all([rec.get(key) == value for key, value in filters.items()]), records)
     if as_list:
@@ -85,12 +95,16 @@ def filter_dicts(records: List[Dict], as_list=True, **filters) -> Union[List[Dic
     return filtered_records
 
 
-def filter_objects(objects: List[T], as_list=True, **filters) -> Union[List[T], Iterable[T]]:
+def filter_objects(
+        objects: Union[List[T], 'ColumnarRecords'], as_list=True, **filters
+) -> Union[List[T], Iterable[T]]:
     """
-    Pass a list of objects and filters as kwargs to get all filtered records as list or filter obj
+    Pass a list of objects and filters as kwargs to get all filtered records as list or filter obj.
+    If ColumnarRecords are passed, the filters are evaluated in a vectorized way and support
+    the Finder lookups (e.g. amount__gt=10).
 
     Args:
-        objects: list of objects to iterate and filter from
+        objects: list of objects (or ColumnarRecords) to iterate and filter from
         as_list: Flag that shows if found records should be returned as list
         **filters: kwargs to be used for filtering as key:value pairs
     Returns:
@@ -115,6 +129,9 @@ def filter_objects(objects: List[T], as_list=True, **filters) -> Union[List[T],
         >>> sum(1 for _ in filter_objects([A('test', 2), A('test2', 2)], as_list=False, var2=2))
         2
     """
+    if isinstance(objects, ColumnarRecords):
+        return objects.filter(as_list=as_list, **filters)
+
     filtered_objects = filter(
         lambda rec: all([getattr(rec, key) == value for key, value in filters.items()]), objects)
     if as_list:
@@ -448,6 +465,45 @@ class Finder:
             value2 = str(value2)
         return cls.ops[op](value1, value2)
 
+    @classmethod
+    @lru_cache(maxsize=1024)
+    def _parse_lookup(cls, key: str) -> Tuple[str, str]:
+        """
+        Split a lookup key in the form 'attr__op' into the attribute and the operator.
+
+        Args:
+            key: The lookup key, e.g. 'asset__debtor__country_id__in'
+        Returns:
+            Tuple (attr, op), where nested attributes are joined with '.' and op defaults to 'eq'
+        """
+        if "__" in key:
+            elements = key.split("__")
+            # If operator has been declared
+            if elements[-1] in cls.available_ops:
+                return ".".join(elements[:-1]), elements[-1]
+            # eq operator by default
+            return ".".join(elements), "eq"
+        return key, "eq"
+
+    @classmethod
+    def _compile(cls, **checks) -> List[Tuple[str, str, Any]]:
+        """
+        Compile the checks into a plan, so that the lookup keys are parsed only once per query.
+
+        Args:
+            **checks: Dictionary with checks in the form: {"attr__gt": 5}
+        Returns:
+            List of (attr, op, value) tuples
+        """
+        return [(*cls._parse_lookup(key), value) for key, value in checks.items()]
+
+    @classmethod
+    def _verify_plan(cls, record: Union[Dict, T], plan: List[Tuple[str, str, Any]], ignore_types=False) -> bool:
+        for attr, op, value in plan:
+            if not cls._compare(cls._get_value(record, attr), op, value, ignore_types):
+                return False
+        return True
+
     @classmethod
     def _verify(cls, record: Union[Dict, T], ignore_types=False, **checks) -> bool:
         """
@@ -461,23 +517,7 @@ class Finder:
         Returns:
             True if the record passes *all* the checks, False otherwise
         """
-        for key, value in checks.items():
-            if "__" in key:
-                elements = key.split("__")
-                # If operator has been declared
-                if elements[-1] in cls.available_ops:
-                    attr = ".".join(elements[:-1])
-                    op = elements[-1]
-                # eq operator by default
-                else:
-                    attr = ".".join(elements)
-                    op = "eq"
-            else:
-                attr = key
-                op = "eq"
-            if not cls._compare(cls._get_value(record, attr), op, value, ignore_types):
-                return False
-        return True
+        return cls._verify_plan(record, cls._compile(**checks), ignore_types)
 
     @staticmethod
     def _get_value(record: Union[Dict, T], attr: str) -> Optional[Any]:
@@ -502,12 +542,513 @@ class Finder:
                 return None
 
     def filter(self, as_list=True, ignore_types=False, **filters):
-        filtered_records = filter(lambda rec: self._verify(rec, ignore_types, **filters), self._records)
+        plan = self._compile(**filters)
+        filtered_records = filter(lambda rec: self._verify_plan(rec, plan, ignore_types), self._records)
         if as_list:
             filtered_records = list(filtered_records)
         return filtered_records
 
     def find(self, **filters):
+        # As in _verify, an ignore_types filter is the flag to compare the values as strings
+        ignore_types = filters.pop("ignore_types", False)
+        return self._find(self._compile(**filters), ignore_types)
+
+    def _find(self, plan: List[Tuple[str, str, Any]], ignore_types: bool) -> Optional[Union[Dict, T]]:
         for record in self._records:
-            if self._verify(record, **filters):
+            if self._verify_plan(record, plan, ignore_types):
                 return record
+
+
+class IndexedFinder(Finder):
+    """
+    Finder that lazily builds indexes on the queried attributes, to be used when the same records
+    are queried many times. Equality and `in` lookups use hash indexes, while gt/gte/lt/lte lookups
+    use sorted indexes. The results are the same as the ones of Finder, in the same order.
+
+    Indexes are dropped when records are added with append/extend or when the length of the records
+    list changes. Call invalidate() after changing the values of the records in place.
+    Examples:
+        >>> records = [{'id': 1, 'foo': 'bar'}, {'id': 2, 'a': 'b'}, {'id': 3, 'foo': 'bar'}]
+        >>> finder = IndexedFinder(records, index_on=['id', 'foo'])
+        >>> finder.find(id=2)
+        {'id': 2, 'a': 'b'}
+        >>> finder.filter(foo='bar', id__gte=2)
+        [{'id': 3, 'foo': 'bar'}]
+        >>> finder.append({'id': 4, 'foo': 'bar'})
+        >>> finder.filter(foo='bar', id__gt=1)
+        [{'id': 3, 'foo': 'bar'}, {'id': 4, 'foo': 'bar'}]
+    """
+    hash_ops = {"eq", "in"}
+    range_ops = {"gt", "gte", "lt", "lte"}
+
+    def __init__(self, records: List[Union[Dict, T]], index_on: Optional[Iterable[str]] = None):
+        """
+        Args:
+            records: The records to search: dicts or objects
+            index_on: Attributes that can be indexed, in lookup form (e.g. 'asset__debtor_id').
+                If not given, every queried attribute is indexed.
+        """
+        super().__init__(records)
+        self._index_on = {self._parse_lookup(key)[0] for key in index_on} if index_on is not None else None
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop all the built indexes. They will be rebuilt lazily on the next lookup."""
+        self._hash_indexes: Dict[Tuple[str, bool], Optional[Dict[Any, List[int]]]] = {}
+        self._sorted_indexes: Dict[Tuple[str, bool], Optional[Tuple[List, List[int]]]] = {}
+        self._indexed_length = len(self._records)
+
+    def append(self, record: Union[Dict, T]):
+        self._records.append(record)
+        self.invalidate()
+
+    def extend(self, records: Iterable[Union[Dict, T]]):
+        self._records.extend(records)
+        self.invalidate()
+
+    def _get_values(self, attr: str, ignore_types: bool) -> List[Any]:
+        values = [self._get_value(record, attr) for record in self._records]
+        if ignore_types:
+            values = [str(value) for value in values]
+        return values
+
+    def _get_hash_index(self, attr: str, ignore_types: bool) -> Optional[Dict[Any, List[int]]]:
+        """Get the value -> positions index of the attribute, or None if the values are not hashable."""
+        key = (attr, ignore_types)
+        if key not in self._hash_indexes:
+            index = {}
+            try:
+                for position, value in enumerate(self._get_values(attr, ignore_types)):
+                    index.setdefault(value, []).append(position)
+            except TypeError:
+                index = None
+            self._hash_indexes[key] = index
+        return self._hash_indexes[key]
+
+    def _get_sorted_index(self, attr: str, ignore_types: bool) -> Optional[Tuple[List, List[int]]]:
+        """Get the sorted values and their positions, or None if the values are not comparable."""
+        key = (attr, ignore_types)
+        if key not in self._sorted_indexes:
+            values = self._get_values(attr, ignore_types)
+            try:
+                positions = sorted(range(len(values)), key=values.__getitem__)
+                index = ([values[position] for position in positions], positions)
+            except TypeError:
+                index = None
+            self._sorted_indexes[key] = index
+        return self._sorted_indexes[key]
+
+    def _lookup(self, attr: str, op: str, value: Any, ignore_types: bool) -> Optional[List[int]]:
+        """
+        Get the positions of the records that satisfy a single check, using an index.
+
+        Returns:
+            List of positions (not ordered) or None if the check cannot be resolved through an index
+        """
+        if self._index_on is not None and attr not in self._index_on:
+            return None
+
+        if op in self.hash_ops:
+            if op == "eq":
+                values = [value]
+            # Ignoring types, Finder checks if the value is a substring of the string of the collection,
+            # which is not equivalent to a union of equality lookups
+            elif ignore_types:
+                return None
+            # Only collections of values are equivalent to a union of equality lookups
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                values = value
+            else:
+                return None
+            index = self._get_hash_index(attr, ignore_types)
+            if index is None:
+                return None
+            positions = []
+            try:
+                for item in (str(item) for item in values) if ignore_types else values:
+                    positions.extend(index.get(item, ()))
+            except TypeError:
+                return None
+            return positions if len(values) <= 1 else list(set(positions))
+
+        if op in self.range_ops:
+            index = self._get_sorted_index(attr, ignore_types)
+            if index is None:
+                return None
+            keys, positions = index
+            if ignore_types:
+                value = str(value)
+            try:
+                if op == "gt":
+                    return positions[bisect_right(keys, value):]
+                if op == "gte":
+                    return positions[bisect_left(keys, value):]
+                if op == "lt":
+                    return positions[:bisect_left(keys, value)]
+                return positions[:bisect_right(keys, value)]
+            except TypeError:
+                return None
+
+        return None
+
+    def _candidates(self, plan: List[Tuple[str, str, Any]], ignore_types: bool) -> Iterable[Union[Dict, T]]:
+        """
+        Resolve the most selective indexed check of the plan and return the matching records in their
+        original order, while the rest of the checks remain to be verified on them.
+        """
+        if len(self._records) != self._indexed_length:
+            self.invalidate()
+
+        best_positions = None
+        for attr, op, value in plan:
+            positions = self._lookup(attr, op, value, ignore_types)
+            if positions is not None and (best_positions is None or len(positions) < len(best_positions)):
+                best_positions = positions
+                if not best_positions:
+                    break
+
+        if best_positions is None:
+            return self._records
+        return [self._records[position] for position in sorted(best_positions)]
+
+    def filter(self, as_list=True, ignore_types=False, **filters):
+        plan = self._compile(**filters)
+        filtered_records = filter(
+            lambda rec: self._verify_plan(rec, plan, ignore_types), self._candidates(plan, ignore_types)
+        )
+        if as_list:
+            filtered_records = list(filtered_records)
+        return filtered_records
+
+    def _find(self, plan: List[Tuple[str, str, Any]], ignore_types: bool) -> Optional[Union[Dict, T]]:
+        for record in self._candidates(plan, ignore_types):
+            if self._verify_plan(record, plan, ignore_types):
+                return record
+
+
+class ColumnarRecords:
+    """
+    Struct-of-arrays representation of a list of homogeneous dicts or objects, used to filter
+    large lists of records with vectorized NumPy masks instead of evaluating every record in Python.
+    The columns are built once, the first time each attribute is queried.
+    Filters use the same lookups as Finder, e.g. {'amount__gt': 10, 'country__in': ['IT', 'FR']}.
+    It can be passed to filter_dicts and filter_objects as well.
+    Requires numpy.
+    Examples:
+        >>> records = ColumnarRecords([{'id': 1, 'amount': 10}, {'id': 2, 'amount': 20}, {'id': 3, 'amount': 30}])
+        >>> records.indices(amount__gte=20).tolist()
+        [1, 2]
+        >>> records.filter(amount__gt=10, id__in=[1, 2])
+        [{'id': 2, 'amount': 20}]
+        >>> filter_dicts(records, id=3)
+        [{'id': 3, 'amount': 30}]
+        >>> records.find(amount__lt=10) is None
+        True
+    """
+
+    def __init__(self, records: List[Union[Dict, T]]):
+        self._np = import_optional_dependency("numpy")
+        self._records = records
+        self._columns: Dict[Tuple[str, bool], Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __getitem__(self, index: int) -> Union[Dict, T]:
+        return self._records[index]
+
+    def column(self, attr: str, ignore_types=False):
+        """
+        Get the values of an attribute for all the records as a numpy array.
+
+        Args:
+            attr: The attribute, in lookup form (e.g. 'asset__debtor_id')
+            ignore_types: If True, the values are converted to strings
+        Returns:
+            One dimensional numpy array with a value per record. None is used for missing values.
+        """
+        attr = Finder._parse_lookup(attr)[0]
+        key = (attr, ignore_types)
+        if key not in self._columns:
+            values = [Finder._get_value(record, attr) for record in self._records]
+            if ignore_types:
+                values = [str(value) for value in values]
+            try:
+                column = self._np.asarray(values)
+            except ValueError:
+                # Sequences of different lengths can not be converted to a multidimensional array
+                column = None
+            # Sequence values would create a multidimensional array and numbers mixed with strings
+            # would be converted to strings, keep them as objects instead
+            if column is None or column.ndim != 1 or (
+                column.dtype.kind in "US" and not all(isinstance(v, (str, bytes)) for v in values)
+            ):
+                column = self._np.empty(len(values), dtype=object)
+                for i, value in enumerate(values):
+                    column[i] = value
+            self._columns[key] = column
+        return self._columns[key]
+
+    def _compare(self, column, op: str, value: Any):
+        np = self._np
+        if op == "in":
+            if isinstance(value, (list, tuple, set, frozenset)) and self._is_isin_compatible(column, list(value)):
+                mask = np.isin(column, np.asarray(list(value)))
+            else:
+                mask = np.frompyfunc(lambda item: item in value, 1, 1)(column)
+        elif isinstance(value, (list, tuple, set, frozenset, dict)):
+            # Compare each value with the whole container, instead of element by element
+            mask = np.frompyfunc(lambda item: Finder.ops[op](item, value), 1, 1)(column)
+        else:
+            mask = Finder.ops[op](column, value)
+        # Comparisons between incompatible types may be reduced to a single boolean
+        return np.broadcast_to(np.asarray(mask, dtype=bool), column.shape)
+
+    def _is_isin_compatible(self, column, items: List[Any]) -> bool:
+        """
+        Check if the items can be compared with the column by numpy, without being coerced to another type,
+        e.g. numbers to strings, which would give different results than comparing them one by one.
+        """
+        if column.dtype.kind in "biuf":
+            return self._np.asarray(items).dtype.kind in "biuf"
+        if column.dtype.kind == "U":
+            return all(isinstance(item, str) for item in items)
+        return False
+
+    def mask(self, ignore_types=False, **filters):
+        """
+        Evaluate the filters for all the records at once.
+
+        Args:
+            ignore_types: If True, compare the values as strings
+            **filters: Lookups in the form: {"attr__gt": 5}
+        Returns:
+            Boolean numpy array, True for the records that pass *all* the filters
+        """
+        mask = self._np.ones(len(self._records), dtype=bool)
+        for attr, op, value in Finder._compile(**filters):
+            if ignore_types:
+                value = str(value)
+            mask &= self._compare(self.column(attr, ignore_types), op, value)
+        return mask
+
+    def indices(self, ignore_types=False, **filters):
+        """Get the positions of the records that pass all the filters, as a numpy array."""
+        return self._np.flatnonzero(self.mask(ignore_types, **filters))
+
+    def filter(self, as_list=True, ignore_types=False, **filters) -> Union[List[Union[Dict, T]], Iterable]:
+        """Get the records that pass all the filters, as a list or as a generator."""
+        filtered_records = (self._records[i] for i in self.indices(ignore_types, **filters).tolist())
+        if as_list:
+            filtered_records = list(filtered_records)
+        return filtered_records
+
+    def find(self, **filters) -> Optional[Union[Dict, T]]:
+        """Get the first record that passes all the filters or None, with the same filters as Finder.find."""
+        indices = self.indices(filters.pop("ignore_types", False), **filters)
+        return self._records[indices[0]] if len(indices) else None
+
+
+_UNCHANGED = object()
+
+
+class DiffEngine:
+    """
+    Compiled version of get_differences, to detect the changes of many records with the same schema,
+    e.g. in sync jobs. The comparison strategy of each field is resolved once per schema (set of keys),
+    instead of once per value.
+
+    The available strategies are:
+        - 'auto': the same as get_differences, based on the type of the new value
+        - 'number': compare numbers taking the precision into consideration
+        - 'datetime': compare datetimes, adding the UTC timezone when missing
+        - 'exact': compare with !=
+        - a callable (old_value, new_value) -> bool, returning True if the values are equal
+    Examples:
+        >>> engine = DiffEngine(skip_keys=['updated_at'], number_precision=2, comparators={'name': str.__eq__})
+        >>> engine.diff({'id': 1, 'name': 'A', 'amount': 10.001}, {'id': 1, 'name': 'B', 'amount': 10.0})
+        {'name': 'B'}
+        >>> old_records = [{'id': 1, 'amount': 10}, {'id': 2, 'amount': 20}]
+        >>> new_records = [{'id': 1, 'amount': 10.0}, {'id': 2, 'amount': 25.0}, {'id': 3, 'amount': 30.0}]
+        >>> engine.diff_many(old_records, new_records)
+        {2: {'amount': 25.0}}
+        >>> engine.get_updates(old_records, new_records)
+        ([{'id': 2, 'amount': 25.0}], ['amount'])
+    """
+
+    def __init__(
+            self,
+            fields: Optional[Iterable[Hashable]] = None,
+            skip_keys: Optional[Iterable[Hashable]] = None,
+            number_precision: int = 6,
+            comparators: Optional[Dict[Hashable, Union[str, Callable[[Any, Any], bool]]]] = None,
+    ):
+        """
+        Args:
+            fields: Fields to compare. If not given, all the keys of the new data are compared
+            skip_keys: Optional list of keys to skip during comparison
+            number_precision: Precision used for number comparisons
+            comparators: Comparison strategy by field, 'auto' for the fields not given
+        """
+        self.skip_keys = set(skip_keys or ())
+        self.number_precision = number_precision
+        self._comparators = {
+            field: self._get_comparator(comparator) for field, comparator in (comparators or {}).items()
+        }
+        self._plans: Dict[Tuple, List[Tuple[Hashable, Callable]]] = {}
+        self._fields_plan = self._compile(fields) if fields is not None else None
+
+    def _get_comparator(self, comparator: Union[str, Callable[[Any, Any], bool]]) -> Callable[[Any, Any], Any]:
+        if callable(comparator):
+            return lambda old_value, new_value: _UNCHANGED if comparator(old_value, new_value) else new_value
+        try:
+            return {
+                "auto": self._diff_auto,
+                "number": self._diff_number,
+                "datetime": self._diff_datetime,
+                "exact": self._diff_exact,
+            }[comparator]
+        except KeyError:
+            raise ValueError(f"Invalid comparison strategy: {comparator}")
+
+    def _compile(self, keys: Iterable[Hashable]) -> List[Tuple[Hashable, Callable]]:
+        return [
+            (key, self._comparators.get(key, self._diff_auto))
+            for key in keys if key not in self.skip_keys
+        ]
+
+    def _get_plan(self, new_data: Dict) -> List[Tuple[Hashable, Callable]]:
+        if self._fields_plan is not None:
+            return self._fields_plan
+        keys = tuple(new_data)
+        try:
+            return self._plans[keys]
+        except KeyError:
+            plan = self._plans[keys] = self._compile(keys)
+            return plan
+
+    # Each comparison returns the value to be stored in the differences, or _UNCHANGED
+
+    @staticmethod
+    def _diff_exact(old_value: Any, new_value: Any) -> Any:
+        return new_value if old_value != new_value else _UNCHANGED
+
+    def _diff_number(self, old_value: Any, new_value: Any) -> Any:
+        if old_value == new_value:
+            return _UNCHANGED
+        if (old_value is None or new_value is None
+                or not are_equal(old_value, new_value, precision=self.number_precision)):
+            return new_value
+        return _UNCHANGED
+
+    @staticmethod
+    def _diff_datetime(old_value: Any, new_value: Any) -> Any:
+        if old_value == new_value:
+            return _UNCHANGED
+        if isinstance(old_value, datetime) and not old_value.tzinfo:
+            old_value = old_value.replace(tzinfo=timezone.utc)
+        if isinstance(new_value, datetime) and not new_value.tzinfo:
+            new_value = new_value.replace(tzinfo=timezone.utc)
+        return new_value if old_value != new_value else _UNCHANGED
+
+    def _diff_auto(self, old_value: Any, new_value: Any) -> Any:
+        # Equal values are equal for all the strategies
+        if old_value == new_value:
+            return _UNCHANGED
+        if isinstance(new_value, (float, Decimal)):
+            return self._diff_number(old_value, new_value)
+        if isinstance(new_value, datetime) or isinstance(old_value, datetime):
+            return self._diff_datetime(old_value, new_value)
+        return self._diff_exact(old_value, new_value)
+
+    def diff(self, old_data: Union[Dict, T], new_data: Dict) -> Dict:
+        """
+        Get a dictionary with the values that have changed between two versions of data,
+        like get_differences.
+
+        Args:
+            old_data: Object or dictionary containing the old version of the data
+            new_data: Dictionary containing the new version of the data
+        Returns:
+            Dict containing the keys that have changed with the new respective values
+        """
+        old_data_is_dict = isinstance(old_data, dict)
+        differences = {}
+        for key, compare in self._get_plan(new_data):
+            try:
+                new_value = new_data[key]
+            except KeyError:
+                continue
+            old_value = old_data[key] if old_data_is_dict else getattr(old_data, key)
+            value = compare(old_value, new_value)
+            if value is not _UNCHANGED:
+                differences[key] = value
+        return differences
+
+    @staticmethod
+    def _index(records: Union[Iterable[Union[Dict, T]], Dict[Hashable, Union[Dict, T]]], key: str) -> Dict:
+        if isinstance(records, dict):
+            return records
+        return {Finder._get_value(record, key): record for record in records}
+
+    def diff_many(
+            self,
+            old_records: Union[Iterable[Union[Dict, T]], Dict[Hashable, Union[Dict, T]]],
+            new_records: Iterable[Dict],
+            key: str = "id"
+    ) -> Dict[Hashable, Dict]:
+        """
+        Get the differences of many records, matching the old and the new versions by key.
+        New records without an old version are skipped.
+
+        Args:
+            old_records: Objects or dictionaries containing the old versions, or a dict of them by key
+            new_records: Dictionaries containing the new versions
+            key: The attribute used to match the records
+        Returns:
+            Dict with the differences of the changed records only, by key
+        """
+        old_records = self._index(old_records, key)
+        all_differences = {}
+        for new_data in new_records:
+            record_key = new_data[key]
+            old_data = old_records.get(record_key)
+            if old_data is None:
+                continue
+            if differences := self.diff(old_data, new_data):
+                all_differences[record_key] = differences
+        return all_differences
+
+    def get_updates(
+            self,
+            old_records: Union[Iterable[Union[Dict, T]], Dict[Hashable, Union[Dict, T]]],
+            new_records: Iterable[Dict],
+            key: str = "id"
+    ) -> Tuple[List[Union[Dict, T]], List[Hashable]]:
+        """
+        Apply the differences of many records on their old versions.
+        The result can be passed to safe_bulk_update(model, records, fields).
+
+        Args:
+            old_records: Objects or dictionaries containing the old versions, or a dict of them by key
+            new_records: Dictionaries containing the new versions
+            key: The attribute used to match the records
+        Returns:
+            Tuple with the changed records and the list of all the fields that have changed
+        """
+        old_records = self._index(old_records, key)
+        changed_records = []
+        changed_fields = {}
+        for record_key, differences in self.diff_many(old_records, new_records, key).items():
+            record = old_records[record_key]
+            for field, value in differences.items():
+                if isinstance(record, dict):
+                    record[field] = value
+                else:
+                    setattr(record, field, value)
+                changed_fields[field] = None
+            changed_records.append(record)
+        return changed_records, list(changed_fields)
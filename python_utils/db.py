@@ -1,5 +1,20 @@
+from collections import namedtuple
 from sqlite3 import Cursor
-from typing import List, Dict
+from typing import List, Dict, Any, Generator, Tuple
+
+ROW_TYPES = ('dict', 'tuple', 'namedtuple')
+
+
+def get_column_names(cursor: Cursor) -> List[str]:
+    """
+    Returns the names of the columns of the last query executed by the cursor.
+
+    Args:
+        cursor: Cursor object which executed the query
+    Returns:
+         list with the column names
+    """
+    return [col[0] for col in cursor.description]
 
 
 def fetch_all(cursor: Cursor) -> List[Dict]:
@@ -11,5 +26,53 @@ def fetch_all(cursor: Cursor) -> List[Dict]:
     Returns:
          list with all the records retrieved from the db formatted as dict
     """
-    desc = cursor.description
-    return [dict(zip([col[0] for col in desc], row)) for row in cursor.fetchall()]
+    columns = get_column_names(cursor)
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def fetch_columns(cursor: Cursor) -> Dict[str, List]:
+    """
+    Returns all rows from a cursor in column-oriented form, without creating a dict per row.
+
+    Args:
+        cursor: Cursor object storing the data to be fetched
+    Returns:
+         dict with a list of values for each column, in the order of the rows
+    """
+    columns = get_column_names(cursor)
+    rows = cursor.fetchall()
+    if not rows:
+        return {column: [] for column in columns}
+    return {column: list(values) for column, values in zip(columns, zip(*rows))}
+
+
+def iter_rows(cursor: Cursor, chunk_size: int = 2000, row_type: str = 'dict') -> Generator[Any, None, None]:
+    """
+    Lazily yields the rows from a cursor, fetching them in chunks with fetchmany,
+    to avoid loading all the results in memory.
+
+    Args:
+        cursor: Cursor object storing the data to be fetched
+        chunk_size: number of rows fetched at a time
+        row_type: type of the yielded rows, one of 'dict', 'tuple' or 'namedtuple'
+    Returns:
+         generator of rows
+    Raises:
+        ValueError: If the row_type is not supported
+    """
+    if row_type not in ROW_TYPES:
+        raise ValueError(f"Invalid row_type {row_type}, expected one of {ROW_TYPES}")
+
+    columns = get_column_names(cursor)
+    if row_type == 'namedtuple':
+        row_class = namedtuple('Row', columns, rename=True)
+        make_row = row_class._make
+    elif row_type == 'dict':
+        def make_row(row: Tuple) -> Dict:
+            return dict(zip(columns, row))
+    else:
+        make_row = tuple
+
+    while rows := cursor.fetchmany(chunk_size):
+        for row in rows:
+            yield make_row(row)
@@ -1,3 +1,6 @@
+from inspect import getattr_static
+from typing import Literal, Union
+
 from django.conf import settings
 from jwt.exceptions import ExpiredSignatureError, PyJWTError
 
@@ -5,7 +8,10 @@ from rest_framework import authentication
 from rest_framework.exceptions import AuthenticationFailed, PermissionDenied
 from rest_framework.permissions import BasePermission
 
-from .utils import create_or_update_user, decode_jwt
+from .utils import create_or_update_user, decode_jwt, get_prefixed_scopes, get_token_scopes
+
+# Allowed prefixed scopes of each view class and method
+_VIEW_ALLOWED_SCOPES: dict[tuple[type, str], Union[frozenset[str], Literal["*"]]] = {}
 
 
 class AuthenticationBackend(authentication.TokenAuthentication):
@@ -64,6 +70,28 @@ class HasScope(BasePermission):
     """
 
     def has_permission(self, request, view):
+        allowed_scopes = self._get_allowed_scopes(request, view)
+
+        if allowed_scopes == "*":
+            return True
+
+        if not request.auth or "scope" not in request.auth:
+            return False
+
+        return not allowed_scopes.isdisjoint(get_token_scopes(request.auth.get("scope", "")))
+
+    def _get_allowed_scopes(self, request, view) -> Union[frozenset[str], Literal["*"]]:
+        """
+        Get the allowed scopes of the view for the request method, prefixed with JWT_SCOPE_PREFIX.
+        They are computed once per view class, unless allowed_scopes is set on the view instance
+        or computed by the view (e.g. a property).
+        """
+        method = request.method.lower()
+        key = (type(view), method)
+        is_class_attribute = self._is_class_attribute(view)
+        if is_class_attribute and (scopes := _VIEW_ALLOWED_SCOPES.get(key)) is not None:
+            return scopes
+
         allowed_scopes = getattr(view, "allowed_scopes", None)
 
         if not allowed_scopes:
@@ -73,19 +101,18 @@ class HasScope(BasePermission):
             )
 
         if isinstance(allowed_scopes, dict):
-            allowed_scopes = allowed_scopes.get(request.method.lower(), [])
+            allowed_scopes = allowed_scopes.get(method, [])
 
-        if allowed_scopes == "*":
-            return True
+        scopes = get_prefixed_scopes(allowed_scopes)
+        if is_class_attribute:
+            _VIEW_ALLOWED_SCOPES[key] = scopes
 
-        if not request.auth or "scope" not in request.auth:
-            return False
+        return scopes
 
-        token_scopes_str = request.auth.get("scope", "")
-        token_scopes = set(token_scopes_str.split())
-
-        for scope in allowed_scopes:
-            if f"{getattr(settings, 'JWT_SCOPE_PREFIX', '')}:{scope}" in token_scopes:
-                return True
+    @staticmethod
+    def _is_class_attribute(view) -> bool:
+        """Whether allowed_scopes is a plain attribute of the view class, the same for all its instances."""
+        if "allowed_scopes" in vars(view):
+            return False
 
-        return False
+        return not hasattr(getattr_static(type(view), "allowed_scopes", None), "__get__")
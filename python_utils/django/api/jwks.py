@@ -0,0 +1,187 @@
+"""
+Per-tenant cache of the signing keys of the Auth Server, used to verify the JWT tokens.
+
+The keys of each tenant are fetched from its JWKS endpoint and indexed by `kid`.
+They are refreshed after JWKS_CACHE_TTL seconds, by a single thread per tenant,
+while the rest of the threads wait for the refresh instead of fetching the keys as well.
+The JWKS endpoint of a tenant is not fetched again before JWKS_MIN_REFRESH_INTERVAL seconds
+have passed since the last attempt, so unknown `kid`s are rejected without any request in between,
+and tokens with random `kid`s can not be used to flood the Auth Server.
+If a refresh fails, the expired keys are used until the next attempt.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Optional
+
+from django.conf import settings
+from jwt import PyJWK, PyJWKClient, get_unverified_header
+from jwt.exceptions import DecodeError, PyJWKClientError
+
+from ..oidc_settings import get_oidc_op_jwks_endpoint
+from ..tenant_context import TenantContext
+
+logger = logging.getLogger(__name__)
+
+JWKS_CACHE_TTL = getattr(settings, "JWKS_CACHE_TTL", 300)
+JWKS_MIN_REFRESH_INTERVAL = getattr(settings, "JWKS_MIN_REFRESH_INTERVAL", 30)
+JWKS_FETCH_TIMEOUT = getattr(settings, "JWKS_FETCH_TIMEOUT", 10)
+
+
+@dataclass
+class SigningKeyStoreMetrics:
+    hits: int = 0
+    misses: int = 0
+    refreshes: int = 0
+    refresh_errors: int = 0
+    unknown_kids: int = 0
+
+
+@dataclass
+class _TenantSigningKeys:
+    jwks_uri: str
+    keys: dict[str, PyJWK] = field(default_factory=dict)
+    fetched_at: float = float("-inf")
+    last_refresh_attempt: float = float("-inf")
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def fetch_signing_keys(jwks_uri: str) -> dict[str, PyJWK]:
+    """
+    Fetch the signing keys from the JWKS endpoint, indexed by kid.
+
+    Raises:
+        jwt.exceptions.PyJWKClientError: If the keys can not be fetched.
+    """
+    jwks_client = PyJWKClient(jwks_uri, cache_jwk_set=False, timeout=JWKS_FETCH_TIMEOUT)
+    return {key.key_id: key for key in jwks_client.get_signing_keys()}
+
+
+class SigningKeyStore:
+    """
+    Thread-safe store of the signing keys of each tenant.
+    Use the module level SIGNING_KEY_STORE instead of creating new instances.
+    """
+
+    def __init__(
+        self,
+        ttl: float = JWKS_CACHE_TTL,
+        min_refresh_interval: float = JWKS_MIN_REFRESH_INTERVAL,
+        fetch_keys: Callable[[str], dict[str, PyJWK]] = fetch_signing_keys,
+    ):
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.fetch_keys = fetch_keys
+        self.metrics = SigningKeyStoreMetrics()
+        self._tenants: dict[str, _TenantSigningKeys] = {}
+        self._lock = threading.Lock()
+
+    def get_signing_key_from_jwt(self, token: str) -> PyJWK:
+        """
+        Get the key used to sign the token, based on the `kid` of its header, for the current tenant.
+
+        Raises:
+            jwt.exceptions.DecodeError: If the header of the token can not be decoded.
+            jwt.exceptions.PyJWKClientError: If there is no signing key matching the kid of the token.
+        """
+        return self.get_signing_key(self._get_kid(token))
+
+    def get_cached_signing_key_from_jwt(self, token: str) -> Optional[PyJWK]:
+        """
+        Same as get_signing_key_from_jwt, but returns None instead of fetching the keys
+        when the key of the token is not cached or has expired, so it can be called from the event loop.
+
+        Raises:
+            jwt.exceptions.DecodeError: If the header of the token can not be decoded.
+        """
+        entry = self._get_tenant_keys(TenantContext.get())
+        key = entry.keys.get(self._get_kid(token))
+        if key is None or self._is_expired(entry):
+            return None
+
+        self.metrics.hits += 1
+        return key
+
+    def get_signing_key(self, kid: str) -> PyJWK:
+        """
+        Get the signing key with the given kid for the current tenant.
+
+        Raises:
+            jwt.exceptions.PyJWKClientError: If there is no signing key matching the kid.
+        """
+        entry = self._get_tenant_keys(TenantContext.get())
+
+        key = entry.keys.get(kid)
+        if key is not None and not self._is_expired(entry):
+            self.metrics.hits += 1
+            return key
+
+        self.metrics.misses += 1
+        with entry.lock:
+            # The keys may have been refreshed by another thread while waiting for the lock
+            key = entry.keys.get(kid)
+            if (key is None or self._is_expired(entry)) and self._can_refresh(entry):
+                self._refresh(entry, stale_key_available=key is not None)
+                key = entry.keys.get(kid)
+
+        if key is None:
+            self.metrics.unknown_kids += 1
+            raise PyJWKClientError(f'Unable to find a signing key that matches: "{kid}"')
+
+        return key
+
+    def clear(self, tenant: Optional[str] = None):
+        """Remove the cached keys of the tenant, or of all tenants if no tenant is given."""
+        with self._lock:
+            if tenant is None:
+                self._tenants.clear()
+            else:
+                self._tenants.pop(tenant, None)
+
+    def get_metrics(self) -> dict[str, int]:
+        return asdict(self.metrics)
+
+    @staticmethod
+    def _get_kid(token: str) -> str:
+        kid = get_unverified_header(token).get("kid")
+        if not kid:
+            raise DecodeError("Token header does not contain a 'kid'.")
+
+        return kid
+
+    def _get_tenant_keys(self, tenant: str) -> _TenantSigningKeys:
+        entry = self._tenants.get(tenant)
+        if entry is None:
+            with self._lock:
+                entry = self._tenants.get(tenant)
+                if entry is None:
+                    entry = self._tenants[tenant] = _TenantSigningKeys(jwks_uri=get_oidc_op_jwks_endpoint())
+
+        return entry
+
+    def _is_expired(self, entry: _TenantSigningKeys) -> bool:
+        return time.monotonic() - entry.fetched_at >= self.ttl
+
+    def _can_refresh(self, entry: _TenantSigningKeys) -> bool:
+        return time.monotonic() - entry.last_refresh_attempt >= self.min_refresh_interval
+
+    def _refresh(self, entry: _TenantSigningKeys, stale_key_available: bool):
+        entry.last_refresh_attempt = time.monotonic()
+        try:
+            keys = self.fetch_keys(entry.jwks_uri)
+        except PyJWKClientError:
+            self.metrics.refresh_errors += 1
+            if not stale_key_available:
+                raise
+            # Keep using the expired keys until the Auth Server is reachable again
+            logger.warning(f"Could not refresh the signing keys from {entry.jwks_uri}, using the cached ones.")
+            return
+
+        self.metrics.refreshes += 1
+        entry.keys = keys
+        entry.fetched_at = time.monotonic()
+
+
+SIGNING_KEY_STORE = SigningKeyStore()
@@ -10,13 +10,19 @@ from ninja.errors import AuthenticationError, HttpError
 
 from .utils import (
     acreate_or_update_user,
+    adecode_jwt,
     create_or_update_user,
     decode_jwt,
+    get_prefixed_scopes,
+    get_token_scopes,
     TokenPayload,
 )
 
 logger = logging.getLogger()
 
+# Allowed prefixed scopes of each path view and method, so that the view function is looked up only once
+_VIEW_ALLOWED_SCOPES: dict[tuple, Union[frozenset[str], Literal["*"]]] = {}
+
 
 class AuthBearer(HttpBearer):
     def __call__(self, request: HttpRequest):
@@ -78,25 +84,29 @@ class AuthBearer(HttpBearer):
         if allowed_scopes == "*":
             return
 
-        token_scopes_str = token_payload.get("scope", "")
-        token_scopes = set(token_scopes_str.split())
-
-        for scope in allowed_scopes:
-            if f"{getattr(settings, 'JWT_SCOPE_PREFIX', '')}:{scope}" in token_scopes:
-                return
+        if allowed_scopes.isdisjoint(get_token_scopes(token_payload.get("scope", ""))):
+            raise HttpError(403, "You are not allowed to access this resource.")
 
-        raise HttpError(403, "You are not allowed to access this resource.")
+    def _get_view_allowed_scopes(self, request) -> Union[frozenset[str], Literal["*"]]:
+        """
+        Get the allowed scopes of the view, prefixed with JWT_SCOPE_PREFIX.
+        """
+        key = (request.resolver_match.func.__self__, request.method.upper())
+        scopes = _VIEW_ALLOWED_SCOPES.get(key)
+        if scopes is not None:
+            return scopes
 
-    def _get_view_allowed_scopes(self, request):
         view_function = self._get_view_function(request)
-        scopes = getattr(view_function, "_allowed_scopes", None)
-
+        scopes = getattr(view_function, "_allowed_prefixed_scopes", None)
         if scopes is None:
-            raise Exception(
-                f"No allowed_scopes defined on the view {view_function.__name__}. "
-                "Add the decorator @allowed_scopes([...]) or @allowed_scopes('*') to the view."
-            )
-
+            if getattr(view_function, "_allowed_scopes", None) is None:
+                raise Exception(
+                    f"No allowed_scopes defined on the view {view_function.__name__}. "
+                    "Add the decorator @allowed_scopes([...]) or @allowed_scopes('*') to the view."
+                )
+            scopes = get_prefixed_scopes(view_function._allowed_scopes)
+
+        _VIEW_ALLOWED_SCOPES[key] = scopes
         return scopes
 
     def _get_view_function(self, request):
@@ -111,7 +121,8 @@ class AuthBearer(HttpBearer):
 
 class AuthBearerAsync(AuthBearer):
     """
-    Same as AuthBearer, but with async __call__ and authenticate methods.
+    Same as AuthBearer, but with async __call__ and authenticate methods,
+    and the tokens verified with adecode_jwt.
     """
 
     async def __call__(self, request: HttpRequest):
@@ -122,7 +133,7 @@ class AuthBearerAsync(AuthBearer):
         return await self.authenticate(request, token)
 
     async def authenticate(self, request: HttpRequest, token: str) -> TokenPayload:
-        payload = self._decode_token(token)
+        payload = await self._adecode_token(token)
 
         username = self._get_username(payload)
 
@@ -135,11 +146,20 @@ class AuthBearerAsync(AuthBearer):
         # The return value is stored in request.auth
         return payload
 
+    async def _adecode_token(self, token: str) -> TokenPayload:
+        try:
+            return await adecode_jwt(token)
+        except ExpiredSignatureError as e:
+            raise AuthenticationError("Token has expired.") from e
+        except PyJWTError as e:
+            raise AuthenticationError(f"Invalid token: {str(e)}") from e
+
 
 def allowed_scopes(scopes: Union[list[str], Literal["*"]]):
     """
     A decorator that attaches a list of required scopes to a view function
-    in the attribute `_allowed_scopes`.
+    in the attribute `_allowed_scopes`, and the same scopes prefixed with JWT_SCOPE_PREFIX
+    in the attribute `_allowed_prefixed_scopes`.
     This is used by a global authenticator to perform authorization checks.
     """
 
@@ -148,6 +168,7 @@ def allowed_scopes(scopes: Union[list[str], Literal["*"]]):
             raise ValueError("scopes must be a list of strings or '*'")
 
         setattr(view_func, "_allowed_scopes", scopes)
+        setattr(view_func, "_allowed_prefixed_scopes", get_prefixed_scopes(scopes))
         return view_func
 
     return decorator
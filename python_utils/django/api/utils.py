@@ -1,23 +1,45 @@
-from typing import Optional, TypedDict, Union
-
+import asyncio
+import contextvars
+import hashlib
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from typing import Literal, Optional, TypedDict, Union
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from jwt import decode, PyJWKClient
+from jwt import PyJWK, decode
 
-from ..oidc_settings import get_oidc_op_jwks_endpoint
 from ..tenant_context import TenantContext
+from .jwks import SIGNING_KEY_STORE, SigningKeyStore
 
-JWKS_CLIENTS = {}  # Cache for PyJWKClient instances
+# Maximum number of verified tokens to cache, the cache is disabled by default
+JWT_VERIFIED_TOKEN_CACHE_SIZE = getattr(settings, "JWT_VERIFIED_TOKEN_CACHE_SIZE", 0)
 
+# Seconds to cache the authenticated users, the cache is disabled by default
+AUTH_USER_CACHE_TTL = getattr(settings, "AUTH_USER_CACHE_TTL", 0)
+AUTH_USER_CACHE_MAX_SIZE = getattr(settings, "AUTH_USER_CACHE_MAX_SIZE", 10000)
 
-def get_jwks_client():
-    tenant = TenantContext.get()
+# Threads used by adecode_jwt to fetch the signing keys and verify the tokens, started only when needed
+JWT_VERIFICATION_WORKERS = getattr(settings, "JWT_VERIFICATION_WORKERS", 2)
+_JWT_VERIFICATION_EXECUTOR = ThreadPoolExecutor(
+    max_workers=JWT_VERIFICATION_WORKERS, thread_name_prefix="jwt-verification"
+)
 
-    if tenant not in JWKS_CLIENTS:
-        jwks_client = PyJWKClient(get_oidc_op_jwks_endpoint())
-        JWKS_CLIENTS[tenant] = jwks_client
 
-    return JWKS_CLIENTS[tenant]
+def get_jwks_client() -> SigningKeyStore:
+    """
+    Deprecated, use SIGNING_KEY_STORE instead, which caches the signing keys of each tenant.
+    Returns it, as it provides the get_signing_key_from_jwt and get_signing_key methods of PyJWKClient
+    for the current tenant.
+    """
+    warnings.warn("get_jwks_client is deprecated, use SIGNING_KEY_STORE instead.", DeprecationWarning, stacklevel=2)
+    return SIGNING_KEY_STORE
 
 
 class TokenPayload(TypedDict, total=False):
@@ -39,20 +61,134 @@ class TokenPayload(TypedDict, total=False):
     groups: list[str]  # Full path of the user group, e.g. "/group1/subgroup1"
 
 
+class VerifiedTokenCache:
+    """
+    Thread-safe LRU cache of the payloads of verified tokens, so that the signature of a token
+    is verified only the first time it is used. The tokens are identified by their digest,
+    the tenant and the audience, and are removed from the cache once they expire.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple, tuple[float, TokenPayload]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(token: str, audience: Union[str, list[str], None]) -> tuple:
+        if isinstance(audience, list):
+            audience = tuple(audience)
+        return TenantContext.get(), audience, hashlib.sha256(token.encode()).digest()
+
+    def get(self, key: tuple) -> Optional[TokenPayload]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, payload = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+
+        # Copy the payload, so that changes by the caller are not reflected in the cache
+        return _copy_claims(payload)
+
+    def set(self, key: tuple, payload: TokenPayload):
+        # Tokens without expiration are not cached, as they could never be removed
+        if "exp" not in payload:
+            return
+
+        with self._lock:
+            self._entries[key] = (payload["exp"], _copy_claims(payload))
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _copy_claims(value):
+    """Copy the dicts and lists of the claims of a token, e.g. groups or realm_access, at any depth."""
+    if isinstance(value, dict):
+        return {key: _copy_claims(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_claims(item) for item in value]
+    return value
+
+
+VERIFIED_TOKEN_CACHE = VerifiedTokenCache(JWT_VERIFIED_TOKEN_CACHE_SIZE) if JWT_VERIFIED_TOKEN_CACHE_SIZE > 0 else None
+
+
 def decode_jwt(token: str, audience: Optional[str] = None) -> TokenPayload:
     """
     Decode a JWT token using the public certificate of the Auth Server.
+    If JWT_VERIFIED_TOKEN_CACHE_SIZE is set, the payloads of the verified tokens are cached until they expire.
 
     Raises:
         jwt.exceptions.PyJWKClientError: If there is an error fetching the signing key.
         jwt.exceptions.InvalidTokenError: If the token is invalid or cannot be decoded.
     """
-    jwks_client = get_jwks_client()
-    signing_key = jwks_client.get_signing_key_from_jwt(token)
+    if audience is None:
+        audience = getattr(settings, "JWT_AUDIENCE", None)
+
+    cache_key = None
+    if VERIFIED_TOKEN_CACHE is not None:
+        cache_key = VERIFIED_TOKEN_CACHE.make_key(token, audience)
+        if payload := VERIFIED_TOKEN_CACHE.get(cache_key):
+            return payload
+
+    payload = _fetch_key_and_verify_jwt(token, audience)
+
+    if cache_key is not None:
+        VERIFIED_TOKEN_CACHE.set(cache_key, payload)
+
+    return payload
+
+
+async def adecode_jwt(token: str, audience: Optional[str] = None) -> TokenPayload:
+    """
+    Async version of decode_jwt. When the signing key is cached, the token is verified on the event loop,
+    as verifying the signature takes less time than switching to a thread. Otherwise the key is fetched
+    and the token verified in a separate thread, so that the event loop is not blocked.
 
+    Raises:
+        jwt.exceptions.PyJWKClientError: If there is an error fetching the signing key.
+        jwt.exceptions.InvalidTokenError: If the token is invalid or cannot be decoded.
+    """
     if audience is None:
         audience = getattr(settings, "JWT_AUDIENCE", None)
 
+    cache_key = None
+    if VERIFIED_TOKEN_CACHE is not None:
+        cache_key = VERIFIED_TOKEN_CACHE.make_key(token, audience)
+        if payload := VERIFIED_TOKEN_CACHE.get(cache_key):
+            return payload
+
+    signing_key = SIGNING_KEY_STORE.get_cached_signing_key_from_jwt(token)
+    if signing_key is not None:
+        payload = _verify_jwt(token, signing_key, audience)
+    else:
+        # The thread runs in a copy of the context, which holds the tenant of the token
+        payload = await asyncio.get_running_loop().run_in_executor(
+            _JWT_VERIFICATION_EXECUTOR,
+            partial(contextvars.copy_context().run, _fetch_key_and_verify_jwt, token, audience),
+        )
+
+    if cache_key is not None:
+        VERIFIED_TOKEN_CACHE.set(cache_key, payload)
+
+    return payload
+
+
+def _fetch_key_and_verify_jwt(token: str, audience: Optional[str]) -> TokenPayload:
+    return _verify_jwt(token, SIGNING_KEY_STORE.get_signing_key_from_jwt(token), audience)
+
+
+def _verify_jwt(token: str, signing_key: PyJWK, audience: Optional[str]) -> TokenPayload:
     return decode(
         token,
         signing_key.key,
@@ -61,6 +197,109 @@ def decode_jwt(token: str, audience: Optional[str] = None) -> TokenPayload:
     )
 
 
+class UserCache:
+    """
+    Thread-safe LRU cache of the authenticated users of each tenant, so that the requests of a user
+    whose token claims have not changed do not query the database.
+    The field values of each user are cached together with a hash of the user data of the token,
+    and a new user instance is built from them on each hit.
+    The user is fetched from the database again when the user data changes, or after ttl seconds.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple[str, str], tuple[float, int, tuple]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def hash_user_data(user_data: dict) -> int:
+        return hash(tuple(sorted(user_data.items())))
+
+    def get(self, username: str, user_data: dict):
+        tenant = TenantContext.get()
+        key = (tenant, username)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, user_data_hash, values = entry
+            if time.monotonic() >= expires_at or user_data_hash != self.hash_user_data(user_data):
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+
+        User = get_user_model()
+        return User.from_db(tenant, [field.attname for field in User._meta.concrete_fields], values)
+
+    def set(self, username: str, user_data: dict, user):
+        values = tuple(getattr(user, field.attname) for field in user._meta.concrete_fields)
+        key = (TenantContext.get(), username)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, self.hash_user_data(user_data), values)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: Optional[str] = None):
+        """Remove the user with the given username of the current tenant, or all the users if not given."""
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                self._entries.pop((TenantContext.get(), username), None)
+
+
+USER_CACHE = UserCache(AUTH_USER_CACHE_TTL, AUTH_USER_CACHE_MAX_SIZE) if AUTH_USER_CACHE_TTL > 0 else None
+
+# Locks of the users being created, with the number of threads using each of them
+_USER_CREATION_LOCKS: dict[tuple[str, str], tuple[threading.Lock, int]] = {}
+_USER_CREATION_LOCKS_LOCK = threading.Lock()
+
+
+@contextmanager
+def _user_creation_lock(username: str):
+    key = (TenantContext.get(), username)
+    with _USER_CREATION_LOCKS_LOCK:
+        lock, users = _USER_CREATION_LOCKS.get(key, (None, 0))
+        lock = lock or threading.Lock()
+        _USER_CREATION_LOCKS[key] = (lock, users + 1)
+
+    try:
+        with lock:
+            yield
+    finally:
+        with _USER_CREATION_LOCKS_LOCK:
+            lock, users = _USER_CREATION_LOCKS[key]
+            if users == 1:
+                del _USER_CREATION_LOCKS[key]
+            else:
+                _USER_CREATION_LOCKS[key] = (lock, users - 1)
+
+
+def get_prefixed_scopes(scopes: Union[list[str], Literal["*"]]) -> Union[frozenset[str], Literal["*"]]:
+    """
+    Get the scopes as they appear in the token, prefixed with JWT_SCOPE_PREFIX,
+    so that they can be matched against the token scopes with a single set operation.
+    """
+    if scopes == "*":
+        return "*"
+
+    scope_prefix = getattr(settings, "JWT_SCOPE_PREFIX", "")
+    return frozenset(f"{scope_prefix}:{scope}" for scope in scopes)
+
+
+@lru_cache(maxsize=1024)
+def get_token_scopes(scope: str) -> frozenset[str]:
+    """
+    Parse the scope claim of a token. The result is cached,
+    as the same tokens, and the same scopes, are used for many requests.
+    """
+    return frozenset(scope.split())
+
+
 def get_user_data_from_payload(payload: TokenPayload) -> dict:
     """
     Extract user data from the JWT payload.
@@ -89,42 +328,71 @@ def update_user_from_user_data(user, user_data: dict) -> bool:
     return update_needed
 
 
+def _create_user(username: str, user_data: dict):
+    """
+    Create a user, making sure that the concurrent first logins of the same user in this process
+    result in a single insert. The rest of the requests wait for it and then update the created user.
+    """
+    User = get_user_model()
+
+    with _user_creation_lock(username):
+        user = User.objects.filter(username=username).first()
+        if not user:
+            return User.objects.create(
+                username=username,
+                **user_data,
+            )
+
+    if update_user_from_user_data(user, user_data):
+        user.save(update_fields=list(user_data.keys()))
+
+    return user
+
+
 def create_or_update_user(username: str, payload: TokenPayload):
     """
     Create or update a user based on the JWT payload.
+    If AUTH_USER_CACHE_TTL is set, the database is not queried while the user data of the payload do not change.
     """
     User = get_user_model()
     user_data = get_user_data_from_payload(payload)
 
+    if USER_CACHE is not None and (user := USER_CACHE.get(username, user_data)):
+        return user
+
     user = User.objects.filter(username=username).first()
     if user:
         update_needed = update_user_from_user_data(user, user_data)
 
         if update_needed:
             user.save(update_fields=list(user_data.keys()))
-
-        return user
     else:
-        return User.objects.create(
-            username=username,
-            **user_data,
-        )
+        user = _create_user(username, user_data)
+
+    if USER_CACHE is not None:
+        USER_CACHE.set(username, user_data, user)
+
+    return user
 
 
 async def acreate_or_update_user(username: str, payload: TokenPayload):
     User = get_user_model()
     user_data = get_user_data_from_payload(payload)
 
+    if USER_CACHE is not None and (user := USER_CACHE.get(username, user_data)):
+        return user
+
     user = await User.objects.filter(username=username).afirst()
     if user:
         update_needed = update_user_from_user_data(user, user_data)
 
         if update_needed:
             await user.asave(update_fields=list(user_data.keys()))
-
-        return user
     else:
-        return await User.objects.acreate(
-            username=username,
-            **user_data,
-        )
+        # Created in a thread, so that the concurrent first logins are coalesced in the same way as in sync views
+        user = await sync_to_async(_create_user)(username, user_data)
+
+    if USER_CACHE is not None:
+        USER_CACHE.set(username, user_data, user)
+
+    return user
@@ -1,17 +1,47 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, NamedTuple, Optional
+
+from asgiref.sync import sync_to_async
 from django.apps import apps
 from django.conf import settings
-from django.db import models
+from django.core.cache import cache
+from django.db import connections
 from keycloak import KeycloakAdmin
 from keycloak import KeycloakOpenIDConnection
-from keycloak.exceptions import KeycloakGetError
+from keycloak.exceptions import KeycloakAuthenticationError, KeycloakGetError
 
 from ..oidc_settings import (
     KEYCLOAK_CONFIDENTIAL_CLIENT_ID,
+    KEYCLOAK_TOKEN_EXPIRY_MARGIN,
+    clear_oidc_confidential_client_token,
     get_keycloak_server_url,
     get_oidc_confidential_client_token,
 )
+from ..db.transaction import tenant_atomic
 from ..tenant_context import TenantContext
 
+logger = logging.getLogger(__name__)
+
+KEYCLOAK_GROUP_SYNC_DEBOUNCE = getattr(settings, "KEYCLOAK_GROUP_SYNC_DEBOUNCE", 60)
+KEYCLOAK_GROUP_SYNC_USE_CACHE = getattr(settings, "KEYCLOAK_GROUP_SYNC_USE_CACHE", False)
+KEYCLOAK_GROUP_SYNC_IN_BACKGROUND = getattr(settings, "KEYCLOAK_GROUP_SYNC_IN_BACKGROUND", False)
+KEYCLOAK_USER_GROUP_IDS_CACHE_TTL = getattr(settings, "KEYCLOAK_USER_GROUP_IDS_CACHE_TTL", 0)
+KEYCLOAK_USER_GROUP_IDS_CACHE_MAX_SIZE = getattr(settings, "KEYCLOAK_USER_GROUP_IDS_CACHE_MAX_SIZE", 10000)
+KEYCLOAK_USER_GROUP_IDS_USE_CACHE = getattr(settings, "KEYCLOAK_USER_GROUP_IDS_USE_CACHE", False)
+
+# KeycloakAdmin clients of each tenant, with a lock per tenant for creating them and renewing their token
+_KEYCLOAK_ADMINS: dict[str, KeycloakAdmin] = {}
+_KEYCLOAK_ADMIN_LOCKS: dict[str, threading.Lock] = {}
+
+# Time when the user groups of each tenant were last synced on demand, with a lock per tenant for syncing them
+_LAST_GROUP_SYNCS: dict[str, float] = {}
+_GROUP_SYNC_LOCKS: dict[str, threading.Lock] = {}
+
 
 def get_user_group_model():
     """
@@ -33,125 +63,365 @@ def get_user_group_model():
     return apps.get_model(model_string)
 
 
-class KeycloakService:
-    def __init__(self):
-        self._user_group_model = get_user_group_model()
-        self._keycloak_admin = self._get_keycloak_admin()
+def get_keycloak_admin() -> KeycloakAdmin:
+    """
+    Get the KeycloakAdmin client of the current tenant.
+    The clients are cached per tenant, so that their connections are reused,
+    and their token is renewed before it expires.
+    The client credentials token can not be refreshed by python-keycloak itself,
+    as the client authenticates with a service account token (or client secret) of this service,
+    so it is renewed here, and by the connection when Keycloak rejects it.
+    """
+    tenant = TenantContext.get()
+    keycloak_admin = _KEYCLOAK_ADMINS.get(tenant)
+    if keycloak_admin is not None and not _is_token_expiring(keycloak_admin):
+        return keycloak_admin
 
-    def sync_user_groups(self, raise_exceptions: bool = False):
-        print("Syncing user groups from Keycloak...")
+    with _KEYCLOAK_ADMIN_LOCKS.setdefault(tenant, threading.Lock()):
+        # The client may have been created or renewed by another thread while waiting for the lock
+        keycloak_admin = _KEYCLOAK_ADMINS.get(tenant)
+        if keycloak_admin is None:
+            keycloak_admin = _KEYCLOAK_ADMINS[tenant] = _create_keycloak_admin(tenant)
+        elif _is_token_expiring(keycloak_admin):
+            keycloak_admin.connection.token = get_oidc_confidential_client_token()
 
-        try:
-            groups = self._keycloak_admin.get_groups(full_hierarchy=True)
-        except KeycloakGetError as e:
-            print(f"Failed to fetch groups from Keycloak: {str(e)}")
-            if raise_exceptions:
-                raise e
+    return keycloak_admin
+
+
+def clear_keycloak_admins(tenant: Optional[str] = None):
+    """Remove the cached KeycloakAdmin client of the tenant, or of all tenants if no tenant is given."""
+    for tenant in [tenant] if tenant is not None else list(_KEYCLOAK_ADMINS):
+        with _KEYCLOAK_ADMIN_LOCKS.setdefault(tenant, threading.Lock()):
+            _KEYCLOAK_ADMINS.pop(tenant, None)
 
-            return
 
-        # Process existing and new groups
-        existing_groups = self._user_group_model.objects.all()
-        existing_groups_by_id = {str(group.id): group for group in existing_groups}
+class _ClientCredentialsConnection(KeycloakOpenIDConnection):
+    """
+    Connection authenticated with the client credentials token of this service.
+    python-keycloak refreshes the token when Keycloak rejects it (401), e.g. after it has been revoked,
+    but it can not request a client credentials token by itself. So the rejected token is dropped
+    from the cache of get_oidc_confidential_client_token, and a new one is requested instead.
+    """
 
-        reported_group_ids = set()
-        for group in groups:
-            self._process_group_recursively(group, existing_groups_by_id, reported_group_ids)
+    def refresh_token(self):
+        rejected_token = self.token
+        with _KEYCLOAK_ADMIN_LOCKS.setdefault(TenantContext.get(), threading.Lock()):
+            # The token may have been renewed by another thread while waiting for the lock
+            if self.token is rejected_token:
+                clear_oidc_confidential_client_token()
+                self.token = get_oidc_confidential_client_token()
 
-        # Identify deleted groups
-        deleted_groups = self._user_group_model.objects.exclude(id__in=reported_group_ids)
-        if deleted_groups.exists():
-            print(
-                f"Deleting groups no longer present in Keycloak: {list(deleted_groups.values_list('path', flat=True))}"
-            )
-            deleted_groups.delete()
 
-    def _get_keycloak_admin(self):
+def _create_keycloak_admin(tenant: str) -> KeycloakAdmin:
+    keycloak_connection = _ClientCredentialsConnection(
+        server_url=get_keycloak_server_url(),
+        realm_name=tenant,
+        user_realm_name=tenant,
+        client_id=KEYCLOAK_CONFIDENTIAL_CLIENT_ID,
+        token=get_oidc_confidential_client_token(),
+        verify=True,
+    )
+    return KeycloakAdmin(connection=keycloak_connection)
+
+
+def _is_token_expiring(keycloak_admin: KeycloakAdmin) -> bool:
+    expires_at = keycloak_admin.connection.expires_at
+    return expires_at is None or datetime.now(tz=timezone.utc) >= expires_at - timedelta(
+        seconds=KEYCLOAK_TOKEN_EXPIRY_MARGIN
+    )
+
+
+class UserGroupIdsCache:
+    """
+    Thread-safe LRU cache of the ids of the user groups matching the `groups` claim of a token, per tenant,
+    so that the groups of a user are resolved without processing their paths or querying the database.
+    Only complete resolutions are cached, and the entries of a tenant are invalidated whenever
+    sync_user_groups changes its groups, or after ttl seconds.
+
+    With use_django_cache, the entries are also stored in the Django cache to be shared between processes,
+    together with a generation of the groups of the tenant, which is incremented on invalidation.
+    The local entries keep the generation they were stored with, and are used only while it is
+    still the shared generation, so that the invalidations of other processes are seen immediately.
+    """
+
+    def __init__(self, ttl: float, max_size: int, use_django_cache: bool = False):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.use_django_cache = use_django_cache
+        self._entries: dict[str, OrderedDict[frozenset[str], tuple[float, int, list]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, group_paths: Iterable[str]) -> Optional[list]:
         tenant = TenantContext.get()
+        key = frozenset(group_paths)
+        local_entry = self._get_local(tenant, key)
+        if not self.use_django_cache:
+            return local_entry[1] if local_entry is not None else None
 
-        keycloak_connection = KeycloakOpenIDConnection(
-            server_url=get_keycloak_server_url(),
-            realm_name=tenant,
-            user_realm_name=tenant,
-            client_id=KEYCLOAK_CONFIDENTIAL_CLIENT_ID,
-            token=get_oidc_confidential_client_token(),
-            verify=True,
-        )
-        return KeycloakAdmin(connection=keycloak_connection)
+        generation_key, entry_key = self._get_django_cache_keys(tenant, key)
+        if local_entry is not None and local_entry[0] == cache.get(generation_key, 0):
+            return local_entry[1]
 
-    def _process_group_recursively(
-        self, group: dict, existing_groups_by_id: dict[str, models.Model], reported_group_ids: set[str]
-    ):
-        group_id = str(group["id"])
-        reported_group_ids.add(group_id)
+        cached = cache.get_many([generation_key, entry_key])
+        generation, entry = cached.get(generation_key, 0), cached.get(entry_key)
+        if entry is None or entry[0] != generation:
+            return None
 
-        if group_id in existing_groups_by_id:
-            existing_group = existing_groups_by_id[group_id]
-            if existing_group.path != group["path"]:
-                print(f"Updating group path from {existing_group.path} to {group['path']}...")
-                existing_group.path = group["path"]
-                existing_group.save()
-        else:
-            print(f"Creating new group with path {group['path']}...")
-            self._user_group_model.objects.create(id=group_id, path=group["path"])
+        self._set_local(tenant, key, generation, entry[1])
+        return entry[1]
 
-        if subgroups := group.get("subGroups"):
-            for subgroup in subgroups:
-                self._process_group_recursively(subgroup, existing_groups_by_id, reported_group_ids)
+    def set(self, group_paths: Iterable[str], ids: list):
+        tenant = TenantContext.get()
+        key = frozenset(group_paths)
+        if not self.use_django_cache:
+            self._set_local(tenant, key, 0, ids)
+            return
 
+        generation_key, entry_key = self._get_django_cache_keys(tenant, key)
+        generation = cache.get(generation_key, 0)
+        self._set_local(tenant, key, generation, ids)
+        cache.set(entry_key, (generation, ids), self.ttl)
 
-class KeycloakServiceAsync(KeycloakService):
+    def invalidate(self):
+        """Remove the entries of the current tenant."""
+        tenant = TenantContext.get()
+        with self._lock:
+            self._entries.pop(tenant, None)
+
+        if self.use_django_cache:
+            generation_key = self._get_django_cache_keys(tenant)[0]
+            # The generation never expires, so that it is not reset to an older value
+            cache.add(generation_key, 0, None)
+            cache.incr(generation_key)
+
+    def _get_local(self, tenant: str, key: frozenset[str]) -> Optional[tuple[int, list]]:
+        """Get the generation and the ids of the local entry, or None if there is none or it has expired."""
+        with self._lock:
+            entries = self._entries.get(tenant)
+            entry = entries.get(key) if entries else None
+            if entry is None:
+                return None
+
+            expires_at, generation, ids = entry
+            if time.monotonic() >= expires_at:
+                del entries[key]
+                return None
+
+            entries.move_to_end(key)
+            return generation, ids
+
+    def _set_local(self, tenant: str, key: frozenset[str], generation: int, ids: list):
+        with self._lock:
+            entries = self._entries.setdefault(tenant, OrderedDict())
+            entries[key] = (time.monotonic() + self.ttl, generation, ids)
+            entries.move_to_end(key)
+            if len(entries) > self.max_size:
+                entries.popitem(last=False)
+
+    @staticmethod
+    def _get_django_cache_keys(tenant: str, key: frozenset[str] = frozenset()) -> tuple[str, str]:
+        digest = hashlib.sha256("\n".join(sorted(key)).encode()).hexdigest()
+        return f"keycloak_user_group_ids:{tenant}", f"keycloak_user_group_ids:{tenant}:{digest}"
+
+
+USER_GROUP_IDS_CACHE = (
+    UserGroupIdsCache(
+        KEYCLOAK_USER_GROUP_IDS_CACHE_TTL, KEYCLOAK_USER_GROUP_IDS_CACHE_MAX_SIZE, KEYCLOAK_USER_GROUP_IDS_USE_CACHE
+    )
+    if KEYCLOAK_USER_GROUP_IDS_CACHE_TTL > 0
+    else None
+)
+
+
+def sync_user_groups_once(since: float) -> bool:
     """
-    Async version of KeycloakService.
+    Sync the user groups of the current tenant when some of them are missing, at most once per
+    KEYCLOAK_GROUP_SYNC_DEBOUNCE seconds. Concurrent callers wait for the sync in progress instead
+    of starting their own. With KEYCLOAK_GROUP_SYNC_USE_CACHE, the debounce is shared by all the
+    processes through the Django cache, and with KEYCLOAK_GROUP_SYNC_IN_BACKGROUND, the sync is
+    done in a background thread without waiting for it.
+
+    Returns whether the groups have been synced after `since` (a time.monotonic() value),
+    so that the caller knows if it is worth querying them again.
     """
+    tenant = TenantContext.get()
+    if not KEYCLOAK_GROUP_SYNC_IN_BACKGROUND:
+        return _sync_user_groups_once(tenant, since)
+
+    lock = _GROUP_SYNC_LOCKS.setdefault(tenant, threading.Lock())
+    if not lock.locked() and not _is_group_sync_debounced(tenant):
+        threading.Thread(target=_sync_user_groups_in_background, args=(tenant, since), daemon=True).start()
+
+    return False
+
+
+def _sync_user_groups_once(tenant: str, since: float) -> bool:
+    with _GROUP_SYNC_LOCKS.setdefault(tenant, threading.Lock()):
+        # The groups may have been synced by another thread while waiting for the lock
+        if _LAST_GROUP_SYNCS.get(tenant, float("-inf")) >= since:
+            return True
+        if _is_group_sync_debounced(tenant):
+            return False
+        if KEYCLOAK_GROUP_SYNC_USE_CACHE and not cache.add(
+            f"keycloak_group_sync:{tenant}", True, KEYCLOAK_GROUP_SYNC_DEBOUNCE
+        ):
+            # Synced by another process
+            return False
+
+        try:
+            result = KeycloakService().sync_user_groups()
+        finally:
+            # Failed syncs are debounced as well, so that Keycloak is not flooded while it is unavailable
+            _LAST_GROUP_SYNCS[tenant] = time.monotonic()
+
+        return result is not None
+
+
+def _sync_user_groups_in_background(tenant: str, since: float):
+    try:
+        with TenantContext(tenant):
+            _sync_user_groups_once(tenant, since)
+    except Exception:
+        logger.exception(f"Failed to sync the user groups of tenant '{tenant}'.")
+    finally:
+        connections.close_all()
+
+
+def _is_group_sync_debounced(tenant: str) -> bool:
+    return time.monotonic() - _LAST_GROUP_SYNCS.get(tenant, float("-inf")) < KEYCLOAK_GROUP_SYNC_DEBOUNCE
+
 
-    async def sync_user_groups(self, raise_exceptions: bool = False):
-        print("Syncing user groups from Keycloak...")
+class GroupSyncResult(NamedTuple):
+    created: int
+    updated: int
+    deleted: int
+    duration: float
 
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.created or self.updated or self.deleted)
+
+
+class KeycloakService:
+    # Number of groups written per query
+    batch_size = 1000
+
+    def __init__(self):
+        self._user_group_model = get_user_group_model()
+        self._keycloak_admin = self._get_keycloak_admin()
+
+    def sync_user_groups(self, raise_exceptions: bool = False) -> Optional[GroupSyncResult]:
+        """
+        Sync the user groups with the groups of the Keycloak realm, in a single transaction.
+        Returns the number of created, updated and deleted groups, or None if the groups could not be fetched.
+        """
+        logger.info("Syncing user groups from Keycloak...")
+        start = time.monotonic()
+
+        groups = self._fetch_groups(raise_exceptions)
+        if groups is None:
+            return None
+
+        result = self._apply_group_changes(self._flatten_groups(groups), start)
+        self._report(result)
+
+        return result
+
+    def _get_keycloak_admin(self):
+        return get_keycloak_admin()
+
+    def _fetch_groups(self, raise_exceptions: bool) -> Optional[list[dict]]:
         try:
-            groups = self._keycloak_admin.get_groups(full_hierarchy=True)
-        except KeycloakGetError as e:
-            print(f"Failed to fetch groups from Keycloak: {str(e)}")
+            return self._keycloak_admin.get_groups(full_hierarchy=True)
+        except (KeycloakGetError, KeycloakAuthenticationError) as e:
+            if isinstance(e, KeycloakAuthenticationError):
+                # Rejected even with a new token, so neither the token nor the client are reused
+                clear_oidc_confidential_client_token()
+                clear_keycloak_admins(TenantContext.get())
+            logger.error(f"Failed to fetch groups from Keycloak: {str(e)}")
             if raise_exceptions:
                 raise e
 
-            return
+            return None
 
-        # Process existing and new groups
-        existing_groups = self._user_group_model.objects.all()
-        existing_groups_by_id = {str(group.id): group async for group in existing_groups}
+    @staticmethod
+    def _flatten_groups(groups: list[dict]) -> dict[str, str]:
+        """
+        Get the path of each group of the hierarchy by its id.
+        """
+        paths_by_id = {}
+        pending = list(groups)
+        while pending:
+            group = pending.pop()
+            paths_by_id[str(group["id"])] = group["path"]
+            pending.extend(group.get("subGroups") or ())
 
-        reported_group_ids = set()
-        for group in groups:
-            await self._process_group_recursively(group, existing_groups_by_id, reported_group_ids)
+        return paths_by_id
 
-        # Identify deleted groups
-        deleted_groups = self._user_group_model.objects.exclude(id__in=reported_group_ids)
-        if await deleted_groups.aexists():
-            paths = [path async for path in deleted_groups.values_list("path", flat=True)]
-            print(f"Deleting groups no longer present in Keycloak: {paths}")
+    def _apply_group_changes(self, reported_paths_by_id: dict[str, str], start: float) -> GroupSyncResult:
+        """
+        Create, update and delete the groups in bulk, based on their differences with the reported groups.
+        """
+        UserGroup = self._user_group_model
+
+        with tenant_atomic():
+            existing_paths_by_id = {
+                str(group_id): path for group_id, path in UserGroup.objects.values_list("id", "path")
+            }
+
+            groups_to_create = []
+            groups_to_update = []
+            for group_id, path in reported_paths_by_id.items():
+                if group_id not in existing_paths_by_id:
+                    groups_to_create.append(UserGroup(id=group_id, path=path))
+                elif existing_paths_by_id[group_id] != path:
+                    groups_to_update.append(UserGroup(id=group_id, path=path))
+            deleted_group_ids = existing_paths_by_id.keys() - reported_paths_by_id.keys()
+
+            if groups_to_create:
+                UserGroup.objects.bulk_create(groups_to_create, batch_size=self.batch_size)
+            if groups_to_update:
+                UserGroup.objects.bulk_update(groups_to_update, ["path"], batch_size=self.batch_size)
+            if deleted_group_ids:
+                UserGroup.objects.filter(id__in=deleted_group_ids).delete()
+
+        result = GroupSyncResult(
+            created=len(groups_to_create),
+            updated=len(groups_to_update),
+            deleted=len(deleted_group_ids),
+            duration=time.monotonic() - start,
+        )
+        if result.has_changes and USER_GROUP_IDS_CACHE is not None:
+            USER_GROUP_IDS_CACHE.invalidate()
 
-            await deleted_groups.adelete()
+        return result
 
-    async def _process_group_recursively(
-        self, group: dict, existing_groups_by_id: dict[str, models.Model], reported_group_ids: set[str]
-    ):
-        group_id = str(group["id"])
-        reported_group_ids.add(group_id)
+    @staticmethod
+    def _report(result: GroupSyncResult):
+        logger.info(
+            f"Synced user groups from Keycloak in {result.duration:.2f}s: "
+            f"{result.created} created, {result.updated} updated, {result.deleted} deleted."
+        )
 
-        if group_id in existing_groups_by_id:
-            existing_group = existing_groups_by_id[group_id]
-            if existing_group.path != group["path"]:
-                print(f"Updating group path from {existing_group.path} to {group['path']}...")
-                existing_group.path = group["path"]
-                await existing_group.asave()
-        else:
-            print(f"Creating new group with path {group['path']}...")
-            await self._user_group_model.objects.acreate(id=group_id, path=group["path"])
 
-        if subgroups := group.get("subGroups"):
-            for subgroup in subgroups:
-                await self._process_group_recursively(subgroup, existing_groups_by_id, reported_group_ids)
+class KeycloakServiceAsync(KeycloakService):
+    """
+    Async version of KeycloakService.
+    """
+
+    async def sync_user_groups(self, raise_exceptions: bool = False) -> Optional[GroupSyncResult]:
+        logger.info("Syncing user groups from Keycloak...")
+        start = time.monotonic()
+
+        groups = self._fetch_groups(raise_exceptions)
+        if groups is None:
+            return None
+
+        # The changes are applied in a thread, as transactions are not supported by the async ORM
+        result = await sync_to_async(self._apply_group_changes)(self._flatten_groups(groups), start)
+        self._report(result)
+
+        return result
 
 
 class AuthServiceBase:
@@ -167,36 +437,75 @@ class AuthServiceBase:
             path = "/".join(path.split("/")[:-1])
         return paths
 
+    @classmethod
+    def _get_user_group_ids_from_paths(cls, group_paths: list[str]) -> list:
+        """
+        Get the ids of the user groups of the given paths and their ancestors.
+        With KEYCLOAK_USER_GROUP_IDS_CACHE_TTL, this is a dictionary lookup for the already resolved paths.
+        """
+        if USER_GROUP_IDS_CACHE is not None and (ids := USER_GROUP_IDS_CACHE.get(group_paths)) is not None:
+            return ids
+
+        return [user_group.pk for user_group in cls._get_user_groups_from_paths(group_paths)]
+
     @classmethod
     def _get_user_groups_from_paths(cls, group_paths: list[str]):
+        UserGroup = get_user_group_model()
+        if USER_GROUP_IDS_CACHE is not None and (ids := USER_GROUP_IDS_CACHE.get(group_paths)) is not None:
+            return UserGroup.objects.filter(pk__in=ids)
+
         all_group_paths = set()
         for path in group_paths:
             all_group_paths.update(cls._get_all_level_paths(path))
 
-        UserGroup = get_user_group_model()
+        started = time.monotonic()
         user_groups = UserGroup.objects.filter(path__in=all_group_paths)
 
-        # If a group is missing/has been renamed in Keycloak, sync the groups
-        if user_groups.count() != len(all_group_paths):
-            KeycloakService().sync_user_groups()
-            user_groups = UserGroup.objects.filter(path__in=all_group_paths)
+        # If a group is missing/has been renamed in Keycloak, sync the groups.
+        # The evaluated queryset is returned, so the groups are queried only once.
+        found_paths = {user_group.path for user_group in user_groups}
+        if found_paths != all_group_paths:
+            logger.info(f"User groups {sorted(all_group_paths - found_paths)} not found, syncing the user groups.")
+            if sync_user_groups_once(since=started):
+                user_groups = UserGroup.objects.filter(path__in=all_group_paths)
+                found_paths = {user_group.path for user_group in user_groups}
+
+        if USER_GROUP_IDS_CACHE is not None and found_paths == all_group_paths:
+            USER_GROUP_IDS_CACHE.set(group_paths, [user_group.pk for user_group in user_groups])
 
         return user_groups
 
 
 class AuthServiceBaseAsync(AuthServiceBase):
+    @classmethod
+    async def _get_user_group_ids_from_paths(cls, group_paths: list[str]) -> list:
+        if USER_GROUP_IDS_CACHE is not None and (ids := USER_GROUP_IDS_CACHE.get(group_paths)) is not None:
+            return ids
+
+        return [user_group.pk async for user_group in await cls._get_user_groups_from_paths(group_paths)]
+
     @classmethod
     async def _get_user_groups_from_paths(cls, group_paths: list[str]):
+        UserGroup = get_user_group_model()
+        if USER_GROUP_IDS_CACHE is not None and (ids := USER_GROUP_IDS_CACHE.get(group_paths)) is not None:
+            return UserGroup.objects.filter(pk__in=ids)
+
         all_group_paths = set()
         for path in group_paths:
             all_group_paths.update(cls._get_all_level_paths(path))
 
-        UserGroup = get_user_group_model()
+        started = time.monotonic()
         user_groups = UserGroup.objects.filter(path__in=all_group_paths)
 
         # If a group is missing/has been renamed in Keycloak, sync the groups
-        if await user_groups.acount() != len(all_group_paths):
-            await KeycloakServiceAsync().sync_user_groups()
-            user_groups = UserGroup.objects.filter(path__in=all_group_paths)
+        found_paths = {user_group.path async for user_group in user_groups}
+        if found_paths != all_group_paths:
+            logger.info(f"User groups {sorted(all_group_paths - found_paths)} not found, syncing the user groups.")
+            if await sync_to_async(sync_user_groups_once)(since=started):
+                user_groups = UserGroup.objects.filter(path__in=all_group_paths)
+                found_paths = {user_group.path async for user_group in user_groups}
+
+        if USER_GROUP_IDS_CACHE is not None and found_paths == all_group_paths:
+            USER_GROUP_IDS_CACHE.set(group_paths, [user_group.pk async for user_group in user_groups])
 
         return user_groups
@@ -2,15 +2,18 @@
 Multi-tenant Celery Beat scheduler.
 
 Reads periodic tasks from every tenant database and injects the ``tenant``
-kwarg so that ``TenantAwareTask`` can route each execution to the correct
+header so that ``TenantAwareTask`` can route each execution to the correct
 database.  Static beat-schedule entries (``CELERY_BEAT_SCHEDULE``) are also
 run once per tenant.
 """
 
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from contextlib import contextmanager
+from typing import Optional
 
 from celery.utils.log import get_logger
-from django.db import close_old_connections, transaction
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
 from django.db.utils import DatabaseError, InterfaceError
 from django_celery_beat.models import PeriodicTask, PeriodicTasks
 from django_celery_beat.schedulers import DatabaseScheduler, ModelEntry
@@ -21,11 +24,14 @@ from ..tenant_context import TenantContext
 logger = get_logger(__name__)
 debug, info, warning = logger.debug, logger.info, logger.warning
 
+SCHEDULE_CHECK_WORKERS = getattr(settings, "CELERY_BEAT_SCHEDULE_CHECK_WORKERS", 8)
+SCHEDULE_CHECK_TIMEOUT = getattr(settings, "CELERY_BEAT_SCHEDULE_CHECK_TIMEOUT", 5)
+
 
 class TenantAwareModelEntry(ModelEntry):
     """
-    A schedule entry that remembers which tenant it belongs to and
-    injects the tenant kwarg when the task is applied.
+    A schedule entry that remembers which tenant it belongs to, so that
+    the scheduler sends the tenant header when the task is applied.
     """
 
     def __init__(self, model, app=None, tenant=None):
@@ -74,7 +80,7 @@ class TenantAwareDatabaseScheduler(DatabaseScheduler):
 
     1. Reads ``PeriodicTask`` rows from each tenant DB.
     2. Wraps them in ``TenantAwareModelEntry`` (which carries the tenant name).
-    3. When a task is due, injects ``tenant=<name>`` into the task kwargs
+    3. When a task is due, injects ``tenant=<name>`` into the task headers
        so that ``TenantAwareTask`` can set the context on the worker side.
     """
 
@@ -82,6 +88,11 @@ class TenantAwareDatabaseScheduler(DatabaseScheduler):
 
     def __init__(self, *args, **kwargs):
         self._last_timestamps: dict[str, object] = {}
+        # Tenants whose schedule changed since the last time it was built
+        self._changed_tenants: set[str] = set()
+        # Pool of the schedule_changed checks, with the checks that have not finished yet
+        self._check_executor: Optional[ThreadPoolExecutor] = None
+        self._pending_checks: dict[str, Future] = {}
         super().__init__(*args, **kwargs)
 
     @staticmethod
@@ -89,64 +100,147 @@ class TenantAwareDatabaseScheduler(DatabaseScheduler):
         return TENANT_DATABASES
 
     def all_as_schedule(self):
-        """Build the combined schedule dict from all tenant databases."""
-        debug("TenantAwareDatabaseScheduler: Fetching schedule from all tenants")
-        combined: dict[str, TenantAwareModelEntry] = {}
+        """
+        Build the combined schedule dict from all tenant databases.
 
-        for tenant in self._get_tenant_databases():
-            with TenantContext(tenant):
-                try:
-                    for model in PeriodicTask.objects.enabled():
-                        try:
-                            entry = TenantAwareModelEntry(model, app=self.app, tenant=tenant)
-                            combined[entry.name] = entry
-                        except ValueError as exc:
-                            logger.warning(
-                                "TenantAwareDatabaseScheduler: skipping malformed periodic task '%s' in tenant '%s': %r",
-                                model.name,
-                                tenant,
-                                exc,
-                            )
-                except Exception as exc:
-                    logger.exception(
-                        "TenantAwareDatabaseScheduler: error reading tenant %s: %r",
-                        tenant,
-                        exc,
-                    )
+        When ``schedule_changed`` has detected changes in some tenants, only the
+        entries of those tenants are rebuilt, and the entries of the rest are
+        kept from the current schedule. Otherwise (initial read or periodic full
+        sync), the entries of all tenants are rebuilt.
+        """
+        changed_tenants, self._changed_tenants = self._changed_tenants, set()
+        tenants = self._get_tenant_databases()
+
+        if not changed_tenants or self._schedule is None:
+            debug("TenantAwareDatabaseScheduler: Fetching schedule from all tenants")
+            combined: dict[str, TenantAwareModelEntry] = {}
+            for tenant in tenants:
+                combined.update(self._get_tenant_schedule(tenant) or {})
+            return combined
+
+        debug("TenantAwareDatabaseScheduler: Fetching schedule from tenants %s", sorted(changed_tenants))
+        combined = {}
+        for name, entry in self._schedule.items():
+            if getattr(entry, "tenant", None) not in changed_tenants:
+                combined[name] = entry
+
+        for tenant in changed_tenants & set(tenants):
+            tenant_schedule = self._get_tenant_schedule(tenant)
+            if tenant_schedule is None:
+                # Keep the current entries of the tenant until it can be read again
+                tenant_schedule = {
+                    name: entry for name, entry in self._schedule.items() if getattr(entry, "tenant", None) == tenant
+                }
+            combined.update(tenant_schedule)
 
         return combined
 
+    def _get_tenant_schedule(self, tenant: str) -> Optional[dict[str, TenantAwareModelEntry]]:
+        """Build the schedule entries of a tenant, or return None if its database can not be read."""
+        schedule: dict[str, TenantAwareModelEntry] = {}
+        with TenantContext(tenant):
+            try:
+                for model in PeriodicTask.objects.enabled():
+                    try:
+                        entry = TenantAwareModelEntry(model, app=self.app, tenant=tenant)
+                        schedule[entry.name] = entry
+                    except ValueError as exc:
+                        logger.warning(
+                            "TenantAwareDatabaseScheduler: skipping malformed periodic task '%s' in tenant '%s': %r",
+                            model.name,
+                            tenant,
+                            exc,
+                        )
+            except Exception as exc:
+                logger.exception(
+                    "TenantAwareDatabaseScheduler: error reading tenant %s: %r",
+                    tenant,
+                    exc,
+                )
+                return None
+
+        return schedule
+
     def schedule_changed(self):
         """Check whether *any* tenant database has had a schedule change."""
-        changed = False
         try:
             close_old_connections()
-
-            for tenant in self._get_tenant_databases():
-                try:
-                    transaction.commit(using=tenant)
-                except transaction.TransactionManagementError:
-                    pass
-
-                try:
-                    with TenantContext(tenant):
-                        ts = PeriodicTasks.last_change()
-                    last = self._last_timestamps.get(tenant)
-                    if ts and ts > (last if last else ts):
-                        changed = True
-                    self._last_timestamps[tenant] = ts
-                except (DatabaseError, InterfaceError) as exc:
-                    logger.warning(
-                        "TenantAwareDatabaseScheduler: error checking schedule_changed for tenant %s: %r",
-                        tenant,
-                        exc,
-                    )
         except (DatabaseError, InterfaceError) as exc:
             logger.exception("Database error in schedule_changed: %r", exc)
             return False
 
+        changed = False
+        for tenant, ts in self._get_last_changes().items():
+            last = self._last_timestamps.get(tenant)
+            if ts and ts > (last if last else ts):
+                changed = True
+                self._changed_tenants.add(tenant)
+            self._last_timestamps[tenant] = ts
+
         return changed
 
+    def _get_last_changes(self) -> dict[str, object]:
+        """
+        Get the last schedule change of each tenant, checking the tenants in parallel.
+
+        Tenants that do not answer within ``CELERY_BEAT_SCHEDULE_CHECK_TIMEOUT``
+        seconds are skipped in this tick, and are not checked again until their
+        pending check finishes, so a slow database does not stall the beat loop.
+        """
+        tenants = self._get_tenant_databases()
+        if self._check_executor is None:
+            self._check_executor = ThreadPoolExecutor(
+                max_workers=max(1, min(SCHEDULE_CHECK_WORKERS, len(tenants))),
+                thread_name_prefix="beat-schedule-check",
+            )
+
+        for tenant in tenants:
+            if tenant not in self._pending_checks:
+                self._pending_checks[tenant] = self._check_executor.submit(self._get_last_change, tenant)
+
+        wait(self._pending_checks.values(), timeout=SCHEDULE_CHECK_TIMEOUT)
+
+        last_changes = {}
+        for tenant, future in list(self._pending_checks.items()):
+            if not future.done():
+                logger.warning(
+                    "TenantAwareDatabaseScheduler: schedule_changed check timed out for tenant %s, skipping it",
+                    tenant,
+                )
+                continue
+
+            del self._pending_checks[tenant]
+            try:
+                last_changes[tenant] = future.result()
+            except (DatabaseError, InterfaceError) as exc:
+                logger.warning(
+                    "TenantAwareDatabaseScheduler: error checking schedule_changed for tenant %s: %r",
+                    tenant,
+                    exc,
+                )
+
+        return last_changes
+
+    @staticmethod
+    def _get_last_change(tenant: str):
+        """Get the last schedule change of a tenant, in a thread of the check pool."""
+        connections[tenant].close_if_unusable_or_obsolete()
+        try:
+            transaction.commit(using=tenant)
+        except transaction.TransactionManagementError:
+            pass
+
+        with TenantContext(tenant):
+            return PeriodicTasks.last_change()
+
+    def close(self):
+        """Stop the pool of the schedule_changed checks, without waiting for the checks that are stuck."""
+        if self._check_executor is not None:
+            self._check_executor.shutdown(wait=False, cancel_futures=True)
+            self._check_executor = None
+            self._pending_checks.clear()
+        super().close()
+
     def is_due(self, entry):
         """Wrap in TenantContext so that any model.save() calls within
         (e.g. disabling one-off tasks) are routed to the correct tenant DB."""
@@ -157,17 +251,15 @@ class TenantAwareDatabaseScheduler(DatabaseScheduler):
         return entry.is_due()
 
     def apply_entry(self, entry, producer=None):
-        """Inject the ``tenant`` kwarg before dispatching the task so that
+        """Inject the ``tenant`` header before dispatching the task so that
         ``TenantAwareTask.__call__`` can set the tenant context on the worker.
 
         Built-in tasks like ``celery.backend_cleanup`` are skipped because
-        they are not ``TenantAwareTask`` subclasses and don't accept the kwarg.
+        they are not ``TenantAwareTask`` subclasses and don't need a tenant.
         """
         tenant = getattr(entry, "tenant", None)
         if tenant and entry.task != "celery.backend_cleanup":
-            extra_kwargs = dict(entry.kwargs or {})
-            extra_kwargs[TENANT_KEY] = tenant
-            entry.kwargs = extra_kwargs
+            entry.options = {**entry.options, "headers": {**(entry.options.get("headers") or {}), TENANT_KEY: tenant}}
         super().apply_entry(entry, producer=producer)
 
     def setup_schedule(self):
@@ -1,8 +1,10 @@
-from copy import deepcopy
+from contextvars import ContextVar
+from typing import Iterable, Optional
 
 from celery import Task
+from celery.result import ResultSet
 
-from ..settings import TENANT_KEY
+from ..settings import TENANT_DATABASES, TENANT_KEY
 from ..tenant_context import TenantContext
 
 try:
@@ -17,8 +19,19 @@ except ImportError:
 
 CELERY_BACKEND_CLEANUP_TASK = "celery.backend_cleanup"
 
+# Tenant of the task being published, used by QueueOnce to create the key for the lock
+_publishing_tenant: ContextVar[Optional[str]] = ContextVar("publishing_tenant", default=None)
+
 
 class TenantAwareTask(TaskClass):
+    """
+    Task that runs in the context of the tenant that published it.
+
+    The tenant is passed in the ``tenant`` header of the task message, so the args and kwargs
+    of the task are never copied or rewritten. For backward compatibility, the tenant is also
+    read from the ``tenant`` kwarg, which was used before to pass it.
+    """
+
     #: Enable argument checking.
     #: You can set this to false if you don't want the signature to be
     #: checked when calling the task.
@@ -43,13 +56,9 @@ class TenantAwareTask(TaskClass):
         headers=None,
         **options,
     ):
-        """Pass the tenant name from the context in the kwargs."""
-
-        if kwargs is None:
-            kwargs = {}
+        """Pass the tenant name from the context in the headers."""
 
-        if TENANT_KEY not in kwargs and self.name != CELERY_BACKEND_CLEANUP_TASK:
-            kwargs[TENANT_KEY] = TenantContext.get()
+        headers = self._get_tenant_headers(kwargs, headers)
 
         return super().apply(
             args, kwargs, link, link_error, task_id, retries, throw, logfile, loglevel, headers, **options
@@ -58,30 +67,69 @@ class TenantAwareTask(TaskClass):
     def apply_async(
         self, args=None, kwargs=None, task_id=None, producer=None, link=None, link_error=None, shadow=None, **options
     ):
-        """Pass the tenant name from the context in the kwargs."""
-
-        if kwargs is None:
-            kwargs = {}
-
-        if TENANT_KEY not in kwargs and self.name != CELERY_BACKEND_CLEANUP_TASK:
-            kwargs[TENANT_KEY] = TenantContext.get()
-
-        return super().apply_async(args, kwargs, task_id, producer, link, link_error, shadow, **options)
+        """Pass the tenant name from the context in the headers."""
+
+        headers = self._get_tenant_headers(kwargs, options.get("headers"))
+        if headers is not None:
+            options["headers"] = headers
+
+        token = _publishing_tenant.set((headers or {}).get(TENANT_KEY))
+        try:
+            # Passed by keyword, as QueueOnce.apply_async only accepts args and kwargs positionally
+            return super().apply_async(
+                args,
+                kwargs,
+                task_id=task_id,
+                producer=producer,
+                link=link,
+                link_error=link_error,
+                shadow=shadow,
+                **options,
+            )
+        finally:
+            _publishing_tenant.reset(token)
 
     def s(self, *args, **kwargs):
-        if TENANT_KEY not in kwargs and self.name != CELERY_BACKEND_CLEANUP_TASK:
-            kwargs[TENANT_KEY] = TenantContext.get()
-
-        return self.signature(args, kwargs)
+        return self.signature(args, kwargs, headers=self._get_tenant_headers(kwargs))
 
     def si(self, *args, **kwargs):
-        if TENANT_KEY not in kwargs and self.name != CELERY_BACKEND_CLEANUP_TASK:
-            kwargs[TENANT_KEY] = TenantContext.get()
+        return self.signature(args, kwargs, headers=self._get_tenant_headers(kwargs), immutable=True)
+
+    def apply_async_many(
+        self, args_iterable: Iterable[tuple], kwargs: Optional[dict] = None, **options
+    ) -> ResultSet:
+        """
+        Publish the task once for each tuple of args, with the same kwargs and options, in the current tenant.
+        The signatures are built up front, with the tenant resolved only once, and are published
+        over a single producer connection. Returns the results of all the tasks.
+        """
+        headers = self._get_tenant_headers(kwargs, options.pop("headers", None)) or {}
+        return self._apply_signatures(
+            [self.signature(args, kwargs, headers={**headers}, **options) for args in args_iterable]
+        )
+
+    def map_tenants(
+        self, args=None, kwargs: Optional[dict] = None, tenants: Optional[Iterable[str]] = None, **options
+    ) -> ResultSet:
+        """
+        Publish the task once for each of the tenants (all the tenants by default), with the same args,
+        kwargs and options, over a single producer connection. Returns the results of all the tasks.
+        The tenant context does not need to be set.
+        """
+        headers = options.pop("headers", None) or {}
+        return self._apply_signatures(
+            [
+                self.signature(args, kwargs, headers={**headers, TENANT_KEY: tenant}, **options)
+                for tenant in sorted(TENANT_DATABASES if tenants is None else tenants)
+            ]
+        )
 
-        return self.signature(args, kwargs, immutable=True)
+    def _apply_signatures(self, signatures: list) -> ResultSet:
+        with self.app.producer_or_acquire() as producer:
+            return ResultSet([signature.apply_async(producer=producer) for signature in signatures], app=self.app)
 
     def __call__(self, *args, **kwargs):
-        """Use the tenant name from the kwargs to update the context."""
+        """Use the tenant name from the headers (or kwargs) to update the context."""
 
         # Only clear the lock before the task's execution if the
         # "unlock_before_run" option is True
@@ -90,12 +138,12 @@ class TenantAwareTask(TaskClass):
             self.once_backend.clear_lock(key)
 
         if self.name != CELERY_BACKEND_CLEANUP_TASK:
-            try:
-                tenant = kwargs.pop(TENANT_KEY)
-            except KeyError:
+            # kwargs is a new dict for this call, so popping the tenant does not modify the message
+            tenant = kwargs.pop(TENANT_KEY, None) or self._get_request_tenant()
+            if tenant is None:
                 raise RuntimeError(
-                    f"TenantAwareTask {self.name} called without tenant in kwargs. "
-                    f"Make sure to call the task with the tenant in the kwargs or use the apply/apply_async/s/si methods."
+                    f"TenantAwareTask {self.name} called without tenant in the headers or kwargs. "
+                    f"Make sure to call the task with the apply/apply_async/s/si methods."
                 )
             TenantContext.set(tenant)
 
@@ -107,6 +155,25 @@ class TenantAwareTask(TaskClass):
         TenantContext.clear()
         super().after_return(status, retval, task_id, args, kwargs, einfo)
 
+    def _get_tenant_headers(self, kwargs: Optional[dict], headers: Optional[dict] = None) -> Optional[dict]:
+        """
+        Get the headers of the task message with the tenant, without modifying the given headers.
+        The tenant is taken from the headers, the kwargs (for backward compatibility) or the context.
+        """
+        if self.name == CELERY_BACKEND_CLEANUP_TASK or (headers and TENANT_KEY in headers):
+            return headers
+
+        tenant = kwargs.get(TENANT_KEY) if kwargs else None
+        return {**(headers or {}), TENANT_KEY: tenant or TenantContext.get()}
+
+    def _get_request_tenant(self) -> Optional[str]:
+        """Get the tenant from the headers of the task being executed."""
+
+        request = self.request
+        # The custom headers of a message are attributes of the request in the workers,
+        # while they are only available in request.headers when applied locally
+        return getattr(request, TENANT_KEY, None) or (request.headers or {}).get(TENANT_KEY)
+
     def _get_call_args(self, args, kwargs):
         """This method is used by QueueOnce, to create the key for the lock."""
 
@@ -118,16 +185,16 @@ class TenantAwareTask(TaskClass):
 
         # QueueOnce._get_call_args validates the args and kwargs
         # by binding them to the task signature.
-        # Since the TENANT_KEY kwarg is not part of the signature,
-        # we need to remove it from the kwargs before passing them
-        # to QueueOnce._get_call_args.
-        # Copy the kwargs so that we don't modify the original kwargs.
-        _kwargs = deepcopy(kwargs)
-        tenant = _kwargs.pop(TENANT_KEY)
-        tenant_kwarg = {TENANT_KEY: tenant}
-        task_call_args = super()._get_call_args(args, _kwargs)
-
-        # Add the tenant kwarg back to the return value
+        # If the tenant is passed in the kwargs (backward compatibility), it is not part
+        # of the signature, so it is left out of a shallow copy of the kwargs.
+        tenant = kwargs.get(TENANT_KEY)
+        if tenant is not None:
+            kwargs = {key: value for key, value in kwargs.items() if key != TENANT_KEY}
+        else:
+            tenant = _publishing_tenant.get() or self._get_request_tenant()
+        task_call_args = super()._get_call_args(args, kwargs)
+
+        # Add the tenant to the return value
         # since this value is being used to create the key for the lock.
         # We want to lock the task for the tenant that is running it.
-        return task_call_args | tenant_kwarg
+        return task_call_args | {TENANT_KEY: tenant}
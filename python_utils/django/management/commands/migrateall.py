@@ -1,9 +1,13 @@
 from django.core.management.commands.migrate import Command as BaseMigrateCommand
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
 from django.db.models.signals import post_migrate, pre_migrate
 from django.dispatch import receiver
 
 from ...settings import TENANT_DATABASES
 from ...tenant_context import TenantContext
+from .tenant_aware_command import execute_in_parallel, report_results
 
 
 @receiver(pre_migrate)
@@ -18,8 +22,49 @@ def clear_tenant_post_migrate(sender, **kwargs):
 
 
 class Command(BaseMigrateCommand):
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--parallel",
+            action="store",
+            dest="parallel",
+            help=(
+                "Number of tenants to migrate in parallel, each one in a separate process. "
+                "Tenants without unapplied migrations are skipped. Defaults to 1."
+            ),
+            default=1,
+            type=int,
+        )
+
     def handle(self, *args, **options):
+        parallel = options.get("parallel") or 1
+        if parallel > 1 and len(TENANT_DATABASES) > 1:
+            self._handle_parallel(parallel, args, options)
+            return
+
         for tenant in TENANT_DATABASES:
             self.stdout.write(f"Migrating tenant: {tenant}")
-            options["database"] = tenant
-            super().handle(*args, **options)
+            self.migrate_tenant(*args, **{**options, "database": tenant})
+
+    def migrate_tenant(self, *args, **options):
+        super().handle(*args, **options)
+
+    def _handle_parallel(self, parallel: int, args: tuple, options: dict):
+        # Only a plain migration to the latest state can be skipped,
+        # explicit targets and the other modes are always executed.
+        can_skip = not (options["app_label"] or options["run_syncdb"] or options["prune"])
+        tenants = [tenant for tenant in TENANT_DATABASES if not can_skip or self._has_unapplied_migrations(tenant)]
+        for tenant in sorted(TENANT_DATABASES):
+            if tenant not in tenants:
+                self.stdout.write(f"Skipping tenant: {tenant}, no unapplied migrations")
+                # As migrate does, so that e.g. the content types and permissions of new models are created
+                with TenantContext(tenant):
+                    emit_post_migrate_signal(options["verbosity"], options["interactive"], tenant, stdout=self.stdout)
+
+        if tenants:
+            report_results(self, execute_in_parallel(self, tenants, parallel, args, options, "migrate_tenant"))
+
+    @staticmethod
+    def _has_unapplied_migrations(tenant: str) -> bool:
+        executor = MigrationExecutor(connections[tenant])
+        return bool(executor.migration_plan(executor.loader.graph.leaf_nodes()))
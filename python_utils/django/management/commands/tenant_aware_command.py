@@ -1,9 +1,135 @@
+import multiprocessing
+import sys
+import time
+import traceback
 from abc import abstractmethod
-from django.core.management import BaseCommand
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import NamedTuple, Optional
+
+import django
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
 
 from ...settings import TENANT_DATABASES
 from ...tenant_context import TenantContext
 
+# Options that are not picklable and are replaced in the worker processes
+NON_PICKLABLE_OPTIONS = ("stdout", "stderr")
+
+
+class TenantResult(NamedTuple):
+    tenant: str
+    success: bool
+    duration: float
+    error: Optional[str] = None
+
+
+class PrefixedOutput:
+    """
+    Output stream that prefixes each line with the tenant name,
+    so that the output of tenants running in parallel can be told apart.
+    Partial lines are buffered and only complete lines are written,
+    so that they are not interleaved with the output of other processes.
+    """
+
+    def __init__(self, out, tenant: str):
+        self._out = out
+        self._prefix = f"[{tenant}] "
+        self._partial_line = ""
+
+    def write(self, msg: str):
+        if not msg:
+            return
+        lines, newline, self._partial_line = (self._partial_line + msg).rpartition("\n")
+        if newline:
+            # Write the complete lines at once, to avoid interleaving with the output of other processes
+            self._out.write("".join(f"{self._prefix}{line}\n" for line in lines.split("\n")))
+            self._out.flush()
+
+    def flush(self):
+        self._out.flush()
+
+    def close(self):
+        """Write the remaining partial line, if any, when the command ends."""
+        if self._partial_line:
+            self.write("\n")
+        self._out.flush()
+
+    def isatty(self) -> bool:
+        return hasattr(self._out, "isatty") and self._out.isatty()
+
+
+def _init_worker():
+    """Initialize Django in the worker process, which does not share any DB connection with the parent."""
+    django.setup()
+
+
+def _execute_command_for_tenant(
+    command_class, method_name: str, tenant: str, args: tuple, options: dict
+) -> TenantResult:
+    """Run the given method of the command for a single tenant, in a worker process."""
+    start = time.monotonic()
+    stdout, stderr = PrefixedOutput(sys.stdout, tenant), PrefixedOutput(sys.stderr, tenant)
+    command = command_class(stdout=stdout, stderr=stderr)
+    command.stdout.write(f"Executing command for tenant: {tenant}")
+    try:
+        with TenantContext(tenant):
+            getattr(command, method_name)(*args, **{**options, "database": tenant})
+    except Exception as e:
+        command.stderr.write(traceback.format_exc())
+        return TenantResult(tenant, False, time.monotonic() - start, repr(e))
+    finally:
+        connections.close_all()
+        stdout.close()
+        stderr.close()
+
+    return TenantResult(tenant, True, time.monotonic() - start)
+
+
+def execute_in_parallel(
+    command: BaseCommand, tenants, workers: int, args: tuple, options: dict, method_name: str = "execute_command"
+) -> list[TenantResult]:
+    """
+    Execute a method of the command for the tenants in a pool of processes, and return the result of each tenant.
+    Processes are spawned, so that they do not inherit the database connections of this process.
+    """
+    options = {key: value for key, value in options.items() if key not in NON_PICKLABLE_OPTIONS}
+    results: list[TenantResult] = []
+
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(tenants)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    ) as executor:
+        futures = {
+            executor.submit(_execute_command_for_tenant, type(command), method_name, tenant, args, options): tenant
+            for tenant in sorted(tenants)
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself failed, e.g. it was killed
+                result = TenantResult(futures[future], False, 0.0, repr(e))
+            results.append(result)
+
+    return results
+
+
+def report_results(command: BaseCommand, results: list[TenantResult]):
+    """Write the status of each tenant and raise CommandError if any of them failed."""
+    command.stdout.write("Summary:")
+    for result in sorted(results, key=lambda r: r.tenant):
+        if result.success:
+            command.stdout.write(command.style.SUCCESS(f"  {result.tenant}: OK ({result.duration:.2f}s)"))
+        else:
+            command.stdout.write(
+                command.style.ERROR(f"  {result.tenant}: FAILED ({result.duration:.2f}s) - {result.error}")
+            )
+
+    if failed := [result.tenant for result in results if not result.success]:
+        raise CommandError(f"Command failed for tenants: {', '.join(sorted(failed))}")
+
 
 class TenantAwareCommand(BaseCommand):
     """
@@ -17,6 +143,10 @@ class TenantAwareCommand(BaseCommand):
 
         def execute_command(self, *args, **options):
             # logic to execute for each tenant
+
+    With --tenant all --parallel N, the tenants are processed by N worker processes,
+    each one with its own database connections. The output of each tenant is prefixed
+    with the tenant name and the command fails if it fails for any of the tenants.
     """
 
     def add_arguments(self, parser):
@@ -35,6 +165,14 @@ class TenantAwareCommand(BaseCommand):
             required=True,
             type=str,
         )
+        parser.add_argument(
+            "--parallel",
+            action="store",
+            dest="parallel",
+            help="Number of tenants to process in parallel, each one in a separate process. Defaults to 1.",
+            default=1,
+            type=int,
+        )
 
     def handle(self, *args, **options):
         """
@@ -59,6 +197,11 @@ class TenantAwareCommand(BaseCommand):
 
             tenants_to_use = [tenant]
 
+        parallel = options.get("parallel") or 1
+        if parallel > 1 and len(tenants_to_use) > 1:
+            report_results(self, execute_in_parallel(self, tenants_to_use, parallel, args, options))
+            return
+
         for tenant in tenants_to_use:
             self.stdout.write(f"Executing command for tenant: {tenant}")
             options["database"] = tenant
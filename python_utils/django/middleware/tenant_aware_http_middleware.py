@@ -1,17 +1,17 @@
 import logging
-from typing import Callable, Optional
+from typing import Awaitable, Callable, Optional, Union
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
 from django.core.handlers.wsgi import WSGIRequest
 from django.http import HttpResponse
 
-from ..settings import DEVELOPMENT_TENANT, TENANT_AWARE_EXCLUDED_PATHS
+from ..settings import DEVELOPMENT_TENANT
 from ..tenant_context import TenantContext
+from .tenant_resolver import TENANT_RESOLVER
 
 logger = logging.getLogger(__name__)
 
-DEFAULT_EXCLUDED_PATHS = ["/", "/healthz", "/healthz/"]
-
 
 class TenantAwareHttpMiddleware:
     """
@@ -29,8 +29,15 @@ class TenantAwareHttpMiddleware:
     where <app> can be any value (e.g., app, portal, dashboard)
     and <tenant> can contain alphanumeric characters and hyphens.
     The -internal suffix is stripped from tenant names.
+    The tenant of each host is resolved once by the shared TENANT_RESOLVER.
+
+    The middleware supports both sync and async requests, so under ASGI
+    async views are executed without switching to a thread.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response: Callable):
         """
         Middleware initialization. Only called once per Django application initialization.
@@ -38,8 +45,12 @@ class TenantAwareHttpMiddleware:
             get_response: Callable to get the response of the view.
         """
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            # Mark the instance as a coroutine function, so that Django calls it without sync_to_async
+            markcoroutinefunction(self)
 
-    def __call__(self, request: WSGIRequest) -> HttpResponse:
+    def __call__(self, request: WSGIRequest) -> Union[HttpResponse, Awaitable[HttpResponse]]:
         """
         Called by Django for each http request to process it and return a response.
         Everything that should be done before the view is called is done before
@@ -48,40 +59,53 @@ class TenantAwareHttpMiddleware:
         Args:
             request: Django request object.
 
-        Returns:    HttpResponse object.
+        Returns:    HttpResponse object, or an awaitable of it in async mode.
         """
+        if self.async_mode:
+            return self.__acall__(request)
+
         if self._is_excluded_path(request.path):
             return self.get_response(request)
 
-        # In DEBUG mode, use DEVELOPMENT_TENANT directly
-        # In production, extract tenant from subdomain
-        if settings.DEBUG:
-            tenant = DEVELOPMENT_TENANT
-            logger.debug(f"Using development tenant: {tenant}")
-        else:
-            tenant = self._get_tenant_from_subdomain(request)
-            if tenant is None:
-                raise Exception(f"Could not determine tenant from subdomain. Host: {request.get_host()}")
-
         # Call the next middleware in the chain until the response is returned.
         # After that, the database alias is removed from the thread local variable.
-        with TenantContext(tenant):
+        with TenantContext(self._get_tenant(request)):
             response = self.get_response(request)
 
         return response
 
-    def _is_excluded_path(self, path: str) -> bool:
+    async def __acall__(self, request: WSGIRequest) -> HttpResponse:
         """
-        Check if the path should be excluded from tenant handling.
+        Async version of __call__, used when the next middleware in the chain is async.
         """
-        if path in DEFAULT_EXCLUDED_PATHS:
-            return True
+        if self._is_excluded_path(request.path):
+            return await self.get_response(request)
 
-        for excluded_path in TENANT_AWARE_EXCLUDED_PATHS:
-            if path.startswith(excluded_path):
-                return True
+        async with TenantContext(self._get_tenant(request)):
+            response = await self.get_response(request)
 
-        return False
+        return response
+
+    def _get_tenant(self, request: WSGIRequest) -> str:
+        """
+        In DEBUG mode, use DEVELOPMENT_TENANT directly.
+        In production, extract tenant from subdomain.
+        """
+        if settings.DEBUG:
+            logger.debug(f"Using development tenant: {DEVELOPMENT_TENANT}")
+            return DEVELOPMENT_TENANT
+
+        tenant = self._get_tenant_from_subdomain(request)
+        if tenant is None:
+            raise Exception(f"Could not determine tenant from subdomain. Host: {request.get_host()}")
+
+        return tenant
+
+    def _is_excluded_path(self, path: str) -> bool:
+        """
+        Check if the path should be excluded from tenant handling.
+        """
+        return TENANT_RESOLVER.is_excluded_path(path)
 
     def _get_tenant_from_subdomain(self, request: WSGIRequest) -> Optional[str]:
         """
@@ -91,18 +115,4 @@ class TenantAwareHttpMiddleware:
         - <app>.tenant.domain.com -> tenant
         - <app>.tenant-internal.domain.com -> tenant (strips -internal suffix)
         """
-        host = request.get_host().split(":")[0]  # Remove port if present
-
-        if host == "testserver":
-            logger.debug("Using 'default' tenant for testserver host.")
-            return "default"
-
-        parts = host.split(".")
-
-        # Need at least 3 parts: <app>.<tenant>.<domain>
-        if len(parts) >= 3:
-            tenant = parts[1].replace("-internal", "")
-            logger.debug(f"Tenant '{tenant}' extracted from subdomain: {host}")
-            return tenant
-
-        return None
+        return TENANT_RESOLVER.get_tenant_from_host(request.get_host())
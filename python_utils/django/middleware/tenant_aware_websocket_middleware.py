@@ -5,9 +5,10 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from jwt.exceptions import PyJWTError
 
-from ..api.utils import decode_jwt, TokenPayload
+from ..api.utils import adecode_jwt, get_user_data_from_payload, TokenPayload, USER_CACHE
 from ..settings import DEVELOPMENT_TENANT
 from ..tenant_context import TenantContext
+from .tenant_resolver import TENANT_RESOLVER
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +38,9 @@ class TenantAwareWebsocketMiddleware:
         Also sets the tenant context from the subdomain, mirroring
         the TenantAwareHttpMiddleware logic for HTTP requests.
 
+        The token is verified without blocking the event loop, and the users are
+        taken from the user cache when AUTH_USER_CACHE_TTL is set.
+
         Parameters:
             scope (dict): ASGI scope
             receive (callable): ASGI receive callable
@@ -52,7 +56,7 @@ class TenantAwareWebsocketMiddleware:
 
         async with TenantContext(tenant):
             try:
-                token_payload: TokenPayload = decode_jwt(access_token)
+                token_payload: TokenPayload = await adecode_jwt(access_token)
             except PyJWTError as e:
                 logger.info(f"Failed to decode JWT token: {e}")
                 await self._reject_connection(send, f"Invalid authorization token: {str(e)}")
@@ -68,7 +72,7 @@ class TenantAwareWebsocketMiddleware:
                 await self._reject_connection(send, "Token does not have an expiration time")
                 return
 
-            user = await get_user_model().objects.filter(username=username).afirst()
+            user = await self._get_user(username, token_payload)
             if not user:
                 await self._reject_connection(send, "User not found.")
                 return
@@ -79,6 +83,21 @@ class TenantAwareWebsocketMiddleware:
 
             return await self.app(scope, receive, send)
 
+    @staticmethod
+    async def _get_user(username: str, token_payload: TokenPayload):
+        user_data = get_user_data_from_payload(token_payload)
+        if USER_CACHE is not None and (user := USER_CACHE.get(username, user_data)):
+            return user
+
+        user = await get_user_model().objects.filter(username=username).afirst()
+
+        # Cache only users whose data match the token, as the cache is shared with the API authentication,
+        # which would otherwise skip updating the user
+        if user and USER_CACHE is not None and all(getattr(user, f) == v for f, v in user_data.items()):
+            USER_CACHE.set(username, user_data, user)
+
+        return user
+
     @staticmethod
     async def _reject_connection(send, reason):
         """
@@ -105,17 +124,11 @@ class TenantAwareWebsocketMiddleware:
 
         host = self._get_host_from_scope(scope)
 
-        if host == "testserver":
-            return "default"
-
-        parts = host.split(".")
-
-        if len(parts) >= 3:
-            tenant = parts[1].replace("-internal", "")
-            logger.debug(f"Tenant '{tenant}' extracted from websocket host: {host}")
-            return tenant
+        tenant = TENANT_RESOLVER.get_tenant_from_host(host)
+        if tenant is None:
+            raise Exception(f"Could not determine tenant from websocket subdomain. Host: {host}")
 
-        raise Exception(f"Could not determine tenant from websocket subdomain. Host: {host}")
+        return tenant
 
     @staticmethod
     def _get_host_from_scope(scope) -> str:
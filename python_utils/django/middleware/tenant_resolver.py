@@ -0,0 +1,99 @@
+import logging
+import re
+from typing import Iterable, Optional
+
+from ..settings import TENANT_AWARE_EXCLUDED_PATHS, TENANT_DATABASES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXCLUDED_PATHS = ["/", "/healthz", "/healthz/"]
+
+TESTSERVER_HOST = "testserver"
+TESTSERVER_TENANT = "default"
+
+
+class TenantResolver:
+    """
+    Resolves the tenant of a request from its host, and whether its path is excluded from tenant handling.
+    Shared by the HTTP and websocket middlewares, use the module level TENANT_RESOLVER.
+
+    The excluded path prefixes are compiled into a single regex, and the tenant of each host
+    is computed only once and kept in a bounded cache.
+
+    The hosts are expected in the format <app>.<tenant>.<domain>, where <app> can be any value
+    (e.g., app, portal, dashboard) and <tenant> can contain alphanumeric characters and hyphens.
+    The -internal suffix is stripped from tenant names.
+    """
+
+    def __init__(
+        self,
+        excluded_path_prefixes: Iterable[str] = TENANT_AWARE_EXCLUDED_PATHS,
+        excluded_paths: Iterable[str] = DEFAULT_EXCLUDED_PATHS,
+        tenants: Iterable[str] = TENANT_DATABASES,
+        max_cache_size: int = 1024,
+    ):
+        self.excluded_paths = frozenset(excluded_paths)
+        # Longest prefixes first, even though any match is enough
+        prefixes = sorted(set(excluded_path_prefixes), key=len, reverse=True)
+        self._excluded_path_prefixes = (
+            re.compile("|".join(re.escape(prefix) for prefix in prefixes)) if prefixes else None
+        )
+        self.tenants = frozenset(tenants)
+        self.max_cache_size = max_cache_size
+        self._host_tenants: dict[str, Optional[str]] = {}
+
+    def is_excluded_path(self, path: str) -> bool:
+        """
+        Check if the path should be excluded from tenant handling.
+        """
+        if path in self.excluded_paths:
+            return True
+
+        return self._excluded_path_prefixes is not None and self._excluded_path_prefixes.match(path) is not None
+
+    def get_tenant_from_host(self, host: str) -> Optional[str]:
+        """
+        Get the tenant from the host, which may include the port.
+        Returns None if the host does not match the expected format, or the tenant is unknown.
+
+        Expected formats:
+        - <app>.tenant.domain.com -> tenant
+        - <app>.tenant-internal.domain.com -> tenant (strips -internal suffix)
+        """
+        try:
+            return self._host_tenants[host]
+        except KeyError:
+            pass
+
+        tenant = self._resolve_tenant(host)
+
+        # The hosts come from the clients, so the cache is bounded
+        if len(self._host_tenants) >= self.max_cache_size:
+            self._host_tenants.clear()
+        self._host_tenants[host] = tenant
+
+        return tenant
+
+    def _resolve_tenant(self, host: str) -> Optional[str]:
+        host = host.split(":")[0]  # Remove port if present
+
+        if host == TESTSERVER_HOST:
+            logger.debug(f"Using '{TESTSERVER_TENANT}' tenant for {TESTSERVER_HOST} host.")
+            return TESTSERVER_TENANT
+
+        parts = host.split(".")
+
+        # Need at least 3 parts: <app>.<tenant>.<domain>
+        if len(parts) < 3:
+            return None
+
+        tenant = parts[1].replace("-internal", "")
+        if tenant not in self.tenants:
+            logger.warning(f"Tenant '{tenant}' extracted from host {host} is not configured in DATABASES.")
+            return None
+
+        logger.debug(f"Tenant '{tenant}' extracted from host: {host}")
+        return tenant
+
+
+TENANT_RESOLVER = TenantResolver()
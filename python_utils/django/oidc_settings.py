@@ -6,10 +6,17 @@ dynamically based on the tenant.
 
 import json
 import os
+import stat
+import threading
 import time
-import requests
+from typing import Optional
 
+import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from .tenant_context import TenantContext
 
 
@@ -37,6 +44,21 @@ TENANT_REALM_MAPPING: dict[str, str] = getattr(
     settings, "TENANT_REALM_MAPPING", json.loads(os.getenv("TENANT_REALM_MAPPING", "{}"))
 )
 
+# Seconds before the expiration of the client credentials token, when a new one is requested
+KEYCLOAK_TOKEN_EXPIRY_MARGIN = getattr(settings, "KEYCLOAK_TOKEN_EXPIRY_MARGIN", 30)
+KEYCLOAK_REQUEST_TIMEOUT = getattr(settings, "KEYCLOAK_REQUEST_TIMEOUT", 30)
+
+# HTTP sessions of each tenant, to reuse the connections to Keycloak
+_SESSIONS: dict[str, requests.Session] = {}
+_SESSIONS_LOCK = threading.Lock()
+
+# Client credentials tokens of each tenant, with the time when they expire
+_CLIENT_TOKENS: dict[str, tuple[float, dict]] = {}
+_CLIENT_TOKEN_LOCKS: dict[str, threading.Lock] = {}
+
+# Contents of the service account token files, with the modification time of the file when they were read
+_TOKEN_FILES: dict[str, tuple[int, str]] = {}
+
 
 def get_realm_for_tenant(tenant: str) -> str:
     """
@@ -82,14 +104,21 @@ def get_oidc_op_logout_endpoint() -> str:
 def get_confidential_client_service_account_token() -> str:
     """
     Reads the Keycloak confidential client service account token for the current tenant from a file.
+    The file is read again only when it is modified.
     """
     realm = get_realm_for_tenant(TenantContext.get())
     token_file_path = KEYCLOAK_CONFIDENTIAL_CLIENT_SERVICE_ACCOUNT_TOKEN_FILE_PATHS.get(realm)
-    if not token_file_path or not os.path.isfile(token_file_path):
+    file_stat = _get_file_stat(token_file_path) if token_file_path else None
+    if file_stat is None or not stat.S_ISREG(file_stat.st_mode):
         raise FileNotFoundError(f"Keycloak service account token file for tenant {realm} not found: {token_file_path}")
 
-    with open(token_file_path, "r") as f:
-        token = f.read().strip()
+    cached = _TOKEN_FILES.get(token_file_path)
+    if cached is not None and cached[0] == file_stat.st_mtime_ns:
+        token = cached[1]
+    else:
+        with open(token_file_path, "r") as f:
+            token = f.read().strip()
+        _TOKEN_FILES[token_file_path] = (file_stat.st_mtime_ns, token)
 
     if not token:
         raise ValueError(f"Keycloak service account token for tenant {realm} is empty.")
@@ -97,6 +126,13 @@ def get_confidential_client_service_account_token() -> str:
     return token
 
 
+def _get_file_stat(path: str) -> Optional[os.stat_result]:
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
 def get_confidential_client_secret() -> str:
     """
     Retrieves the Keycloak confidential client secret for the current tenant.
@@ -109,12 +145,91 @@ def get_confidential_client_secret() -> str:
     return client_secret
 
 
+def get_session() -> requests.Session:
+    """
+    Get the HTTP session of the current tenant, which keeps the connections to Keycloak alive.
+    Requests failing with server errors (5xx) are retried, as it might be a temporary issue with Keycloak.
+    """
+    tenant = TenantContext.get()
+    session = _SESSIONS.get(tenant)
+    if session is None:
+        with _SESSIONS_LOCK:
+            session = _SESSIONS.get(tenant)
+            if session is None:
+                session = requests.Session()
+                retry = Retry(
+                    total=3,
+                    backoff_factor=1,
+                    status_forcelist=(500, 502, 503, 504),
+                    allowed_methods=None,  # Retry POST requests as well
+                    raise_on_status=False,
+                )
+                session.mount("https://", HTTPAdapter(max_retries=retry))
+                session.mount("http://", HTTPAdapter(max_retries=retry))
+                _SESSIONS[tenant] = session
+
+    return session
+
+
 def get_oidc_confidential_client_token(**kwargs) -> dict:
     """
     Obtains token for an OIDC confidential client with the client credentials grant,
     using a service account token for authentication.
+    Without kwargs, the token of the tenant is cached and reused until shortly before it expires.
+    """
+    if kwargs:
+        return _request_oidc_confidential_client_token(**kwargs)
+
+    tenant = TenantContext.get()
+    if token := _get_cached_client_token(tenant):
+        return token
+
+    with _CLIENT_TOKEN_LOCKS.setdefault(tenant, threading.Lock()):
+        # The token may have been renewed by another thread while waiting for the lock
+        if token := _get_cached_client_token(tenant):
+            return token
+
+        requested_at = time.monotonic()
+        token = _request_oidc_confidential_client_token()
+        if expires_in := token.get("expires_in"):
+            _CLIENT_TOKENS[tenant] = (requested_at + expires_in, token)
+
+    return dict(token)
+
+
+async def aget_oidc_confidential_client_token(**kwargs) -> dict:
+    """
+    Async version of get_oidc_confidential_client_token.
+    The cached token is returned directly, otherwise the token is requested in a thread.
     """
+    if not kwargs and (token := _get_cached_client_token(TenantContext.get())):
+        return token
+
+    return await sync_to_async(get_oidc_confidential_client_token, thread_sensitive=False)(**kwargs)
+
+
+def clear_oidc_confidential_client_token():
+    """Remove the cached token of the current tenant, e.g. when it is rejected by Keycloak."""
+    _CLIENT_TOKENS.pop(TenantContext.get(), None)
+
 
+def _get_cached_client_token(tenant: str) -> Optional[dict]:
+    """
+    Get a copy of the cached token of the tenant, with expires_in set to its remaining lifetime,
+    or None if it expires in less than KEYCLOAK_TOKEN_EXPIRY_MARGIN seconds.
+    """
+    cached = _CLIENT_TOKENS.get(tenant)
+    if cached is None:
+        return None
+
+    expires_in = cached[0] - time.monotonic()
+    if expires_in < KEYCLOAK_TOKEN_EXPIRY_MARGIN:
+        return None
+
+    return {**cached[1], "expires_in": int(expires_in)}
+
+
+def _request_oidc_confidential_client_token(**kwargs) -> dict:
     data = {
         "grant_type": KEYCLOAK_CLIENT_CREDENTIALS_GRANT_TYPE,
         **kwargs,
@@ -126,17 +241,11 @@ def get_oidc_confidential_client_token(**kwargs) -> dict:
         data["client_assertion_type"] = KEYCLOAK_CLIENT_ASSERTION_TYPE
         data["client_assertion"] = get_confidential_client_service_account_token()
 
-    max_retries = 3
-    for attempt in range(max_retries + 1):
-        response = requests.post(
-            get_oidc_op_token_endpoint(),
-            data=data,
-        )
-        # Retry on server errors (5xx), it might be a temporary issue with Keycloak.
-        if response.status_code < 500 or attempt == max_retries:
-            break
-        time.sleep(2**attempt)  # 1, 2, 4 seconds
-
+    response = get_session().post(
+        get_oidc_op_token_endpoint(),
+        data=data,
+        timeout=KEYCLOAK_REQUEST_TIMEOUT,
+    )
     response.raise_for_status()
 
     return response.json()
@@ -1,7 +1,7 @@
 import logging
 import sys
 import time
-from typing import Dict, Union, Optional, IO, TypeVar
+from typing import Dict, Union, Optional, IO, TypeVar, Generator
 from typing import List, Any
 
 from django.core.exceptions import ObjectDoesNotExist
@@ -14,7 +14,7 @@ from django.db.models.fields.files import FieldFile
 from django.forms import model_to_dict
 from django.utils import timezone
 
-from python_utils.db import fetch_all
+from python_utils.db import fetch_all, fetch_columns, iter_rows
 
 Model_T = TypeVar('Model_T', bound=Model)
 
@@ -66,7 +66,8 @@ def perform_query(
         sql_query: str,
         params: Optional[List] = None,
         expected_results=True,
-) -> Optional[List[Dict]]:
+        as_columns=False,
+) -> Optional[Union[List[Dict], Dict[str, List]]]:
     """
     Execute a sql statement to the database and get the results as a list of dict or None
     if no result is expected
@@ -75,8 +76,10 @@ def perform_query(
         sql_query: string representing the query to be executed
         params: list with params to be passed to the query
         expected_results: indicating whether the query executed will return or not results
+        as_columns: flag to return the results in column-oriented form, as a dict with a list of values per column
     Returns:
-        List of dict with the fetched records or None if expected_result=False
+        List of dict with the fetched records (or dict of columns if as_columns=True)
+        or None if expected_result=False
     """
     from django.db import connection
 
@@ -86,7 +89,36 @@ def perform_query(
         else:
             cursor.execute(sql_query)
         if expected_results:
-            return fetch_all(cursor)
+            return fetch_columns(cursor) if as_columns else fetch_all(cursor)
+
+
+def iter_query(
+        sql_query: str,
+        params: Optional[List] = None,
+        chunk_size: int = 2000,
+        row_type: str = 'dict',
+) -> Generator[Any, None, None]:
+    """
+    Execute a sql query to the database and lazily yield the results, fetching them in chunks.
+    On PostgreSQL, a server-side (named) cursor is used, so the results are not loaded in memory at once.
+    The cursor is closed when the generator is exhausted or closed.
+
+    Args:
+        sql_query: string representing the query to be executed
+        params: list with params to be passed to the query
+        chunk_size: number of rows fetched from the database at a time
+        row_type: type of the yielded rows, one of 'dict', 'tuple' or 'namedtuple'
+    Returns:
+        Generator of the fetched records
+    """
+    from django.db import connection
+
+    with connection.chunked_cursor() as cursor:
+        if params:
+            cursor.execute(sql_query, tuple(params))
+        else:
+            cursor.execute(sql_query)
+        yield from iter_rows(cursor, chunk_size=chunk_size, row_type=row_type)
 
 
 def get_total(records: models.QuerySet, aggregation_field: str) -> Optional[int]:
@@ -1,7 +1,34 @@
+import ast
 import math
-from decimal import Decimal
+from decimal import Decimal, Context, getcontext, localcontext
+from functools import lru_cache
 from numbers import Number
-from typing import Optional, Any
+from typing import Optional, Any, Dict, Iterable, List, Mapping, Tuple
+
+from python_utils.imports import import_optional_dependency
+
+
+@lru_cache(maxsize=65536, typed=True)
+def _cached_decimal(value: Number) -> Decimal:
+    return Decimal(str(value))
+
+
+def _to_decimal(value: Number) -> Decimal:
+    """
+    Convert a number to Decimal through its string representation, like Decimal(str(value)).
+    Decimals and ints are converted directly, while the conversions of other values are cached.
+    """
+    value_type = type(value)
+    if value_type is Decimal:
+        return value
+    if value_type is int:
+        return Decimal(value)
+    return _cached_decimal(value)
+
+
+@lru_cache(maxsize=None)
+def _tolerance(precision: int) -> Decimal:
+    return Decimal(str(1 / (10 ** precision)))
 
 
 def dec_multiply(*args) -> Optional[Decimal]:
@@ -20,9 +47,9 @@ def dec_multiply(*args) -> Optional[Decimal]:
     """
     if not args:
         return
-    total = Decimal(str(args[0]))
+    total = _to_decimal(args[0])
     for element in args[1:]:
-        total *= Decimal(str(element))
+        total *= _to_decimal(element)
     return total
 
 
@@ -40,7 +67,7 @@ def dec_sum(*args: Optional[Number]) -> Decimal:
         >>> dec_sum(20.24, None, 0, 10)
         Decimal('30.24')
     """
-    return sum([Decimal(str(x)) if x is not None else 0 for x in args])
+    return sum([_to_decimal(x) if x is not None else 0 for x in args])
 
 
 def dec_ratio(value1: Number, value2: Number) -> Optional[Decimal]:
@@ -58,7 +85,7 @@ def dec_ratio(value1: Number, value2: Number) -> Optional[Decimal]:
         >>> dec_ratio(20.24, 0) is None
         True
     """
-    return Decimal(str(value1)) / Decimal(str(value2)) if value2 else None
+    return _to_decimal(value1) / _to_decimal(value2) if value2 else None
 
 
 def dec_subtraction(value1: Optional[Number], value2: Optional[Number]) -> Decimal:
@@ -76,7 +103,164 @@ def dec_subtraction(value1: Optional[Number], value2: Optional[Number]) -> Decim
         >>> dec_subtraction(None, None)
         Decimal('0')
     """
-    return Decimal(str(value1) if value1 else 0) - Decimal(str(value2) if value2 else 0)
+    return (_to_decimal(value1) if value1 else Decimal(0)) - (_to_decimal(value2) if value2 else Decimal(0))
+
+
+def dec_sum_many(
+        values: Iterable[Optional[Number]],
+        scale: Optional[int] = None,
+        context: Optional[Context] = None
+) -> Decimal:
+    """
+    Sum of a column of numbers, as Decimal. Skips None values.
+    The same as dec_sum(*values), but without building intermediate lists.
+
+    If the scale (number of decimal digits) of the amounts is known, the sum can be computed with numpy,
+    as a sum of fixed-point int64 values. Values that are not finite, have more decimal digits than the scale
+    or are not exactly representable as floats once scaled (up to 2**53) are summed as Decimals instead.
+
+    Args:
+        values: numbers we want to sum, e.g. a list or a numpy array
+        scale: number of decimal digits of the values, to use the fixed-point numpy path. Requires numpy
+        context: decimal context used for the operations, the current one by default
+    Returns:
+        The result of the sum as a decimal number
+    Examples:
+        >>> dec_sum_many([20.24, None, 2.2])
+        Decimal('22.44')
+        >>> dec_sum_many([])
+        Decimal('0')
+        >>> dec_sum_many([20.24, None, 2.2, 0.01], scale=2)
+        Decimal('22.45')
+    """
+    if scale is not None:
+        return _fixed_point_sum(values, scale, context)
+
+    return _exact_sum(values, context)
+
+
+def _fixed_point_sum(values: Iterable[Optional[Number]], scale: int, context: Optional[Context] = None) -> Decimal:
+    np = import_optional_dependency("numpy")
+    if not isinstance(values, np.ndarray):
+        values = [value for value in values if value is not None]
+    try:
+        scaled = np.asarray(values, dtype=np.float64) * 10 ** scale
+    except (TypeError, ValueError):
+        return _exact_sum(values, context)
+    if not len(scaled):
+        return Decimal(0).scaleb(-scale, context)
+
+    # The fixed-point sum is exact only for finite values without more decimal digits than the scale,
+    # which are exactly representable as floats once scaled. Otherwise, e.g. with NaN (or None in arrays),
+    # sum them as Decimals instead of returning a wrong result.
+    fixed = np.rint(scaled)
+    with np.errstate(invalid="ignore"):
+        exact = (
+            np.isfinite(scaled).all()
+            and np.abs(fixed).max() <= 2 ** 53
+            and (np.abs(scaled - fixed) <= np.abs(scaled) * 4 * np.finfo(np.float64).eps).all()
+        )
+    if not exact:
+        return _exact_sum(values, context)
+    fixed = fixed.astype(np.int64)
+
+    # Fall back to python ints if the int64 sum could overflow
+    if int(np.abs(fixed).max()) > np.iinfo(np.int64).max // len(fixed):
+        total = sum(fixed.tolist())
+    else:
+        total = int(fixed.sum())
+    return Decimal(total).scaleb(-scale, context)
+
+
+def _exact_sum(values: Iterable[Optional[Number]], context: Optional[Context] = None) -> Decimal:
+    with localcontext(context or getcontext()):
+        return sum([_to_decimal(value) for value in values if value is not None], Decimal(0))
+
+
+def dec_dot(
+        values1: Iterable[Optional[Number]],
+        values2: Iterable[Optional[Number]],
+        context: Optional[Context] = None
+) -> Decimal:
+    """
+    Sum of the products of the numbers of two columns, as Decimal.
+    Pairs where any of the numbers is None are skipped.
+
+    Args:
+        values1: first column of numbers
+        values2: second column of numbers, of the same length
+        context: decimal context used for the operations, the current one by default
+    Returns:
+        The result of the dot product as a decimal number
+    Examples:
+        >>> dec_dot([100, 200.5, None], [0.5, 0.1, 3])
+        Decimal('70.05')
+    """
+    with localcontext(context or getcontext()):
+        return sum(
+            [
+                _to_decimal(value1) * _to_decimal(value2)
+                for value1, value2 in zip(values1, values2)
+                if value1 is not None and value2 is not None
+            ],
+            Decimal(0)
+        )
+
+
+def dec_ratio_many(
+        values1: Iterable[Number],
+        values2: Iterable[Number],
+        context: Optional[Context] = None
+) -> List[Optional[Decimal]]:
+    """
+    Decimal ratios of the numbers of two columns, pair by pair. The ratio is None if the denominator is 0.
+
+    Args:
+        values1: numerators
+        values2: denominators, of the same length
+        context: decimal context used for the operations, the current one by default
+    Returns:
+        List with the results of the ratios as decimal numbers
+    Examples:
+        >>> dec_ratio_many([20.24, 1, 3], [2.2, 0, 4])
+        [Decimal('9.2'), None, Decimal('0.75')]
+    """
+    with localcontext(context or getcontext()):
+        return [
+            _to_decimal(value1) / _to_decimal(value2) if value2 else None
+            for value1, value2 in zip(values1, values2)
+        ]
+
+
+def are_equal_many(
+        values1: Iterable[Optional[Number]],
+        values2: Iterable[Optional[Number]],
+        precision=6,
+        context: Optional[Context] = None
+) -> List[bool]:
+    """
+    Compare the numbers of two columns pair by pair, with a given precision, like are_equal.
+
+    Args:
+        values1: numbers to be compared
+        values2: numbers which will be used as the comparators, of the same length
+        precision: represent what precision to use when comparing decimal numbers
+        context: decimal context used for the operations, the current one by default
+    Returns:
+        List with True where both numbers are equal or False otherwise
+    Examples:
+        >>> are_equal_many([13.44, 13.44, None], [13.4, 13.44, 0], precision=1)
+        [True, True, True]
+        >>> are_equal_many([13.44], [13.4])
+        [False]
+    """
+    tolerance = _tolerance(precision)
+    zero = Decimal(0)
+    with localcontext(context or getcontext()):
+        return [
+            abs((_to_decimal(value1) if value1 else zero) - (_to_decimal(value2) if value2 else zero)) < tolerance
+            for value1, value2 in zip(values1, values2)
+        ]
 
 
 def parse_number(v: str) -> float:
@@ -179,15 +363,208 @@ def are_equal(number1: Number, number2: Number, precision=6) -> bool:
         >>> are_equal(13.44, 13.4)
         False
     """
-    return abs(dec_subtraction(number1, number2)) < Decimal(str(1 / (10 ** precision)))
+    return abs(dec_subtraction(number1, number2)) < _tolerance(precision)
+
+
+_MATH_NAMES = {k: v for k, v in math.__dict__.items() if not k.startswith("__")}
+_MATH_GLOBALS = {"__builtins__": {}, **_MATH_NAMES}
+_NESTED_SCOPE_NODES = (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+
+# math functions with an equivalent numpy ufunc, used when evaluating expressions over columns
+_NUMPY_UFUNCS = {
+    "acos": "arccos",
+    "acosh": "arccosh",
+    "asin": "arcsin",
+    "asinh": "arcsinh",
+    "atan": "arctan",
+    "atan2": "arctan2",
+    "atanh": "arctanh",
+    "ceil": "ceil",
+    "copysign": "copysign",
+    "cos": "cos",
+    "cosh": "cosh",
+    "degrees": "degrees",
+    "exp": "exp",
+    "expm1": "expm1",
+    "fabs": "fabs",
+    "floor": "floor",
+    "fmod": "fmod",
+    "gcd": "gcd",
+    "hypot": "hypot",
+    "isfinite": "isfinite",
+    "isinf": "isinf",
+    "isnan": "isnan",
+    "lcm": "lcm",
+    "ldexp": "ldexp",
+    "log10": "log10",
+    "log1p": "log1p",
+    "log2": "log2",
+    "pow": "power",
+    "radians": "radians",
+    "sin": "sin",
+    "sinh": "sinh",
+    "sqrt": "sqrt",
+    "tan": "tan",
+    "tanh": "tanh",
+    "trunc": "trunc",
+}
+
+
+@lru_cache(maxsize=None)
+def _numpy_globals() -> Dict[str, Any]:
+    np = import_optional_dependency("numpy")
 
+    def log(x, base=None):
+        return np.log(x) if base is None else np.log(x) / np.log(base)
 
-def evaluate(expression: str):
+    return {
+        **_MATH_GLOBALS,
+        **{name: getattr(np, ufunc) for name, ufunc in _NUMPY_UFUNCS.items()},
+        "log": log,
+    }
+
+
+class CompiledExpression:
+    """
+    A math expression compiled and validated once, to be evaluated many times with different variables.
+    Use compile_expression to get cached instances.
+    Examples:
+        >>> expression = compile_expression("principal * (1 + rate) ** years")
+        >>> expression.variables
+        ('principal', 'rate', 'years')
+        >>> expression.evaluate(principal=100, rate=0.5, years=2)
+        225.0
+        >>> expression.evaluate_many([{'principal': 1, 'rate': 1, 'years': 1}, {'principal': 2, 'rate': 0, 'years': 3}])
+        [2, 2]
+        >>> expression.evaluate(principal=100)
+        Traceback (most recent call last):
+        ...
+        NameError: The use of 'rate' is not allowed
+    """
+
+    def __init__(self, expression: str, variables: Optional[Iterable[str]] = None):
+        """
+        Args:
+            expression: string representing the math expression
+            variables: names of the variables allowed in the expression.
+                If not given, every name not found in the math library is considered as a variable.
+        Raises:
+            NameError: If the expression uses a name that is neither in the math library nor in the variables,
+                an attribute, a lambda or a comprehension
+        """
+        self.expression = expression
+        tree = ast.parse(expression, "<string>", "eval")
+        # As eval only checks the names of the top level code, attributes and nested scopes are not allowed
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Attribute):
+                raise NameError(f"The use of '{node.attr}' is not allowed")
+            if isinstance(node, _NESTED_SCOPE_NODES):
+                raise NameError(f"The use of '{type(node).__name__}' is not allowed")
+        self.code = compile(tree, "<string>", "eval")
+
+        # Keep the order of the first use of each name
+        variable_names = []
+        for name in self.code.co_names:
+            if variables is not None and name in variables:
+                variable_names.append(name)
+            elif name not in _MATH_NAMES:
+                if variables is not None:
+                    raise NameError(f"The use of '{name}' is not allowed")
+                variable_names.append(name)
+        self.variables = tuple(variable_names)
+
+    def __repr__(self):
+        return f"CompiledExpression({self.expression!r})"
+
+    def _check_variables(self, variables: Mapping[str, Any]):
+        for name in self.variables:
+            if name not in variables:
+                raise NameError(f"The use of '{name}' is not allowed")
+
+    def evaluate(self, **variables):
+        """
+        Evaluate the expression with the given values of the variables.
+
+        Raises:
+            NameError: If a variable of the expression is missing
+        """
+        self._check_variables(variables)
+        return eval(self.code, _MATH_GLOBALS, variables)
+
+    def evaluate_many(self, bindings: Iterable[Mapping[str, Any]]) -> List[Any]:
+        """
+        Evaluate the expression once for each of the given variable bindings.
+
+        Args:
+            bindings: dicts with the values of the variables, one per evaluation
+        Returns:
+            List with the results, in the same order as the bindings
+        Raises:
+            NameError: If a variable of the expression is missing in any of the bindings
+        """
+        results = []
+        for variables in bindings:
+            self._check_variables(variables)
+            results.append(eval(self.code, _MATH_GLOBALS, dict(variables)))
+        return results
+
+    def evaluate_columns(self, **columns):
+        """
+        Evaluate the expression over whole columns of values at once, with numpy.
+        The math functions with an equivalent numpy ufunc are replaced by it.
+        Requires numpy.
+
+        Args:
+            **columns: the values of the variables, as sequences of the same length or scalars
+        Returns:
+            numpy array with the results
+        Raises:
+            NameError: If a variable of the expression is missing
+        Examples:
+            >>> compile_expression("sqrt(x) + y").evaluate_columns(x=[4, 9], y=1).tolist()
+            [3.0, 4.0]
+        """
+        np = import_optional_dependency("numpy")
+        self._check_variables(columns)
+        variables = {name: np.asarray(values) for name, values in columns.items()}
+        return np.asarray(eval(self.code, _numpy_globals(), variables))
+
+
+@lru_cache(maxsize=1024)
+def _compile_expression(expression: str, variables: Optional[Tuple[str, ...]]) -> CompiledExpression:
+    return CompiledExpression(expression, variables)
+
+
+def compile_expression(expression: str, variables: Optional[Iterable[str]] = None) -> CompiledExpression:
+    """
+    Compile and validate a math expression, caching the result for the next calls with the same expression.
+
+    Args:
+        expression: string representing the math expression
+        variables: names of the variables allowed in the expression.
+            If not given, every name not found in the math library is considered as a variable.
+    Returns:
+        CompiledExpression to be evaluated
+    Raises:
+        NameError: If the expression uses a name that is neither in the math library nor in the variables
+    Examples:
+        >>> compile_expression("x + 1") is compile_expression("x + 1")
+        True
+        >>> compile_expression("x + y", variables=['x'])
+        Traceback (most recent call last):
+        ...
+        NameError: The use of 'y' is not allowed
+    """
+    return _compile_expression(expression, tuple(sorted(variables)) if variables is not None else None)
+
+
+def evaluate(expression: str, variables: Optional[Mapping[str, Any]] = None):
     """
     Evaluate a math expression.
 
     Args:
         expression: string representing the math expression to be eval()
+        variables: values of the variables used in the expression
     Returns:
         result of the math expression from eval()
     Raises:
@@ -197,18 +574,12 @@ def evaluate(expression: str):
         7
         >>> evaluate("sqrt(9)")
         3.0
+        >>> evaluate("sqrt(x)", {'x': 16})
+        4.0
         >>> evaluate("hello - hello")
         Traceback (most recent call last):
         ...
         NameError: The use of 'hello' is not allowed
     """
-
-    # Compile the expression
-    code = compile(expression, "<string>", "eval")
-    allowed_names = {k: v for k, v in math.__dict__.items() if not k.startswith("__")}
-
-    # Validate allowed names
-    for name in code.co_names:
-        if name not in allowed_names:
-            raise NameError(f"The use of '{name}' is not allowed")
-    return eval(code, {"__builtins__": {}}, allowed_names)
+    variables = variables or {}
+    return compile_expression(expression, variables.keys()).evaluate(**variables)
@@ -1,7 +1,10 @@
 import re
 from calendar import monthrange
 from datetime import datetime, date, timedelta, timezone
-from typing import Union, Optional, Generator
+from functools import lru_cache
+from typing import Union, Optional, Generator, Iterable, Callable, Dict, Any, List, NamedTuple
+
+from python_utils.imports import import_optional_dependency
 
 DATE_FORMAT = "%Y-%m-%d"
 TIME_FORMAT = "%H:%M:%S"
@@ -31,6 +34,31 @@ def get_fixed_timezone(offset):  # pragma no cover
     return timezone(timedelta(minutes=offset), name)
 
 
+@lru_cache(maxsize=None)
+def _get_offset_timezone(offset: int) -> timezone:
+    """Return the timezone with the offset in minutes, without a name, as the ones of datetime.fromisoformat."""
+    return timezone(timedelta(minutes=offset))
+
+
+def _datetime_from_match(match: re.Match) -> datetime:
+    """Build the datetime of a match of datetime_re."""
+    year, month, day, hour, minute, second, microsecond, tzinfo = match.groups()
+    if tzinfo == 'Z':
+        tzinfo = timezone.utc
+    elif tzinfo is not None:
+        offset_mins = int(tzinfo[-2:]) if len(tzinfo) > 3 else 0
+        offset = 60 * int(tzinfo[1:3]) + offset_mins
+        if tzinfo[0] == '-':
+            offset = -offset
+        tzinfo = _get_offset_timezone(offset)
+    return datetime(
+        int(year), int(month), int(day), int(hour), int(minute),
+        int(second) if second else 0,
+        int(microsecond.ljust(6, '0')) if microsecond else 0,
+        tzinfo,
+    )
+
+
 def parse_datetime(value):  # pragma no cover
     """Parse a string and return a datetime.datetime.
 
@@ -44,19 +72,7 @@ def parse_datetime(value):  # pragma no cover
         return datetime.fromisoformat(value)
     except ValueError:
         if match := datetime_re.match(value):
-            kw = match.groupdict()
-            kw['microsecond'] = kw['microsecond'] and kw['microsecond'].ljust(6, '0')
-            tzinfo = kw.pop('tzinfo')
-            if tzinfo == 'Z':
-                tzinfo = timezone.utc
-            elif tzinfo is not None:
-                offset_mins = int(tzinfo[-2:]) if len(tzinfo) > 3 else 0
-                offset = 60 * int(tzinfo[1:3]) + offset_mins
-                if tzinfo[0] == '-':
-                    offset = -offset
-                tzinfo = get_fixed_timezone(offset)
-            kw = {k: int(v) for k, v in kw.items() if v is not None}
-            return datetime(**kw, tzinfo=tzinfo)
+            return _datetime_from_match(match)
 
 
 def parse_date(value):  # pragma no cover
@@ -251,6 +267,186 @@ def get_date(
     return parsed_date
 
 
+class ParsedValues(NamedTuple):
+    """Result of a bulk parsing: the parsed values and the invalid values, by row index."""
+    values: Any
+    errors: Dict[int, Any]
+
+
+# Number of non-null values used to detect the format of a column
+FORMAT_DETECTION_SAMPLE_SIZE = 10
+
+
+def _parse_date_str(value: str) -> Optional[date]:
+    """Same as get_date for str values, without the fromisoformat attempt."""
+    if len(value) > 10:
+        if match := datetime_re.match(value):
+            return _datetime_from_match(match).date()
+    elif match := date_re.match(value):
+        return date(**{k: int(v) for k, v in match.groupdict().items()})
+
+
+def _parse_datetime_str(value: str) -> Optional[datetime]:
+    """Same as get_datetime for str values, without the fromisoformat attempt."""
+    if len(value) > 10:
+        if match := datetime_re.match(value):
+            return _datetime_from_match(match)
+    elif match := date_re.match(value):
+        return datetime(**{k: int(v) for k, v in match.groupdict().items()})
+
+
+def _iso_date(value: str) -> date:
+    if len(value) > 10:
+        return datetime.fromisoformat(value).date()
+    return date.fromisoformat(value)
+
+
+def _iso_datetime(value: str) -> datetime:
+    if len(value) > 10:
+        return datetime.fromisoformat(value)
+    return date_to_datetime(date.fromisoformat(value))
+
+
+def _detect_iso_format(values: Iterable, iso_parser: Callable[[str], Any]) -> bool:
+    """Check if the first non-null str values are in ISO format."""
+    sample_size = 0
+    for value in values:
+        if not isinstance(value, str) or not value:
+            continue
+        try:
+            iso_parser(value)
+        except ValueError:
+            return False
+        sample_size += 1
+        if sample_size == FORMAT_DETECTION_SAMPLE_SIZE:
+            break
+    return True
+
+
+def _parse_many(
+        values: Iterable[Optional[Union[date, datetime, str]]],
+        convert: Callable[[Any], Any],
+        iso_parser: Callable[[str], Any],
+        str_parser: Callable[[str], Any],
+) -> ParsedValues:
+    values = values if isinstance(values, (list, tuple)) else list(values)
+
+    # Pick the fast path from the first values: fromisoformat if they are in ISO format,
+    # or the regex directly otherwise, instead of trying fromisoformat on every value.
+    if _detect_iso_format(values, iso_parser):
+        def parse(value: str):
+            try:
+                return iso_parser(value)
+            except ValueError:
+                return str_parser(value)
+    else:
+        def parse(value: str):
+            parsed_value = str_parser(value)
+            if parsed_value is None:
+                try:
+                    return iso_parser(value)
+                except ValueError:
+                    return None
+            return parsed_value
+
+    parsed_values = []
+    errors = {}
+    cache = {}
+    for row, value in enumerate(values):
+        if value is None or value == "":
+            parsed_values.append(None)
+            continue
+
+        if isinstance(value, str):
+            try:
+                parsed_value = cache[value]
+            except KeyError:
+                try:
+                    parsed_value = parse(value)
+                except ValueError:
+                    # Well formatted, but not valid, e.g. month 13
+                    parsed_value = None
+                cache[value] = parsed_value
+        elif isinstance(value, date):
+            parsed_value = convert(value)
+        else:
+            parsed_value = None
+
+        if parsed_value is None:
+            errors[row] = value
+        parsed_values.append(parsed_value)
+
+    return ParsedValues(parsed_values, errors)
+
+
+def _to_numpy(values: List[Optional[Union[date, datetime]]], unit: str):
+    np = import_optional_dependency("numpy")
+    return np.array([
+        value.astimezone(timezone.utc).replace(tzinfo=None)
+        if isinstance(value, datetime) and value.tzinfo else value
+        for value in values
+    ], dtype=f"datetime64[{unit}]")
+
+
+def parse_dates(
+        values: Iterable[Optional[Union[date, datetime, str]]],
+        as_numpy=False
+) -> ParsedValues:
+    """
+    Convert many values to dates, like get_date, e.g. a column of a file.
+    The format is detected from the first values and repeated strings are parsed only once.
+    Invalid values are reported in the errors instead of raising.
+    Args:
+        values: to be converted. Can be date/datetime objs as well as strs formatted in date/datetime.
+            None and empty strs are converted to None, without being reported as errors.
+        as_numpy: flag to return the dates as a numpy datetime64[D] array, with NaT in place of None
+    Returns:
+        ParsedValues with the list of dates (None for invalid values) and the invalid values by row index
+    Examples:
+        >>> dates, errors = parse_dates(['2021-01-01', None, '2021-1-2', 'invalid', datetime(2021, 1, 3, 10)])
+        >>> dates
+        [datetime.date(2021, 1, 1), None, datetime.date(2021, 1, 2), None, datetime.date(2021, 1, 3)]
+        >>> errors
+        {3: 'invalid'}
+        >>> parse_dates(['2020-01-01 13:12:13', '2021-13-01'], as_numpy=True).values.astype(str).tolist()
+        ['2020-01-01', 'NaT']
+    """
+    parsed_values, errors = _parse_many(values, get_date, _iso_date, _parse_date_str)
+    if as_numpy:
+        parsed_values = _to_numpy(parsed_values, "D")
+    return ParsedValues(parsed_values, errors)
+
+
+def parse_datetimes(
+        values: Iterable[Optional[Union[date, datetime, str]]],
+        as_numpy=False
+) -> ParsedValues:
+    """
+    Convert many values to datetimes, like get_datetime, e.g. a column of a file.
+    The format is detected from the first values and repeated strings are parsed only once.
+    Invalid values are reported in the errors instead of raising.
+    Args:
+        values: to be converted. Can be date/datetime objs as well as strs formatted in date/datetime.
+            None and empty strs are converted to None, without being reported as errors.
+        as_numpy: flag to return the datetimes as a numpy datetime64[us] array, with NaT in place of None.
+            Timezone aware datetimes are converted to UTC.
+    Returns:
+        ParsedValues with the list of datetimes (None for invalid values) and the invalid values by row index
+    Examples:
+        >>> datetimes, errors = parse_datetimes(['2021-01-01 10:00:00', '2021-1-1', '2021-20-20-20-20'])
+        >>> datetimes
+        [datetime.datetime(2021, 1, 1, 10, 0), datetime.datetime(2021, 1, 1, 0, 0), None]
+        >>> errors
+        {2: '2021-20-20-20-20'}
+        >>> parse_datetimes(['2021-01-01T10:00:00+0100', None], as_numpy=True).values.astype(str).tolist()
+        ['2021-01-01T09:00:00.000000', 'NaT']
+    """
+    parsed_values, errors = _parse_many(values, get_datetime, _iso_datetime, _parse_datetime_str)
+    if as_numpy:
+        parsed_values = _to_numpy(parsed_values, "us")
+    return ParsedValues(parsed_values, errors)
+
+
 def difference_months(start_date: date, end_date: date) -> int:
     """
     Get the difference in months between two date objects.
@@ -3,6 +3,16 @@ DATABASES = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': 'testing',
     },
+    'tenant1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'testing_tenant1',
+        'TEST': {'DEPENDENCIES': []},
+    },
+    'tenant2': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'testing_tenant2',
+        'TEST': {'DEPENDENCIES': []},
+    },
 }
 
 INSTALLED_APPS = (
@@ -11,7 +21,12 @@ INSTALLED_APPS = (
     "django.contrib.contenttypes",
     "django.contrib.sessions",
     "django.contrib.sites",
+    "django_celery_beat",
+    "python_utils.django",
     "tests.testapp.apps.TestAppConfig",
 )
 
+AUTH_USER_MODEL = "idp_user.User"
+KEYCLOAK_USER_GROUP_MODEL = "testapp.UserGroup"
+
 SECRET_KEY = "secret"
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('testapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserGroup',
+            fields=[
+                ('id', models.UUIDField(help_text='The ID of the group, as coming from Keycloak.', primary_key=True,
+                                        serialize=False)),
+                ('path', models.CharField(db_index=True, help_text='The full path of the group, as coming from Keycloak.',
+                                          max_length=255)),
+                ('users', models.ManyToManyField(related_name='user_groups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'test_user_group',
+                'ordering': ['path'],
+                'abstract': False,
+            },
+        ),
+    ]
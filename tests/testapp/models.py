@@ -1,5 +1,8 @@
+from django.conf import settings
 from django.db import models
 
+from python_utils.django.models.user_group import UserGroupBase
+
 
 class Invoice(models.Model):
     id = models.PositiveSmallIntegerField(primary_key=True)
@@ -31,3 +34,10 @@ class Company(models.Model):
 
     def __str__(self):  # pragma no cover
         return f'{self.name}'
+
+
+class UserGroup(UserGroupBase):
+    users = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='user_groups')
+
+    class Meta(UserGroupBase.Meta):
+        db_table = 'test_user_group'
@@ -1,8 +1,10 @@
 import pytest
 
-from python_utils.data_structures import get_differences, Finder
+from python_utils.data_structures import get_differences, Finder, IndexedFinder, ColumnarRecords, \
+    filter_dicts, filter_objects, DiffEngine
 from tests.tests_data_structures.tests_data import GET_DIFFERENCES_TEST_CASES, FINDER_FIND_TEST_CASES, \
-    FINDER_FILTER_TEST_CASES
+    FINDER_FILTER_TEST_CASES, INDEXED_FINDER_TEST_CASES, COLUMNAR_RECORDS_FILTER_TEST_CASES
+from tests.utils import Dummy
 
 
 @pytest.mark.parametrize('test_data', GET_DIFFERENCES_TEST_CASES)
@@ -11,25 +13,150 @@ def test_get_differences(test_data):
     assert output == test_data.output, 'Wrong output from function!'
 
 
+@pytest.mark.parametrize('test_data', GET_DIFFERENCES_TEST_CASES)
+def test_diff_engine_same_output_as_get_differences(test_data):
+    engine = DiffEngine(
+        skip_keys=test_data.input.get('skip_keys'),
+        number_precision=test_data.input.get('number_precision', 6)
+    )
+    # Diff twice, so that the second diff uses the compiled plan
+    for _ in range(2):
+        output = engine.diff(test_data.input['old_data'], test_data.input['new_data'])
+        assert output == test_data.output, 'Wrong output from function!'
+
+
+def test_diff_engine_updates():
+    old_records = [Dummy(i_number=i, text=f'T-{i}') for i in range(1, 4)]
+    new_records = [
+        {'i_number': 1, 'text': 'T-1', 'f_number': 10.0000001},
+        {'i_number': 2, 'text': 'New T-2', 'f_number': 10.0},
+        {'i_number': 3, 'text': 'T-3', 'f_number': 11.0},
+        {'i_number': 4, 'text': 'T-4', 'f_number': 10.0},
+    ]
+    engine = DiffEngine(fields=['text', 'f_number'], comparators={'text': 'exact'})
+    assert engine.diff_many(old_records, new_records, key='i_number') == {
+        2: {'text': 'New T-2'},
+        3: {'f_number': 11.0},
+    }, 'Wrong differences returned!'
+
+    records, fields = engine.get_updates(old_records, new_records, key='i_number')
+    assert records == old_records[1:], 'Wrong records returned!'
+    assert fields == ['text', 'f_number'], 'Wrong fields returned!'
+    assert (records[0].text, records[1].f_number) == ('New T-2', 11.0), 'Differences not applied!'
+
+
+def test_diff_engine_invalid_strategy():
+    with pytest.raises(ValueError):
+        DiffEngine(comparators={'text': 'not_found'})
+
+
+@pytest.mark.parametrize('finder_class', [Finder, IndexedFinder])
 @pytest.mark.parametrize('test_data', FINDER_FIND_TEST_CASES)
-def test_finder_find(test_data, initial_objects):
-    obj = Finder(initial_objects).find(**test_data.input)
+def test_finder_find(test_data, initial_objects, finder_class):
+    obj = finder_class(initial_objects).find(**test_data.input)
     if test_data.output is None:
         assert obj is None, 'Wrong object returned!'
     else:
         assert test_data.output == obj.text, 'Wrong object returned!'
 
 
-def test_finder_filter_on_empty_list():
-    assert Finder([]).find(id=1) is None, 'Wrong object returned!'
+@pytest.mark.parametrize('finder_class', [Finder, IndexedFinder])
+def test_finder_filter_on_empty_list(finder_class):
+    assert finder_class([]).find(id=1) is None, 'Wrong object returned!'
 
 
+@pytest.mark.parametrize('finder_class', [Finder, IndexedFinder])
 @pytest.mark.parametrize('test_data', FINDER_FILTER_TEST_CASES)
-def test_finder_filter(test_data, initial_objects):
-    objects = Finder(initial_objects).filter(**test_data.input)
+def test_finder_filter(test_data, initial_objects, finder_class):
+    objects = finder_class(initial_objects).filter(**test_data.input)
     if 'as_list' in test_data.input:
         assert type(objects) == filter, 'Wrong type returned!'
         assert sum(1 for _ in objects) == 3, 'Wrong number of objects inside filter returned!'
     else:
         assert type(objects) == list, 'Wrong type returned!'
         assert test_data.output == str(objects), 'Wrong objects returned!'
+
+
+@pytest.mark.parametrize('test_data', INDEXED_FINDER_TEST_CASES)
+def test_indexed_finder_same_results_as_finder(test_data, initial_objects):
+    finder = IndexedFinder(initial_objects)
+    # Query twice, so that the second query is served by the built indexes
+    for _ in range(2):
+        assert str(finder.filter(**test_data.input)) == test_data.output, 'Wrong objects returned!'
+    assert str(Finder(initial_objects).filter(**test_data.input)) == test_data.output, 'Wrong objects returned!'
+
+
+@pytest.mark.parametrize('filters', [{'id__in': [10]}, {'id__in': ['1', 3]}, {'id': 10}, {'id__gte': 2}])
+def test_indexed_finder_ignore_types_same_results_as_finder(filters):
+    records = [{'id': i} for i in (1, 2, 3, 10)]
+    expected = Finder(records).filter(ignore_types=True, **filters)
+    finder = IndexedFinder(records)
+    for _ in range(2):
+        assert finder.filter(ignore_types=True, **filters) == expected, 'Wrong objects returned!'
+
+
+def test_indexed_finder_invalidates_indexes(initial_objects):
+    finder = IndexedFinder(initial_objects, index_on=['i_number'])
+    assert finder.find(i_number=20) is None, 'Wrong object returned!'
+
+    finder.append(Dummy(i_number=20, text='T-20'))
+    assert finder.find(i_number=20).text == 'T-20', 'Index not invalidated on append!'
+
+    initial_objects.append(Dummy(i_number=30, text='T-30'))
+    assert str(finder.filter(i_number__gte=20)) == '[T-20, T-30]', 'Index not invalidated on length change!'
+
+    initial_objects[0].i_number = 40
+    finder.invalidate()
+    assert finder.find(i_number=40).text == 'T-1', 'Index not invalidated explicitly!'
+
+
+def test_indexed_finder_not_comparable_values():
+    records = [{'id': 1, 'amount': 10}, {'id': 2}]
+    finder = IndexedFinder(records)
+    # Same as Finder: a range lookup on a missing value cannot be compared
+    with pytest.raises(TypeError):
+        finder.filter(amount__gt=5)
+    assert finder.filter(amount=None) == [{'id': 2}], 'Wrong objects returned!'
+
+
+@pytest.mark.parametrize('test_data', COLUMNAR_RECORDS_FILTER_TEST_CASES)
+def test_columnar_records_filter(test_data, initial_objects):
+    pytest.importorskip('numpy')
+    records = ColumnarRecords(initial_objects)
+    assert str(records.filter(**test_data.input)) == test_data.output, 'Wrong objects returned!'
+    assert str(filter_objects(records, **test_data.input)) == test_data.output, 'Wrong objects returned!'
+    assert str(Finder(initial_objects).filter(**test_data.input)) == test_data.output, 'Wrong objects returned!'
+
+
+@pytest.mark.parametrize('filters', [
+    {'id__in': ['x', 2]},
+    {'id__in': [1, None]},
+    {'id__in': [2.0, 3]},
+    {'id__in': []},
+    {'code__in': [1, 'zz']},
+    {'code__in': ['1', 'B']},
+])
+def test_columnar_records_mixed_types_in(filters):
+    pytest.importorskip('numpy')
+    dicts = [{'id': 1, 'code': '1'}, {'id': 2, 'code': 'zz'}, {'id': 3, 'code': 'B'}]
+    expected = Finder(dicts).filter(**filters)
+    assert ColumnarRecords(dicts).filter(**filters) == expected, 'Wrong objects returned!'
+
+
+@pytest.mark.parametrize('filters', [{'a': [1]}, {'a__in': [[1], [3]]}, {'a__ne': [1, 2]}, {'a': None}])
+def test_columnar_records_sequence_values(filters):
+    pytest.importorskip('numpy')
+    dicts = [{'id': 1, 'a': [1, 2]}, {'id': 2, 'a': [1]}, {'id': 3}]
+    expected = Finder(dicts).filter(**filters)
+    assert ColumnarRecords(dicts).filter(**filters) == expected, 'Wrong objects returned!'
+
+
+def test_columnar_records_dicts():
+    pytest.importorskip('numpy')
+    dicts = [{'id': 1, 'code': 'A'}, {'id': 2, 'code': 1}, {'id': 3}]
+    records = ColumnarRecords(dicts)
+    assert filter_dicts(records, code=1) == [{'id': 2, 'code': 1}], 'Numbers mixed with strings not kept!'
+    assert filter_dicts(records, code=None) == [{'id': 3}], 'Missing values not treated as None!'
+    assert records.indices(id__gte=2).tolist() == [1, 2], 'Wrong indices returned!'
+    assert list(filter_dicts(records, as_list=False, id__lt=2)) == [{'id': 1, 'code': 'A'}], 'Wrong records returned!'
+    assert records.find(id=4) is None, 'Wrong record returned!'
@@ -151,3 +151,74 @@ FINDER_FILTER_ON_EMPTY_RECORDS = [
         output=None
     )
 ]
+
+INDEXED_FINDER_TEST_CASES = [
+    TestCase(
+        description='Case 0: eq and range lookups combined',
+        input={'i_number__gt': 1, 'text__in': ['T-2', 'T-5', 'T-9']},
+        output='[T-2, T-5]'
+    ),
+    TestCase(
+        description='Case 1: range lookups on both bounds',
+        input={'i_number__gte': 2, 'i_number__lte': 4},
+        output='[T-2, T-3, T-4]'
+    ),
+    TestCase(
+        description='Case 2: in lookup with a non collection value is not indexed',
+        input={'text__in': 'T-12'},
+        output='[T-1]'
+    ),
+    TestCase(
+        description='Case 3: ignore_types with range lookup compares strings',
+        input={'i_number__lt': '3', 'ignore_types': True},
+        output='[T-1, T-2]'
+    ),
+    TestCase(
+        description='Case 4: eq lookup on nested attribute',
+        input={'child__text': 'T-7'},
+        output='[T-6]'
+    ),
+    TestCase(
+        description='Case 5: no match',
+        input={'i_number': 10},
+        output='[]'
+    ),
+]
+
+COLUMNAR_RECORDS_FILTER_TEST_CASES = [
+    TestCase(
+        description='Case 0: default operation (=) on numbers',
+        input={'i_number': 2},
+        output='[T-2]'
+    ),
+    TestCase(
+        description='Case 1: range operations combined',
+        input={'i_number__gt': 1, 'i_number__lte': 3},
+        output='[T-2, T-3]'
+    ),
+    TestCase(
+        description='Case 2: in operation on strings',
+        input={'text__in': ['T-1', 'T-4', 'T-10']},
+        output='[T-1, T-4]'
+    ),
+    TestCase(
+        description='Case 3: ne operation on Decimals',
+        input={'d_number__ne': Decimal('10.5')},
+        output='[]'
+    ),
+    TestCase(
+        description='Case 4: attr in relation, missing values are None',
+        input={'child__text': 'T-7'},
+        output='[T-6]'
+    ),
+    TestCase(
+        description='Case 5: ignore_types=True',
+        input={'i_number': '5', 'ignore_types': True},
+        output='[T-5]'
+    ),
+    TestCase(
+        description='Case 6: in operation with ignore_types=True behaves as in Finder',
+        input={'i_number__in': [1, 2], 'ignore_types': True},
+        output='[T-1, T-2]'
+    ),
+]
@@ -0,0 +1,326 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connections
+from jwt import PyJWKSet, decode, encode
+from jwt.exceptions import ExpiredSignatureError, InvalidAudienceError, PyJWKClientError
+
+from ninja.errors import AuthenticationError, HttpError
+
+from python_utils.django.api import drf, jwks, ninja, utils
+from python_utils.django.api.drf import HasScope
+from python_utils.django.api.jwks import SigningKeyStore
+from python_utils.django.api.ninja import AuthBearer, AuthBearerAsync, allowed_scopes
+from python_utils.django.api.utils import (
+    UserCache,
+    VerifiedTokenCache,
+    adecode_jwt,
+    create_or_update_user,
+    decode_jwt,
+    get_jwks_client,
+)
+from python_utils.django.tenant_context import TenantContext
+from python_utils.django.tests import MockKeycloakIdP
+
+JWKS_URI = 'https://id.{tenant}.company.com/realms/{tenant}/protocol/openid-connect/certs'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture(scope='module')
+def keycloak_idp():
+    return MockKeycloakIdP()
+
+
+@pytest.fixture()
+def clock():
+    clock = Clock()
+    with patch.object(jwks, 'time', clock):
+        yield clock
+
+
+@pytest.fixture()
+def key_store(keycloak_idp, clock):
+    keys = {key.key_id: key for key in PyJWKSet.from_dict(keycloak_idp.get_jwks()).keys}
+    return SigningKeyStore(ttl=300, min_refresh_interval=30, fetch_keys=Mock(return_value=keys))
+
+
+def test_signing_key_store_hit(key_store, keycloak_idp):
+    token = keycloak_idp.generate_token()
+    with TenantContext('tenant1'):
+        key = key_store.get_signing_key_from_jwt(token)
+        assert key_store.get_signing_key_from_jwt(token) is key, 'Cached key not returned!'
+    assert decode(token, key.key, algorithms=['RS256'], audience=keycloak_idp.audience), 'Wrong key returned!'
+    key_store.fetch_keys.assert_called_once_with(JWKS_URI.format(tenant='tenant1'))
+
+    with TenantContext('tenant2'):
+        key_store.get_signing_key_from_jwt(token)
+    key_store.fetch_keys.assert_called_with(JWKS_URI.format(tenant='tenant2'))
+    assert key_store.get_metrics() == {
+        'hits': 1, 'misses': 2, 'refreshes': 2, 'refresh_errors': 0, 'unknown_kids': 0
+    }, 'Wrong metrics!'
+
+
+def test_signing_key_store_expiry(key_store, keycloak_idp, clock):
+    with TenantContext('tenant1'):
+        key_store.get_signing_key(keycloak_idp.kid)
+        clock.now += 299
+        key_store.get_signing_key(keycloak_idp.kid)
+        assert key_store.fetch_keys.call_count == 1, 'Keys fetched before expiring!'
+
+        clock.now += 1
+        key_store.get_signing_key(keycloak_idp.kid)
+        assert key_store.fetch_keys.call_count == 2, 'Expired keys not fetched!'
+
+        # The expired keys are used while the Auth Server is not reachable
+        clock.now += 300
+        key_store.fetch_keys.side_effect = PyJWKClientError('Fail to fetch data from the url')
+        assert key_store.get_signing_key(keycloak_idp.kid).key_id == keycloak_idp.kid, 'Expired key not used!'
+    assert key_store.get_metrics()['refresh_errors'] == 1, 'Wrong metrics!'
+
+
+def test_signing_key_store_unknown_kid_throttled_refetch(key_store, keycloak_idp, clock):
+    with TenantContext('tenant1'):
+        key_store.get_signing_key(keycloak_idp.kid)
+        with pytest.raises(PyJWKClientError):
+            key_store.get_signing_key('unknown-kid')
+        assert key_store.fetch_keys.call_count == 1, 'Keys fetched again before the min refresh interval!'
+
+        clock.now += 30
+        for _ in range(3):
+            with pytest.raises(PyJWKClientError):
+                key_store.get_signing_key('unknown-kid')
+        assert key_store.fetch_keys.call_count == 2, 'Keys not fetched once after the min refresh interval!'
+        assert key_store.get_signing_key(keycloak_idp.kid).key_id == keycloak_idp.kid, 'Known key not returned!'
+    assert key_store.get_metrics()['unknown_kids'] == 4, 'Wrong metrics!'
+
+
+def test_get_jwks_client_deprecated(keycloak_idp, key_store):
+    with pytest.warns(DeprecationWarning), patch.object(utils, 'SIGNING_KEY_STORE', key_store):
+        jwks_client = get_jwks_client()
+    with TenantContext('tenant1'):
+        key = jwks_client.get_signing_key_from_jwt(keycloak_idp.generate_token())
+    assert key.key_id == keycloak_idp.kid, 'Wrong key returned!'
+    key_store.fetch_keys.assert_called_once_with(JWKS_URI.format(tenant='tenant1'))
+
+
+def test_adecode_jwt_verifies_cached_keys_on_event_loop(key_store, keycloak_idp):
+    token = keycloak_idp.generate_token()
+
+    async def decode_tokens():
+        with TenantContext('tenant1'):
+            # The keys are fetched in a thread, with the tenant of the caller
+            payload = await adecode_jwt(token, audience=keycloak_idp.audience)
+            with patch.object(utils, '_JWT_VERIFICATION_EXECUTOR') as executor:
+                cached_payload = await adecode_jwt(token, audience=keycloak_idp.audience)
+            executor.submit.assert_not_called()
+        return payload, cached_payload
+
+    with patch.object(utils, 'SIGNING_KEY_STORE', key_store):
+        payload, cached_payload = asyncio.run(decode_tokens())
+        with TenantContext('tenant1'):
+            assert payload == cached_payload == decode_jwt(token, audience=keycloak_idp.audience), \
+                'Wrong payload returned!'
+    key_store.fetch_keys.assert_called_once_with(JWKS_URI.format(tenant='tenant1'))
+
+
+def test_adecode_jwt_invalid_token(key_store, keycloak_idp):
+    async def decode_token(token):
+        with TenantContext('tenant1'):
+            return await adecode_jwt(token, audience=keycloak_idp.audience)
+
+    with patch.object(utils, 'SIGNING_KEY_STORE', key_store):
+        with pytest.raises(ExpiredSignatureError):
+            asyncio.run(decode_token(keycloak_idp.generate_token(exp=int(time.time()) - 60)))
+        with pytest.raises(InvalidAudienceError):
+            asyncio.run(decode_token(keycloak_idp.generate_token(aud='other-audience')))
+        with pytest.raises(PyJWKClientError):
+            asyncio.run(decode_token(encode({}, keycloak_idp.private_key, algorithm='RS256', headers={'kid': 'unknown'})))
+
+
+def test_auth_bearer_async_decodes_without_blocking():
+    with patch.object(ninja, 'adecode_jwt', AsyncMock(side_effect=ExpiredSignatureError)), \
+            patch.object(ninja, 'decode_jwt', side_effect=AssertionError('Blocking decode_jwt called!')):
+        with pytest.raises(AuthenticationError):
+            asyncio.run(AuthBearerAsync().authenticate(Mock(), 'token'))
+
+
+def test_verified_token_cache_expires_at_exp(clock):
+    cache = VerifiedTokenCache(max_size=10)
+    payload = {'sub': 'user', 'exp': clock.now + 60}
+    with TenantContext('tenant1'), patch.object(utils, 'time', clock):
+        key = cache.make_key('token', 'audience')
+        cache.set(key, payload)
+        clock.now += 59
+        assert cache.get(key) == payload, 'Payload not cached until it expires!'
+        clock.now += 1
+        assert cache.get(key) is None, 'Expired payload returned!'
+
+        cache.set(key, {'sub': 'user'})
+        assert cache.get(key) is None, 'Payload without expiration cached!'
+
+
+def test_verified_token_cache_key_per_tenant_and_audience():
+    cache = VerifiedTokenCache(max_size=10)
+    payload = {'sub': 'user', 'exp': 2 ** 40}
+    with TenantContext('tenant1'):
+        cache.set(cache.make_key('token', ['audience', 'other']), payload)
+        assert cache.get(cache.make_key('token', ['audience', 'other'])) == payload, 'Payload not cached!'
+        assert cache.get(cache.make_key('token', 'audience')) is None, 'Payload of another audience returned!'
+        assert cache.get(cache.make_key('other-token', ['audience', 'other'])) is None, \
+            'Payload of another token returned!'
+    with TenantContext('tenant2'):
+        assert cache.get(cache.make_key('token', ['audience', 'other'])) is None, \
+            'Payload of another tenant returned!'
+
+
+def test_verified_token_cache_copies_nested_claims():
+    cache = VerifiedTokenCache(max_size=10)
+    payload = {'sub': 'user', 'exp': 2 ** 40, 'groups': ['/a'], 'realm_access': {'roles': ['admin']}}
+    with TenantContext('tenant1'):
+        key = cache.make_key('token', 'audience')
+        cache.set(key, payload)
+        payload['groups'].append('/b')
+        cached = cache.get(key)
+        cached['realm_access']['roles'].append('owner')
+        assert cache.get(key) == {
+            'sub': 'user', 'exp': 2 ** 40, 'groups': ['/a'], 'realm_access': {'roles': ['admin']}
+        }, 'Cached payload changed!'
+
+
+@pytest.mark.django_db
+def test_create_or_update_user_cache(clock, django_assert_num_queries):
+    payload = {'given_name': 'First', 'family_name': 'Last', 'email': 'user@test.com'}
+    with TenantContext('default'), patch.object(utils, 'USER_CACHE', UserCache(ttl=60, max_size=10)), \
+            patch.object(utils, 'time', clock):
+        user = create_or_update_user('user', payload)
+        with django_assert_num_queries(0):
+            cached_user = create_or_update_user('user', payload)
+        assert (cached_user.pk, cached_user.first_name) == (user.pk, 'First'), 'Wrong user returned!'
+
+        with django_assert_num_queries(2):
+            user = create_or_update_user('user', {**payload, 'given_name': 'Changed'})
+        assert get_user_model().objects.get(pk=user.pk).first_name == 'Changed', 'User not updated!'
+        with django_assert_num_queries(0):
+            create_or_update_user('user', {**payload, 'given_name': 'Changed'})
+
+        clock.now += 60
+        with django_assert_num_queries(1):
+            create_or_update_user('user', {**payload, 'given_name': 'Changed'})
+
+
+@pytest.mark.django_db(transaction=True)
+def test_create_or_update_user_concurrent_first_logins():
+    User = get_user_model()
+    create = User.objects.create
+    barrier = threading.Barrier(4)
+    errors = []
+
+    def slow_create(**kwargs):
+        # Give the other threads time to try to create the user as well
+        time.sleep(0.1)
+        return create(**kwargs)
+
+    def login():
+        try:
+            barrier.wait(timeout=5)
+            with TenantContext('default'):
+                create_or_update_user('user', {'given_name': 'First'})
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connections.close_all()
+
+    with patch.object(type(User.objects), 'create', side_effect=slow_create):
+        threads = [threading.Thread(target=login) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert errors == [], 'Concurrent first logins failed!'
+    assert User.objects.filter(username='user').count() == 1, 'Wrong number of users created!'
+
+
+def test_has_scope_class_attribute_computed_once_per_view_class():
+    class JobsView:
+        allowed_scopes = {'get': ['jobs'], 'post': ['jobs_admin']}
+
+    class AnyView:
+        allowed_scopes = '*'
+
+    permission = HasScope()
+    token = {'scope': 'openid :jobs'}
+    assert permission.has_permission(SimpleNamespace(method='GET', auth=token), JobsView()), 'Scope not allowed!'
+    assert not permission.has_permission(SimpleNamespace(method='POST', auth=token), JobsView()), 'Scope allowed!'
+    assert permission.has_permission(SimpleNamespace(method='POST', auth={}), AnyView()), 'Any scope not allowed!'
+
+    with patch.object(JobsView, 'allowed_scopes', ['other']), patch.object(drf, 'get_prefixed_scopes') as prefix:
+        assert permission.has_permission(SimpleNamespace(method='GET', auth=token), JobsView()), 'Scopes not cached!'
+    prefix.assert_not_called()
+
+
+def test_has_scope_per_instance_scopes():
+    class InstanceView:
+        def __init__(self, scopes):
+            self.allowed_scopes = scopes
+
+    class PropertyView:
+        def __init__(self, scopes):
+            self.scopes = scopes
+
+        @property
+        def allowed_scopes(self):
+            return self.scopes
+
+    permission = HasScope()
+    request = SimpleNamespace(method='GET', auth={'scope': ':jobs'})
+    for view_class in (InstanceView, PropertyView):
+        assert permission.has_permission(request, view_class(['jobs'])), 'Scope not allowed!'
+        assert not permission.has_permission(request, view_class(['admin'])), 'Scopes of another instance used!'
+
+
+def test_auth_bearer_view_allowed_scopes_computed_once_per_path_view():
+    @allowed_scopes(['jobs'])
+    def get_jobs(request):
+        pass
+
+    def create_job(request):
+        pass
+
+    class PathView:
+        operations = [
+            SimpleNamespace(methods=['GET'], view_func=get_jobs),
+            SimpleNamespace(methods=['POST'], view_func=create_job),
+        ]
+
+    path_view = PathView()
+
+    def request(method):
+        return SimpleNamespace(method=method, path='/jobs', resolver_match=SimpleNamespace(func=Mock(__self__=path_view)))
+
+    auth = AuthBearer()
+    auth._verify_scopes(request('GET'), {'scope': 'openid :jobs'})
+    with pytest.raises(HttpError):
+        auth._verify_scopes(request('GET'), {'scope': 'openid'})
+    with pytest.raises(Exception, match='No allowed_scopes defined on the view create_job'):
+        auth._verify_scopes(request('POST'), {'scope': ':jobs'})
+
+    path_view.operations = []
+    auth._verify_scopes(request('GET'), {'scope': ':jobs'})
+    with pytest.raises(ValueError):
+        allowed_scopes('jobs')(create_job)
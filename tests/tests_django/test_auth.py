@@ -0,0 +1,222 @@
+import itertools
+import threading
+import time
+import uuid
+from unittest.mock import Mock, patch
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from keycloak.connection import ConnectionManager
+
+from python_utils.django.auth import service
+from python_utils.django.auth.service import (
+    GroupSyncResult,
+    KeycloakService,
+    UserGroupIdsCache,
+    clear_keycloak_admins,
+    get_keycloak_admin,
+    sync_user_groups_once,
+)
+from python_utils.django.tenant_context import TenantContext
+from tests.testapp.models import UserGroup
+
+GROUP = {'id': '1', 'name': 'a', 'path': '/a', 'subGroupCount': 0, 'subGroups': []}
+
+
+def keycloak_response(status_code, json=None):
+    return Mock(status_code=status_code, json=Mock(return_value=json or {'message': 'HTTP 401 Unauthorized'}))
+
+
+@pytest.fixture()
+def clear_client_token():
+    """Give a new client token on each request, and patch the removal of the cached one."""
+    tokens = ({'access_token': f'token-{i}', 'expires_in': 300} for i in itertools.count())
+    with patch.dict(service._KEYCLOAK_ADMINS, clear=True), \
+            patch.object(service, 'get_oidc_confidential_client_token', side_effect=lambda: next(tokens)), \
+            patch.object(service, 'clear_oidc_confidential_client_token') as clear_client_token, \
+            patch.object(service, 'get_user_group_model'):
+        yield clear_client_token
+
+
+def test_user_group_ids_cache_generation_bump_invalidates_entries():
+    cache.clear()
+    # Each instance stands for the cache of a different process, sharing the Django cache
+    processes = [UserGroupIdsCache(ttl=60, max_size=10, use_django_cache=True) for _ in range(3)]
+
+    with TenantContext('tenant2'):
+        processes[0].set(['/a'], [3])
+    with TenantContext('tenant1'):
+        processes[0].set(['/a', '/a/b'], [1, 2])
+        assert processes[1].get(['/a/b', '/a']) == [1, 2], 'Ids not shared through the Django cache!'
+
+        processes[0].invalidate()
+        assert processes[0].get(['/a', '/a/b']) is None, 'Local ids not invalidated!'
+        assert processes[1].get(['/a', '/a/b']) is None, 'Local ids of another process not invalidated!'
+        assert processes[2].get(['/a', '/a/b']) is None, 'Ids of an older generation returned!'
+
+        processes[0].set(['/a', '/a/b'], [1, 4])
+        assert processes[2].get(['/a', '/a/b']) == [1, 4], 'Ids of the new generation not returned!'
+    with TenantContext('tenant2'):
+        assert processes[2].get(['/a']) == [3], 'Ids of another tenant invalidated!'
+
+
+def test_user_group_ids_cache_local_expiry_and_size():
+    user_group_ids_cache = UserGroupIdsCache(ttl=60, max_size=2)
+    clock = Mock(monotonic=Mock(return_value=1000.0))
+    with TenantContext('tenant1'), patch.object(service, 'time', clock):
+        for i in range(3):
+            user_group_ids_cache.set([f'/{i}'], [i])
+        assert user_group_ids_cache.get(['/0']) is None, 'Least recently used ids not removed!'
+        assert user_group_ids_cache.get(['/2']) == [2], 'Ids not cached!'
+
+        clock.monotonic.return_value += 60
+        assert user_group_ids_cache.get(['/2']) is None, 'Expired ids returned!'
+
+def test_keycloak_admin_renews_rejected_token(clear_client_token):
+    responses = [keycloak_response(401), keycloak_response(200, [GROUP])]
+    with TenantContext('tenant1'), patch.object(ConnectionManager, 'raw_get', side_effect=responses) as raw_get:
+        keycloak_admin = get_keycloak_admin()
+        assert keycloak_admin.get_groups() == [GROUP], 'Request not retried with a new token!'
+        assert get_keycloak_admin() is keycloak_admin, 'Client not reused!'
+
+    clear_client_token.assert_called_once()
+    assert keycloak_admin.connection.token['access_token'] == 'token-1', 'Rejected token not replaced!'
+    assert raw_get.call_count == 2, 'Wrong number of requests!'
+
+
+def test_keycloak_service_drops_client_when_token_rejected(clear_client_token):
+    with TenantContext('tenant1'), patch.object(ConnectionManager, 'raw_get', return_value=keycloak_response(401)):
+        assert KeycloakService().sync_user_groups() is None, 'Groups synced with a rejected token!'
+        assert 'tenant1' not in service._KEYCLOAK_ADMINS, 'Rejected client not removed!'
+        assert get_keycloak_admin().connection.token['access_token'] == 'token-2', 'Rejected token reused!'
+
+    assert clear_client_token.call_count == 2, 'Rejected token not removed from the cache!'
+
+
+def test_clear_keycloak_admins_waits_for_tenant_lock():
+    with patch.dict(service._KEYCLOAK_ADMINS, {'tenant1': Mock(), 'tenant2': Mock()}, clear=True):
+        lock = service._KEYCLOAK_ADMIN_LOCKS.setdefault('tenant1', threading.Lock())
+        with lock:
+            thread = threading.Thread(target=clear_keycloak_admins)
+            thread.start()
+            thread.join(timeout=0.1)
+            assert thread.is_alive() and 'tenant1' in service._KEYCLOAK_ADMINS, 'Client removed while renewed!'
+        thread.join()
+        assert service._KEYCLOAK_ADMINS == {}, 'Clients not removed!'
+
+        service._KEYCLOAK_ADMINS.update({'tenant1': Mock(), 'tenant2': Mock()})
+        clear_keycloak_admins('tenant1')
+        assert list(service._KEYCLOAK_ADMINS) == ['tenant2'], 'Wrong clients removed!'
+
+
+@pytest.mark.django_db
+def test_keycloak_service_sync_user_groups():
+    kept_id, renamed_id, removed_id, created_id, created_child_id = (uuid.uuid4() for _ in range(5))
+    user, other_user = (get_user_model().objects.create(username=username) for username in ('user', 'other'))
+    UserGroup.objects.create(id=kept_id, path='/a').users.add(user)
+    UserGroup.objects.create(id=renamed_id, path='/b').users.add(user, other_user)
+    UserGroup.objects.create(id=removed_id, path='/c').users.add(other_user)
+
+    keycloak_admin = Mock()
+    keycloak_admin.get_groups.return_value = [
+        {'id': str(kept_id), 'path': '/a', 'subGroups': [
+            {'id': str(created_child_id), 'path': '/a/e', 'subGroups': []},
+        ]},
+        {'id': str(renamed_id), 'path': '/renamed', 'subGroups': []},
+        {'id': str(created_id), 'path': '/d'},
+    ]
+    user_group_ids_cache = Mock()
+    with TenantContext('default'), patch.object(service, 'get_keycloak_admin', return_value=keycloak_admin), \
+            patch.object(service, 'USER_GROUP_IDS_CACHE', user_group_ids_cache):
+        result = KeycloakService().sync_user_groups()
+        assert result[:3] == (2, 1, 1), 'Wrong changes returned!'
+        user_group_ids_cache.invalidate.assert_called_once()
+
+        assert dict(UserGroup.objects.values_list('id', 'path')) == {
+            kept_id: '/a', created_child_id: '/a/e', renamed_id: '/renamed', created_id: '/d',
+        }, 'Wrong groups synced!'
+        assert sorted(user.user_groups.values_list('path', flat=True)) == ['/a', '/renamed'], \
+            'Memberships of the kept groups changed!'
+        assert list(other_user.user_groups.values_list('path', flat=True)) == ['/renamed'], \
+            'Memberships of the removed group kept!'
+
+        # Nothing is written when the groups did not change
+        with patch.object(UserGroup.objects, 'bulk_create') as bulk_create, \
+                patch.object(UserGroup.objects, 'bulk_update') as bulk_update:
+            result = KeycloakService().sync_user_groups()
+        assert not result.has_changes, 'Changes returned!'
+        bulk_create.assert_not_called()
+        bulk_update.assert_not_called()
+        user_group_ids_cache.invalidate.assert_called_once()
+
+
+@pytest.mark.django_db
+def test_keycloak_service_apply_group_changes_in_batches():
+    paths_by_id = {str(uuid.uuid4()): f'/group-{i}' for i in range(5)}
+    with TenantContext('default'), patch.object(service, 'get_keycloak_admin'):
+        keycloak_service = KeycloakService()
+        keycloak_service.batch_size = 2
+        assert keycloak_service._apply_group_changes(paths_by_id, 0)[:3] == (5, 0, 0), 'Wrong changes returned!'
+
+        renamed_paths_by_id = {group_id: f'{path}-renamed' for group_id, path in list(paths_by_id.items())[:3]}
+        result = keycloak_service._apply_group_changes(renamed_paths_by_id, 0)
+    assert isinstance(result, GroupSyncResult) and result[:3] == (0, 3, 2), 'Wrong changes returned!'
+    assert sorted(UserGroup.objects.values_list('path', flat=True)) == [
+        '/group-0-renamed', '/group-1-renamed', '/group-2-renamed',
+    ], 'Wrong groups synced!'
+
+
+@pytest.fixture()
+def keycloak_service():
+    """Patch the group syncs, which take 0.1s each, and reset the times of the last syncs."""
+
+    def sync_user_groups():
+        time.sleep(0.1)
+        return GroupSyncResult(0, 0, 0, 0.1)
+
+    keycloak_service = Mock()
+    keycloak_service.return_value.sync_user_groups.side_effect = sync_user_groups
+    with patch.object(service, 'KeycloakService', keycloak_service), patch.dict(service._LAST_GROUP_SYNCS, clear=True):
+        yield keycloak_service
+
+
+def test_sync_user_groups_once_concurrent_calls_single_sync(keycloak_service):
+    barrier = threading.Barrier(4)
+    results = []
+
+    def sync():
+        since = time.monotonic()
+        barrier.wait(timeout=5)
+        with TenantContext('tenant1'):
+            results.append(sync_user_groups_once(since))
+
+    threads = [threading.Thread(target=sync) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert keycloak_service.return_value.sync_user_groups.call_count == 1, 'Groups synced more than once!'
+    assert results == [True] * 4, 'Callers not told about the sync in progress!'
+
+
+def test_sync_user_groups_once_debounced(keycloak_service):
+    with TenantContext('tenant1'):
+        assert sync_user_groups_once(time.monotonic()), 'Groups not synced!'
+        assert not sync_user_groups_once(time.monotonic()), 'Groups synced within the debounce window!'
+    with TenantContext('tenant2'):
+        assert sync_user_groups_once(time.monotonic()), 'Groups of another tenant debounced!'
+    assert keycloak_service.return_value.sync_user_groups.call_count == 2, 'Wrong number of syncs!'
+
+    # Failed syncs are debounced as well
+    service._LAST_GROUP_SYNCS.clear()
+    keycloak_service.return_value.sync_user_groups.side_effect = Exception('Keycloak is not available')
+    with TenantContext('tenant1'):
+        with pytest.raises(Exception, match='Keycloak is not available'):
+            sync_user_groups_once(time.monotonic())
+        assert not sync_user_groups_once(time.monotonic()), 'Groups synced after a failure within the window!'
+
+        with patch.object(service, 'KEYCLOAK_GROUP_SYNC_DEBOUNCE', 0):
+            keycloak_service.return_value.sync_user_groups.side_effect = None
+            assert sync_user_groups_once(time.monotonic()), 'Groups not synced after the debounce window!'
@@ -0,0 +1,196 @@
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from celery import Celery, states
+from celery.result import ResultSet
+from celery.app.task import Task
+from celery_once import AlreadyQueued
+
+from python_utils.django.celery import TenantAwareTask, tenant_aware_database_scheduler
+from python_utils.django.celery.tenant_aware_database_scheduler import TenantAwareDatabaseScheduler
+from python_utils.django.tenant_context import TenantContext
+
+LAST_CHANGE = datetime(2026, 1, 1)
+
+
+class LocalOnceBackend:
+    """celery_once backend keeping the locks in the settings, which are shared by its instances."""
+
+    def __init__(self, settings):
+        self.locks = settings['locks']
+
+    def raise_or_lock(self, key, timeout):
+        if key in self.locks:
+            raise AlreadyQueued(timeout)
+        self.locks.add(key)
+
+    def clear_lock(self, key):
+        self.locks.discard(key)
+
+
+@pytest.fixture()
+def get_tenant_task():
+    app = Celery(set_as_current=False)
+    app.conf.ONCE = {'backend': f'{__name__}.LocalOnceBackend', 'settings': {'locks': set()}}
+
+    @app.task(base=TenantAwareTask, name='tests.get_tenant')
+    def get_tenant(number):
+        return TenantContext.get(), number
+
+    return get_tenant
+
+
+def test_task_tenant_from_headers(get_tenant_task):
+    result = get_tenant_task.apply((1,), headers={'tenant': 'tenant1'})
+    assert result.get() == ('tenant1', 1), 'Tenant not set from the headers!'
+    assert not TenantContext.is_set(), 'Tenant not cleared!'
+
+    with TenantContext('tenant2'):
+        result = get_tenant_task.apply((2,))
+    assert result.get() == ('tenant2', 2), 'Tenant not passed in the headers!'
+
+
+def test_task_tenant_from_legacy_kwarg(get_tenant_task):
+    result = get_tenant_task.apply((1,), {'tenant': 'tenant1'})
+    assert result.get() == ('tenant1', 1), 'Tenant not set from the kwargs!'
+
+    # Message published with the tenant only in the kwargs
+    try:
+        assert get_tenant_task(2, tenant='tenant2') == ('tenant2', 2), 'Tenant not set from the kwargs!'
+    finally:
+        TenantContext.clear()
+
+
+def test_task_lock_per_tenant(get_tenant_task):
+    with patch.object(Task, 'apply_async', return_value='queued'):
+        with TenantContext('tenant1'):
+            assert get_tenant_task.apply_async((1,)) == 'queued', 'Task not queued!'
+            assert get_tenant_task.apply_async((1,)).state == states.REJECTED, 'Task queued twice!'
+        with TenantContext('tenant2'):
+            assert get_tenant_task.apply_async((1,)) == 'queued', 'Task locked for the other tenants!'
+        assert get_tenant_task.apply_async((2,), {'tenant': 'tenant1'}) == 'queued', 'Task not queued!'
+        assert get_tenant_task.apply_async((2,), headers={'tenant': 'tenant1'}).state == states.REJECTED, \
+            'Task queued twice!'
+
+    keys = [
+        get_tenant_task.get_key((1,), {'tenant': tenant}) for tenant in ('tenant1', 'tenant2')
+    ]
+    assert all(tenant in key for tenant, key in zip(('tenant1', 'tenant2'), keys)), 'Tenant not in the lock key!'
+
+
+def test_scheduler_skips_slow_tenants_and_cancels_checks_on_close():
+    scheduler = TenantAwareDatabaseScheduler(app=Celery(set_as_current=False), lazy=True)
+    released = threading.Event()
+    checked_tenants = []
+
+    def get_last_change(tenant):
+        checked_tenants.append(tenant)
+        if tenant == 'tenant2':
+            released.wait(5)
+        return LAST_CHANGE
+
+    with patch.object(tenant_aware_database_scheduler, 'SCHEDULE_CHECK_TIMEOUT', 0.1), \
+            patch.object(tenant_aware_database_scheduler, 'SCHEDULE_CHECK_WORKERS', 1), \
+            patch.object(TenantAwareDatabaseScheduler, '_get_tenant_databases', return_value=['tenant2', 'tenant1']), \
+            patch.object(TenantAwareDatabaseScheduler, '_get_last_change', side_effect=get_last_change), \
+            patch.object(TenantAwareDatabaseScheduler, 'sync'):
+        try:
+            # tenant2 blocks the single worker, so the check of tenant1 is still queued
+            assert scheduler._get_last_changes() == {}, 'Timed out checks not skipped!'
+            assert scheduler._get_last_changes() == {}, 'Timed out checks not skipped!'
+            assert checked_tenants == ['tenant2'], 'Pending checks submitted again!'
+            pending_checks = dict(scheduler._pending_checks)
+
+            start = time.monotonic()
+            scheduler.close()
+            assert time.monotonic() - start < 1, 'Close waited for the pending checks!'
+            assert pending_checks['tenant1'].cancelled(), 'Queued check not cancelled!'
+        finally:
+            released.set()
+
+        assert pending_checks['tenant2'].result(timeout=5) == LAST_CHANGE, 'Running check not finished!'
+        assert checked_tenants == ['tenant2'], 'Cancelled check executed!'
+
+
+def test_scheduler_rebuilds_only_changed_tenants():
+    scheduler = TenantAwareDatabaseScheduler(app=Celery(set_as_current=False), lazy=True)
+    versions = {'tenant1': 1, 'tenant2': 1}
+    read_tenants = []
+
+    def get_tenant_schedule(tenant):
+        read_tenants.append(tenant)
+        if versions[tenant] is None:
+            return None
+        name = f'{tenant}::task-{versions[tenant]}'
+        return {name: SimpleNamespace(name=name, tenant=tenant)}
+
+    with patch.object(TenantAwareDatabaseScheduler, '_get_tenant_databases', return_value=['tenant1', 'tenant2']), \
+            patch.object(TenantAwareDatabaseScheduler, '_get_tenant_schedule', side_effect=get_tenant_schedule), \
+            patch.object(TenantAwareDatabaseScheduler, '_get_last_changes') as get_last_changes, \
+            patch.object(tenant_aware_database_scheduler, 'close_old_connections'):
+        scheduler._schedule = scheduler.all_as_schedule()
+        assert sorted(read_tenants) == ['tenant1', 'tenant2'], 'Schedule not read from all tenants!'
+        tenant2_entry = scheduler._schedule['tenant2::task-1']
+
+        get_last_changes.return_value = {'tenant1': LAST_CHANGE, 'tenant2': LAST_CHANGE}
+        assert not scheduler.schedule_changed(), 'Initial timestamps detected as changes!'
+        get_last_changes.return_value = {'tenant1': LAST_CHANGE.replace(hour=1), 'tenant2': LAST_CHANGE}
+        assert scheduler.schedule_changed(), 'Change not detected!'
+
+        read_tenants.clear()
+        versions['tenant1'] = 2
+        scheduler._schedule = scheduler.all_as_schedule()
+        assert read_tenants == ['tenant1'], 'Schedule of unchanged tenants read!'
+        assert sorted(scheduler._schedule) == ['tenant1::task-2', 'tenant2::task-1'], 'Wrong schedule built!'
+        assert scheduler._schedule['tenant2::task-1'] is tenant2_entry, 'Entries of unchanged tenants not kept!'
+
+        # The entries of a tenant that can not be read are kept until the next read
+        versions['tenant1'] = None
+        scheduler._changed_tenants = {'tenant1'}
+        scheduler._schedule = scheduler.all_as_schedule()
+        assert sorted(scheduler._schedule) == ['tenant1::task-2', 'tenant2::task-1'], 'Entries of tenant1 lost!'
+
+        # Without changes, the whole schedule is read again, e.g. on the periodic full sync
+        read_tenants.clear()
+        versions['tenant1'] = 3
+        scheduler._schedule = scheduler.all_as_schedule()
+        assert sorted(read_tenants) == ['tenant1', 'tenant2'], 'Schedule not read from all tenants!'
+        assert sorted(scheduler._schedule) == ['tenant1::task-3', 'tenant2::task-1'], 'Wrong schedule built!'
+
+
+def test_apply_async_many_and_map_tenants_single_producer(get_tenant_task):
+    app = get_tenant_task.app
+    app.conf.broker_url = 'memory://'
+    published = []
+
+    def apply_async(args=None, kwargs=None, **options):
+        published.append((args, options['headers']['tenant'], options['producer'], options.get('countdown')))
+        return app.AsyncResult(str(len(published)))
+
+    with patch.object(Task, 'apply_async', side_effect=apply_async), \
+            patch.object(app, 'producer_or_acquire', wraps=app.producer_or_acquire) as producer_or_acquire:
+        with TenantContext('tenant1'):
+            results = get_tenant_task.apply_async_many([(1,), (2,), (3,)], countdown=10)
+        assert isinstance(results, ResultSet) and len(results) == 3, 'Wrong results returned!'
+        assert [(args, tenant, countdown) for args, tenant, _, countdown in published] == [
+            ((1,), 'tenant1', 10), ((2,), 'tenant1', 10), ((3,), 'tenant1', 10),
+        ], 'Wrong tasks published!'
+        assert len({id(producer) for _, _, producer, _ in published}) == 1, 'Tasks not published with one producer!'
+
+        published.clear()
+        results = get_tenant_task.map_tenants((4,))
+        assert isinstance(results, ResultSet) and len(results) == 2, 'Wrong results returned!'
+        assert [(args, tenant) for args, tenant, _, _ in published] == [
+            ((4,), 'tenant1'), ((4,), 'tenant2'),
+        ], 'Wrong tasks published!'
+        assert len({id(producer) for _, _, producer, _ in published}) == 1, 'Tasks not published with one producer!'
+
+        published.clear()
+        get_tenant_task.map_tenants((5,), tenants=['tenant2'])
+        assert [tenant for _, tenant, _, _ in published] == ['tenant2'], 'Wrong tenants mapped!'
+
+    assert producer_or_acquire.call_count == 3, 'Producer not acquired once per call!'
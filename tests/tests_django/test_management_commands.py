@@ -0,0 +1,96 @@
+import sys
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+
+from python_utils.django.management.commands import migrateall
+from python_utils.django.management.commands.migrateall import Command as MigrateAllCommand
+from python_utils.django.management.commands.tenant_aware_command import TenantAwareCommand, PrefixedOutput, \
+    TenantResult, execute_in_parallel, report_results
+
+
+class PartialLinesCommand(TenantAwareCommand):
+    def execute_command(self, *args, **options):
+        self.stdout.write('Step 1...', ending='')
+        self.stdout.flush()
+        self.stdout.write(' OK')
+        self.stdout.write('Step 2...', ending='')
+        if options['database'] == 'tenant2':
+            raise ValueError('Step 2 failed')
+        self.stdout.write(' OK')
+
+
+def test_prefixed_output_writes_complete_lines(capsys):
+    out = PrefixedOutput(sys.stdout, 'tenant1')
+    out.write('Step 1...')
+    assert capsys.readouterr().out == '', 'Partial line written!'
+    out.write(' OK\nStep 2')
+    assert capsys.readouterr().out == '[tenant1] Step 1... OK\n', 'Wrong complete lines written!'
+    out.close()
+    assert capsys.readouterr().out == '[tenant1] Step 2\n', 'Partial line not written on close!'
+
+
+def test_execute_in_parallel_prefixes_output_and_reports_failures(capfd):
+    command = PartialLinesCommand()
+    results = execute_in_parallel(command, ['tenant1', 'tenant2'], 2, (), {})
+    assert {result.tenant: result.success for result in results} == {'tenant1': True, 'tenant2': False}, \
+        'Wrong results returned!'
+
+    with pytest.raises(CommandError, match='Command failed for tenants: tenant2'):
+        report_results(command, results)
+
+    out, err = capfd.readouterr()
+    for line in ['[tenant1] Step 1... OK', '[tenant1] Step 2... OK', '[tenant2] Step 1... OK', '[tenant2] Step 2...']:
+        assert line in out.splitlines(), f'Line {line} not written!'
+    assert '  tenant2: FAILED' in out, 'Failure not reported!'
+    assert all(line.startswith('[tenant2] ') for line in err.splitlines()), 'Error output not prefixed!'
+    assert "[tenant2] ValueError: Step 2 failed" in err.splitlines(), 'Error not written!'
+
+
+@pytest.mark.django_db(databases=['tenant1'], transaction=True)
+def test_migrateall_has_unapplied_migrations(settings):
+    # Enable the migrations, which are disabled in the tests
+    settings.MIGRATION_MODULES = {}
+    connection = connections['tenant1']
+    assert MigrateAllCommand._has_unapplied_migrations('tenant1'), 'Unapplied migrations not found!'
+
+    recorder = MigrationRecorder(connection)
+    for app_label, name in MigrationLoader(connection).graph.nodes:
+        recorder.record_applied(app_label, name)
+    assert not MigrateAllCommand._has_unapplied_migrations('tenant1'), 'Applied migrations found!'
+
+
+@pytest.mark.parametrize('app_label, migrated_tenants', [(None, ['tenant2']), ('testapp', ['tenant1', 'tenant2'])])
+def test_migrateall_parallel_skips_up_to_date_tenants(app_label, migrated_tenants):
+    out = StringIO()
+    results = [TenantResult(tenant, True, 0.1) for tenant in migrated_tenants]
+    with patch.object(MigrateAllCommand, '_has_unapplied_migrations', side_effect=lambda tenant: tenant == 'tenant2'), \
+            patch(f'{migrateall.__name__}.execute_in_parallel', return_value=results) as execute, \
+            patch(f'{migrateall.__name__}.emit_post_migrate_signal') as emit_post_migrate:
+        call_command(MigrateAllCommand(), *filter(None, [app_label]), parallel=2, stdout=out)
+
+    _, tenants, workers, _, _, method_name = execute.call_args.args
+    assert (sorted(tenants), workers, method_name) == (migrated_tenants, 2, 'migrate_tenant'), \
+        'Wrong tenants migrated!'
+    skipped = 'Skipping tenant: tenant1, no unapplied migrations' in out.getvalue()
+    assert skipped == (app_label is None), 'Wrong tenants skipped!'
+    assert [call.args[2] for call in emit_post_migrate.call_args_list] == (['tenant1'] if skipped else []), \
+        'post_migrate not emitted for the skipped tenants!'
+
+
+@pytest.mark.django_db(databases=['tenant1', 'tenant2'], transaction=True)
+def test_migrateall_parallel_creates_content_types_of_skipped_tenants():
+    ContentType.objects.db_manager('tenant1').filter(app_label='testapp').delete()
+    with patch.object(MigrateAllCommand, '_has_unapplied_migrations', return_value=False), \
+            patch(f'{migrateall.__name__}.execute_in_parallel') as execute:
+        call_command(MigrateAllCommand(), parallel=2, stdout=StringIO())
+
+    execute.assert_not_called()
+    assert ContentType.objects.db_manager('tenant1').filter(app_label='testapp').exists(), \
+        'Content types not created!'
@@ -0,0 +1,136 @@
+import asyncio
+from unittest.mock import Mock, patch
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from python_utils.django.api.utils import UserCache
+from python_utils.django.middleware import tenant_aware_websocket_middleware
+from python_utils.django.middleware.tenant_aware_http_middleware import TenantAwareHttpMiddleware
+from python_utils.django.middleware.tenant_aware_websocket_middleware import TenantAwareWebsocketMiddleware
+from python_utils.django.middleware.tenant_resolver import TenantResolver
+from python_utils.django.tenant_context import TenantContext
+
+
+@pytest.fixture()
+def resolver():
+    return TenantResolver(excluded_path_prefixes=['/static', '/api/public'], tenants=['tenant1', 'tenant2'])
+
+
+@pytest.mark.parametrize('host, tenant', [
+    ('app.tenant1.company.com', 'tenant1'),
+    ('portal.tenant2.company.com:8000', 'tenant2'),
+    ('app.tenant1-internal.company.com', 'tenant1'),
+    ('testserver', 'default'),
+    ('testserver:80', 'default'),
+    ('app.unknown.company.com', None),
+    ('company.com', None),
+    ('localhost', None),
+])
+def test_tenant_resolver_tenant_from_host(resolver, host, tenant):
+    assert resolver.get_tenant_from_host(host) == tenant, 'Wrong tenant returned!'
+
+
+@pytest.mark.parametrize('path, excluded', [
+    ('/', True),
+    ('/healthz', True),
+    ('/static/app.js', True),
+    ('/api/public/jobs', True),
+    ('/api/jobs', False),
+    ('/api/static', False),
+])
+def test_tenant_resolver_excluded_paths(resolver, path, excluded):
+    assert resolver.is_excluded_path(path) == excluded, 'Wrong exclusion returned!'
+
+
+def test_tenant_resolver_caches_known_and_unknown_tenants(resolver):
+    with patch.object(resolver, '_resolve_tenant', wraps=resolver._resolve_tenant) as resolve:
+        for _ in range(2):
+            assert resolver.get_tenant_from_host('app.tenant1.company.com') == 'tenant1', 'Wrong tenant returned!'
+            assert resolver.get_tenant_from_host('app.unknown.company.com') is None, 'Unknown tenant returned!'
+    assert resolve.call_count == 2, 'Tenants of the hosts not cached!'
+
+
+def test_tenant_resolver_cache_bounded():
+    resolver = TenantResolver(tenants=['tenant1'], max_cache_size=2)
+    for port in range(5):
+        resolver.get_tenant_from_host(f'app.tenant1.company.com:{port}')
+        assert len(resolver._host_tenants) <= 2, 'Cache not bounded!'
+
+
+def test_http_middleware_tenant_from_host(settings):
+    settings.ALLOWED_HOSTS = ['*']
+    get_response = Mock(side_effect=lambda request: HttpResponse(TenantContext.get()))
+    middleware = TenantAwareHttpMiddleware(get_response)
+
+    response = middleware(RequestFactory().get('/api/jobs', HTTP_HOST='app.tenant1.company.com'))
+    assert response.content == b'tenant1', 'Wrong tenant set!'
+    assert not TenantContext.is_set(), 'Tenant not reset!'
+
+    with pytest.raises(Exception, match='Could not determine tenant from subdomain'):
+        middleware(RequestFactory().get('/api/jobs', HTTP_HOST='app.unknown.company.com'))
+
+    get_response.reset_mock(side_effect=True)
+    middleware(RequestFactory().get('/healthz', HTTP_HOST='app.unknown.company.com'))
+    get_response.assert_called_once()
+
+
+def test_http_middleware_async_tenant_set_around_get_response(settings):
+    settings.ALLOWED_HOSTS = ['*']
+
+    async def get_response(request):
+        tenant = TenantContext.get()
+        # Let the other request run, which sets its own tenant
+        await asyncio.sleep(0.01)
+        assert TenantContext.get() == tenant, 'Tenant changed while awaiting!'
+        return HttpResponse(tenant)
+
+    middleware = TenantAwareHttpMiddleware(get_response)
+    assert asyncio.iscoroutinefunction(middleware), 'Middleware not in async mode!'
+
+    async def handle_request(host):
+        response = await middleware(RequestFactory().get('/api/jobs', HTTP_HOST=host))
+        assert not TenantContext.is_set(), 'Tenant not reset!'
+        return response
+
+    async def handle_requests():
+        return await asyncio.gather(handle_request('app.tenant1.company.com'), handle_request('app.tenant2.company.com'))
+
+    responses = asyncio.run(handle_requests())
+    assert [response.content for response in responses] == [b'tenant1', b'tenant2'], 'Wrong tenants set!'
+
+
+def test_websocket_middleware_tenant_from_host_header():
+    middleware = TenantAwareWebsocketMiddleware(Mock())
+    scope = {'headers': [(b'origin', b'https://app.tenant1.company.com'), (b'host', b'app.tenant2.company.com:443')]}
+    assert middleware._get_tenant(scope) == 'tenant2', 'Wrong tenant returned!'
+    assert middleware._get_tenant({'headers': [], 'server': ('app.tenant1.company.com', 80)}) == 'tenant1', \
+        'Wrong tenant returned!'
+
+    with pytest.raises(Exception, match='Could not determine tenant from websocket subdomain'):
+        middleware._get_tenant({'headers': [(b'host', b'app.unknown.company.com')]})
+
+
+@pytest.mark.django_db(transaction=True)
+def test_websocket_middleware_get_user_from_user_cache():
+    User = get_user_model()
+    User.objects.create(username='user', first_name='First')
+    User.objects.create(username='other', first_name='Other')
+    payload = {'preferred_username': 'user', 'given_name': 'First'}
+    user_cache = UserCache(ttl=60, max_size=10)
+
+    async def get_user(username, token_payload):
+        async with TenantContext('default'):
+            return await TenantAwareWebsocketMiddleware._get_user(username, token_payload)
+
+    with patch.object(tenant_aware_websocket_middleware, 'USER_CACHE', user_cache):
+        assert asyncio.run(get_user('user', payload)).first_name == 'First', 'Wrong user returned!'
+        # Users whose data do not match the token are not cached, so the API authentication updates them
+        assert asyncio.run(get_user('other', payload)).first_name == 'Other', 'Wrong user returned!'
+        assert asyncio.run(get_user('unknown', payload)) is None, 'Unknown user returned!'
+
+        User.objects.all().delete()
+        assert asyncio.run(get_user('user', payload)).username == 'user', 'Cached user not returned!'
+        assert asyncio.run(get_user('other', payload)) is None, 'User with other data cached!'
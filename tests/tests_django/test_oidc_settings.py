@@ -0,0 +1,185 @@
+import asyncio
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+from requests import HTTPError
+from urllib3.util.retry import Retry
+
+from python_utils.django import oidc_settings
+from python_utils.django.oidc_settings import (
+    aget_oidc_confidential_client_token,
+    clear_oidc_confidential_client_token,
+    get_confidential_client_service_account_token,
+    get_oidc_confidential_client_token,
+    get_session,
+)
+from python_utils.django.tenant_context import TenantContext
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class TokenServer(ThreadingHTTPServer):
+    """Keycloak stub, which answers the token requests with the given statuses, then with new tokens."""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), TokenRequestHandler)
+        self.statuses = []
+        self.requests = []
+        self.client_ports = set()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_port}'
+
+
+class TokenRequestHandler(BaseHTTPRequestHandler):
+    # Keep the connections alive
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.server.client_ports.add(self.client_address[1])
+        self.server.requests.append(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        body = json.dumps({'access_token': f'token-{len(self.server.requests)}', 'expires_in': 300}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture()
+def token_file(tmp_path):
+    token_file = tmp_path / 'token'
+    token_file.write_text('service-account-token\n')
+    with patch.object(oidc_settings, 'KEYCLOAK_CONFIDENTIAL_CLIENT_SERVICE_ACCOUNT_TOKEN_FILE_PATHS',
+                      {'tenant1': str(token_file)}):
+        yield token_file
+
+
+@pytest.fixture()
+def token_server(token_file):
+    server = TokenServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    with patch.object(oidc_settings, 'KEYCLOAK_SERVER_URL_TEMPLATE', server.url), \
+            patch.dict(oidc_settings._CLIENT_TOKENS, clear=True), patch.dict(oidc_settings._SESSIONS, clear=True), \
+            patch.object(Retry, 'sleep'):
+        yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def clock():
+    clock = Clock()
+    with patch.object(oidc_settings, 'time', clock):
+        yield clock
+
+
+def test_get_session_per_tenant_with_retries():
+    with patch.dict(oidc_settings._SESSIONS, clear=True):
+        with TenantContext('tenant1'):
+            session = get_session()
+            assert get_session() is session, 'Session not reused!'
+        with TenantContext('tenant2'):
+            assert get_session() is not session, 'Session shared between tenants!'
+
+    retry = session.get_adapter('https://id.tenant1.company.com').max_retries
+    assert retry.total == 3 and 503 in retry.status_forcelist, 'Server errors not retried!'
+    assert retry.is_retry('POST', 503), 'POST requests not retried!'
+
+
+def test_client_token_cached_until_expiry_margin(token_server, clock):
+    with TenantContext('tenant1'):
+        token = get_oidc_confidential_client_token()
+        assert token['access_token'] == 'token-1', 'Wrong token returned!'
+        assert 'client_assertion=service-account-token' in token_server.requests[0], 'Wrong client assertion sent!'
+
+        # Changes by the caller are not reflected in the cache
+        token['access_token'] = 'changed'
+        clock.now += 269
+        assert get_oidc_confidential_client_token() == {'access_token': 'token-1', 'expires_in': 31}, \
+            'Cached token not returned!'
+        assert len(token_server.requests) == 1, 'Cached token requested again!'
+
+        clock.now += 2
+        assert get_oidc_confidential_client_token()['access_token'] == 'token-2', 'Expiring token not renewed!'
+
+        clear_oidc_confidential_client_token()
+        assert get_oidc_confidential_client_token()['access_token'] == 'token-3', 'Cleared token returned!'
+
+        # Tokens of other grants are never cached
+        get_oidc_confidential_client_token(grant_type='authorization_code', code='code')
+        assert 'grant_type=authorization_code' in token_server.requests[3], 'Wrong grant requested!'
+        assert get_oidc_confidential_client_token()['access_token'] == 'token-3', 'Cached token replaced!'
+
+    assert len(token_server.client_ports) == 1, 'Connection to Keycloak not reused!'
+
+
+def test_client_token_expiry_margin_setting(token_server, clock):
+    with TenantContext('tenant1'), patch.object(oidc_settings, 'KEYCLOAK_TOKEN_EXPIRY_MARGIN', 100):
+        get_oidc_confidential_client_token()
+        clock.now += 201
+        assert get_oidc_confidential_client_token()['access_token'] == 'token-2', 'Margin setting not used!'
+
+
+def test_client_token_server_errors_retried(token_server):
+    token_server.statuses = [503, 502]
+    with TenantContext('tenant1'):
+        assert get_oidc_confidential_client_token()['access_token'] == 'token-3', 'Server errors not retried!'
+
+        clear_oidc_confidential_client_token()
+        token_server.statuses = [503] * 4
+        with pytest.raises(HTTPError):
+            get_oidc_confidential_client_token()
+    assert len(token_server.requests) == 7, 'Wrong number of retries!'
+
+    token_server.statuses = [401]
+    with TenantContext('tenant1'), pytest.raises(HTTPError):
+        get_oidc_confidential_client_token()
+    assert len(token_server.requests) == 8, 'Client error retried!'
+
+
+def test_aget_client_token(token_server):
+    async def get_tokens():
+        async with TenantContext('tenant1'):
+            token = await aget_oidc_confidential_client_token()
+            with patch.object(oidc_settings, 'sync_to_async') as sync_to_async:
+                cached_token = await aget_oidc_confidential_client_token()
+            assert cached_token['access_token'] == token['access_token'], 'Cached token not returned!'
+            sync_to_async.assert_not_called()
+
+    asyncio.run(get_tokens())
+    assert len(token_server.requests) == 1, 'Cached token requested again!'
+
+
+def test_service_account_token_file_read_when_modified(token_file):
+    with TenantContext('tenant1'):
+        assert get_confidential_client_service_account_token() == 'service-account-token', 'Wrong token read!'
+
+        # The file is not read again while its modification time does not change
+        modified_at = token_file.stat().st_mtime_ns
+        token_file.write_text('new-token')
+        os.utime(token_file, ns=(modified_at, modified_at))
+        assert get_confidential_client_service_account_token() == 'service-account-token', 'Token file read again!'
+
+        os.utime(token_file, ns=(modified_at + 10 ** 9, modified_at + 10 ** 9))
+        assert get_confidential_client_service_account_token() == 'new-token', 'Modified token file not read!'
+
+        token_file.unlink()
+        with pytest.raises(FileNotFoundError):
+            get_confidential_client_service_account_token()
@@ -9,7 +9,7 @@ from python_utils.django_utils import record_to_dict, perform_query, get_total,
     get_or_none, get_id_field_map, get_model_field_names, call_procedure, generate_file_from_buffer, \
     ids, update_record, compute_weighted_average, compute_grouped_weighted_average, \
     get_fields_config_and_values, get_model_fields_config, safe_bulk_create, \
-    safe_bulk_update
+    safe_bulk_update, iter_query
 from tests.testapp.models import Invoice, Company
 from tests.tests_django_utils.tests_data import RECORD_TO_DICT_TEST_CASES, PERFORM_QUERY_TEST_CASES, \
     GET_TOTAL_TEST_CASES, GET_MIN_TEST_CASES, GET_AVERAGE_TEST_CASES, GET_MAX_TEST_CASES, \
@@ -17,7 +17,7 @@ from tests.tests_django_utils.tests_data import RECORD_TO_DICT_TEST_CASES, PERFO
     UPDATE_RECORD_SAVE_TRUE_TEST_CASES, COMPUTE_WEIGHTED_AVERAGE_TEST_CASES, \
     COMPUTE_GROUPED_WEIGHTED_AVERAGE_TEST_CASES, \
     GET_FIELDS_CONFIG_AND_VALUES, GET_MODEL_FIELDS_CONFIG_TEST_CASES, SAFE_BULK_CREATE_TEST_CASES, \
-    SAFE_BULK_UPDATE_TEST_CASES
+    SAFE_BULK_UPDATE_TEST_CASES, ITER_QUERY_TEST_CASES
 
 
 @pytest.mark.parametrize('test_data', RECORD_TO_DICT_TEST_CASES)
@@ -33,6 +33,23 @@ def test_perform_query(test_data, initial_invoices):
         'Wrong output from function!'
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize('test_data', ITER_QUERY_TEST_CASES)
+def test_iter_query(test_data, initial_invoices):
+    rows = iter_query(**test_data.input)
+    assert type(rows).__name__ == 'generator', 'Wrong type returned!'
+    rows = list(rows)
+    assert test_data.output == rows, 'Wrong output from function!'
+    if test_data.input.get('row_type') == 'namedtuple':
+        assert rows[0].code == 'T-2', 'Wrong namedtuple returned!'
+
+
+@pytest.mark.django_db
+def test_iter_query_invalid_row_type(initial_invoices):
+    with pytest.raises(ValueError):
+        next(iter_query('SELECT id FROM test_invoice', row_type='list'))
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize('test_data', GET_TOTAL_TEST_CASES)
 def test_get_total(test_data, initial_invoices):
@@ -44,7 +44,36 @@ PERFORM_QUERY_TEST_CASES = [
         description='Case 2: expected_results=False',
         input={'sql_query': 'SELECT COUNT(*) FROM test_invoice', 'expected_results': False},
         output=None,
-    )
+    ),
+    TestCase(
+        description='Case 3: as_columns=True',
+        input={'sql_query': 'SELECT id, code FROM test_invoice ORDER BY id', 'as_columns': True},
+        output={'id': [1, 2, 3], 'code': ['T-0', 'T-1', 'T-2']},
+    ),
+    TestCase(
+        description='Case 4: as_columns=True without results',
+        input={'sql_query': 'SELECT id, code FROM test_invoice WHERE id > %s', 'params': [10], 'as_columns': True},
+        output={'id': [], 'code': []},
+    ),
+]
+ITER_QUERY_TEST_CASES = [
+    TestCase(
+        description='Case 0: dict rows, fetched in chunks smaller than the results',
+        input={'sql_query': 'SELECT id, code FROM test_invoice ORDER BY id', 'chunk_size': 2},
+        output=[{'id': 1, 'code': 'T-0'}, {'id': 2, 'code': 'T-1'}, {'id': 3, 'code': 'T-2'}],
+    ),
+    TestCase(
+        description='Case 1: tuple rows with params',
+        input={'sql_query': 'SELECT id, code FROM test_invoice WHERE id > %s ORDER BY id', 'params': [1],
+               'row_type': 'tuple'},
+        output=[(2, 'T-1'), (3, 'T-2')],
+    ),
+    TestCase(
+        description='Case 2: namedtuple rows',
+        input={'sql_query': 'SELECT id, code FROM test_invoice WHERE id = %s', 'params': [3],
+               'row_type': 'namedtuple'},
+        output=[(3, 'T-2')],
+    ),
 ]
 GET_TOTAL_TEST_CASES = [
     TestCase(
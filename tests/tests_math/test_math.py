@@ -0,0 +1,62 @@
+from decimal import Decimal
+
+import pytest
+
+from python_utils.math import compile_expression, dec_sum_many, evaluate
+
+
+@pytest.mark.parametrize('values, expected', [
+    ([20.24, None, 2.2, 0.01], Decimal('22.45')),
+    ([0.1] * 10, Decimal('1.00')),
+    ([-5.25, 5.25], Decimal('0.00')),
+    ([], Decimal('0.00')),
+])
+def test_dec_sum_many_fixed_point(values, expected):
+    np = pytest.importorskip('numpy')
+    assert dec_sum_many(values, scale=2) == expected, 'Wrong sum returned!'
+    assert dec_sum_many(np.asarray(values, dtype=object), scale=2) == expected, 'Wrong sum of array returned!'
+
+
+@pytest.mark.parametrize('values', [
+    [1.001, 2.2],
+    [1.5, 10 ** 16 + 0.25],
+    [9.5 * 10 ** 15, 9.5 * 10 ** 15, 1.25],
+])
+def test_dec_sum_many_fixed_point_falls_back_to_exact_sum(values):
+    pytest.importorskip('numpy')
+    assert dec_sum_many(values, scale=2) == dec_sum_many(values), 'Wrong sum returned!'
+
+
+def test_dec_sum_many_fixed_point_not_finite_values():
+    np = pytest.importorskip('numpy')
+    assert dec_sum_many(np.array([1.25, None, 2.5], dtype=object), scale=2) == Decimal('3.75'), 'None not skipped!'
+    assert dec_sum_many(np.array([1.25, np.nan]), scale=2).is_nan(), 'NaN not kept!'
+    assert dec_sum_many([1.25, float('inf')], scale=2) == Decimal('Infinity'), 'Infinity not kept!'
+
+
+@pytest.mark.parametrize('expression', [
+    'x.__class__',
+    'x.__class__.__subclasses__()',
+    'sqrt.__globals__',
+    '(1).__class__',
+    'x.real',
+    'pi.real',
+    "'{0.__class__.__mro__}'.format(1)",
+    "'a'.join(['b', 'c'])",
+    '(lambda: x)()',
+    '(lambda y: y.real)(x)',
+    '[y for y in [x]]',
+    'sum(y for y in [x])',
+    '{y: y for y in [x]}',
+])
+def test_evaluate_attributes_and_nested_scopes_not_allowed(expression):
+    with pytest.raises(NameError):
+        evaluate(expression, {'x': 1})
+    with pytest.raises(NameError):
+        compile_expression(expression)
+
+
+def test_compile_expression_variables_in_order_of_use():
+    expression = compile_expression('y * sqrt(x) + y')
+    assert expression.variables == ('y', 'x'), 'Wrong variables returned!'
+    assert expression.evaluate(x=9, y=2) == 8.0, 'Wrong result returned!'
@@ -0,0 +1,31 @@
+import pytest
+
+from python_utils.time import parse_datetimes, parse_dates, get_datetime, get_date
+
+# Mostly not in ISO format, so that the values are parsed with the regex
+VALUES = [
+    '2021-1-2 3:04',
+    '2021-1-2 3:04:05.12+02:30',
+    '2021-1-2 3:04:05,1234567Z',
+    '2021-1-2 3:04:05 -0100',
+    '2021-1-2',
+    '2021-01-02T03:04:05+01:00',
+    '2021-01-02 03:04:05+0100',
+    '2021-01-02T03:04:05+00:00',
+]
+
+
+@pytest.mark.parametrize('parse_many, get_one', [(parse_datetimes, get_datetime), (parse_dates, get_date)])
+def test_parse_many_same_output_as_get_one(parse_many, get_one):
+    values, errors = parse_many([*VALUES, '2021-1-2 25:04'])
+    expected = [get_one(value) for value in VALUES]
+    assert values == [*expected, None], 'Wrong values returned!'
+    with pytest.raises(ValueError):
+        get_one('2021-1-2 25:04')
+    assert errors == {len(VALUES): '2021-1-2 25:04'}, 'Wrong errors returned!'
+
+
+def test_parse_datetimes_same_timezones_as_get_datetime():
+    values = parse_datetimes(VALUES).values
+    assert [value.tzname() for value in values] == [get_datetime(value).tzname() for value in VALUES], \
+        'Wrong timezones returned!'